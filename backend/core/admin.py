@@ -1,9 +1,14 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import (
 	DonorProfile, EmergencyNeed, OrganDonor, MarketplaceItem, Hospital, Doctor, Review,
 	DonationRequest, HospitalNeed, Appointment, MedicalEssential, MedicalStoreProduct,
-	MedicalEquipment, MedicalOrder, MedicalOrderItem
+	MedicalEquipment, MedicalOrder, MedicalOrderItem, StockReservation,
+	InventoryMovement, SupplierDailySales, StockAlert,
+	IdempotencyKey, CatalogImportJob, City, CityAlias, SearchDocument, RevokedToken, Job,
+	Notification
 )
+from .authentication import revoke_user_tokens
 
 
 @admin.register(DonorProfile)
@@ -11,6 +16,14 @@ class DonorProfileAdmin(admin.ModelAdmin):
 	list_display = ("email", "blood_group", "city", "is_platelet_donor", "is_available")
 	search_fields = ("user__username", "city", "zip_code", "blood_group")
 	list_filter = ("blood_group", "is_platelet_donor", "is_available")
+	readonly_fields = ("tokens_valid_after",)
+	actions = ["sign_out_everywhere"]
+
+	@admin.action(description="Sign out of every session (revoke all tokens)")
+	def sign_out_everywhere(self, request, queryset):
+		for user in queryset:
+			revoke_user_tokens(user)
+		self.message_user(request, f"Revoked the tokens of {len(queryset)} user(s).")
 
 
 @admin.register(EmergencyNeed)
@@ -80,10 +93,10 @@ class AppointmentAdmin(admin.ModelAdmin):
 
 @admin.register(MedicalEssential)
 class MedicalEssentialAdmin(admin.ModelAdmin):
-	list_display = ("company_name", "user", "business_type", "city", "is_active", "is_verified", "api_key_created_at")
-	search_fields = ("company_name", "user__email", "contact_person", "city", "license_number")
+	list_display = ("company_name", "user", "business_type", "city", "is_active", "is_verified", "api_key_prefix", "api_key_last_used_at")
+	search_fields = ("company_name", "user__email", "contact_person", "city", "license_number", "api_key_prefix")
 	list_filter = ("business_type", "is_active", "is_verified")
-	readonly_fields = ("api_key", "api_key_created_at", "created_at", "updated_at")
+	readonly_fields = ("api_key_prefix", "api_key_created_at", "api_key_last_used_at", "api_key_usage_count", "created_at", "updated_at")
 
 
 @admin.register(MedicalStoreProduct)
@@ -118,3 +131,101 @@ class MedicalOrderItemAdmin(admin.ModelAdmin):
 	readonly_fields = ("subtotal", "created_at", "updated_at")
 
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+	list_display = ("customer", "product_type", "quantity", "status", "expires_at", "order")
+	search_fields = ("customer__email", "store_product__sku", "equipment__sku")
+	list_filter = ("status", "product_type")
+	readonly_fields = ("created_at", "updated_at")
+
+
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+	list_display = ("reason", "supplier", "product_type", "quantity_delta", "order", "created_at", "applied_at")
+	search_fields = ("supplier__company_name", "store_product__sku", "equipment__sku", "order__order_number")
+	list_filter = ("reason", "product_type")
+	readonly_fields = ("created_at", "updated_at", "applied_at")
+
+
+@admin.register(SupplierDailySales)
+class SupplierDailySalesAdmin(admin.ModelAdmin):
+	list_display = ("supplier", "date", "order_count", "units_sold", "revenue", "cancelled_count")
+	search_fields = ("supplier__company_name",)
+	list_filter = ("date",)
+
+
+@admin.register(StockAlert)
+class StockAlertAdmin(admin.ModelAdmin):
+	list_display = ("alert_type", "store_product", "supplier", "expiry_date", "quantity_available", "is_resolved", "created_at")
+	search_fields = ("supplier__company_name", "store_product__sku", "store_product__name")
+	list_filter = ("alert_type", "is_resolved")
+	readonly_fields = ("created_at", "updated_at", "resolved_at")
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+	list_display = ("jti", "token_type", "user", "reason", "created_at", "expires_at")
+	search_fields = ("jti", "user__email")
+	list_filter = ("token_type", "reason")
+	raw_id_fields = ("user",)
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+	list_display = ("scope", "key", "owner", "status", "response_status", "created_at", "expires_at")
+	search_fields = ("key", "owner")
+	list_filter = ("scope", "status")
+	readonly_fields = ("created_at", "locked_at")
+
+
+@admin.register(CatalogImportJob)
+class CatalogImportJobAdmin(admin.ModelAdmin):
+	list_display = ("supplier", "product_type", "file_format", "status", "processed_rows", "error_count", "created_at", "finished_at")
+	search_fields = ("supplier__company_name",)
+	list_filter = ("status", "product_type", "file_format")
+	readonly_fields = ("created_at", "updated_at", "started_at", "finished_at")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+	list_display = ("task", "status", "attempts", "max_attempts", "run_after", "locked_by", "created_at", "finished_at")
+	search_fields = ("task", "locked_by")
+	list_filter = ("status", "task")
+	readonly_fields = ("created_at", "updated_at", "locked_at", "finished_at", "last_error")
+	actions = ["retry_now"]
+
+	@admin.action(description="Retry now")
+	def retry_now(self, request, queryset):
+		retried = queryset.exclude(status="RUNNING").update(
+			status="PENDING", run_after=timezone.now(), attempts=0, locked_by="", locked_at=None, finished_at=None,
+		)
+		self.message_user(request, f"Queued {retried} job(s) to run again.")
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+	list_display = ("title", "kind", "object_id", "channel", "address", "status", "created_at", "sent_at")
+	search_fields = ("address", "recipient__email", "title")
+	list_filter = ("kind", "channel", "status")
+	raw_id_fields = ("recipient",)
+
+
+class CityAliasInline(admin.TabularInline):
+	model = CityAlias
+	extra = 1
+	fields = ("name", "key")
+
+
+@admin.register(City)
+class CityAdmin(admin.ModelAdmin):
+	list_display = ("name", "key", "latitude", "longitude")
+	search_fields = ("name", "key", "aliases__name")
+	inlines = [CityAliasInline]
+
+
+@admin.register(SearchDocument)
+class SearchDocumentAdmin(admin.ModelAdmin):
+	list_display = ("entity_type", "object_id", "title", "subtitle", "city", "updated_at")
+	search_fields = ("title", "subtitle")
+	list_filter = ("entity_type",)
+	readonly_fields = ("updated_at",)
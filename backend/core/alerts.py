@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import MedicalStoreProduct, StockAlert
+
+
+def _alerts_for(row, today, horizon):
+	alerts = []
+	expiry_date = row["expiry_date"]
+	if expiry_date is not None and expiry_date < today:
+		alerts.append(("EXPIRED", f"{row['name']} expired on {expiry_date.isoformat()}."))
+	elif expiry_date is not None and expiry_date <= horizon:
+		alerts.append(("EXPIRING", f"{row['name']} expires on {expiry_date.isoformat()}."))
+	if row["quantity_available"] <= row["reorder_level"]:
+		alerts.append((
+			"LOW_STOCK",
+			f"{row['name']} has {row['quantity_available']} left (reorder level {row['reorder_level']}).",
+		))
+	return [
+		StockAlert(
+			supplier_id=row["supplier_id"],
+			store_product_id=row["id"],
+			alert_type=alert_type,
+			expiry_date=expiry_date,
+			quantity_available=row["quantity_available"],
+			message=message,
+		)
+		for alert_type, message in alerts
+	]
+
+
+def resolve_stale_alerts(today, horizon):
+	"""Close open alerts whose product no longer matches the alert condition"""
+	stale = (
+		Q(alert_type="LOW_STOCK", store_product__quantity_available__gt=F("store_product__reorder_level"))
+		| Q(alert_type="EXPIRING") & (
+			Q(store_product__expiry_date__isnull=True)
+			| Q(store_product__expiry_date__gt=horizon)
+			| Q(store_product__expiry_date__lt=today)
+		)
+		| Q(alert_type="EXPIRED") & (
+			Q(store_product__expiry_date__isnull=True) | Q(store_product__expiry_date__gte=today)
+		)
+		| Q(store_product__is_active=False)
+	)
+	return StockAlert.objects.filter(stale, is_resolved=False).update(is_resolved=True, resolved_at=timezone.now())
+
+
+def scan_stock_alerts(expiry_days, chunk_size=1000, today=None):
+	"""
+	Raise alerts for active products expiring within ``expiry_days`` or at or below
+	their reorder level, then resolve alerts that no longer apply.
+
+	Products are walked in primary-key chunks so the scan never holds the whole
+	catalogue in memory. The open-alert unique constraint makes reruns idempotent.
+	Returns (products flagged, alerts resolved).
+	"""
+	today = today or timezone.localdate()
+	horizon = today + timedelta(days=expiry_days)
+	candidates = MedicalStoreProduct.objects.filter(is_active=True).filter(
+		Q(expiry_date__lte=horizon) | Q(quantity_available__lte=F("reorder_level"))
+	).order_by("pk").values("id", "supplier_id", "name", "expiry_date", "quantity_available", "reorder_level")
+
+	flagged = 0
+	last_pk = 0
+	while True:
+		rows = list(candidates.filter(pk__gt=last_pk)[:chunk_size])
+		if not rows:
+			break
+		last_pk = rows[-1]["id"]
+		alerts = [alert for row in rows for alert in _alerts_for(row, today, horizon)]
+		StockAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+		flagged += len(rows)
+	return flagged, resolve_stale_alerts(today, horizon)
@@ -0,0 +1,210 @@
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from .models import (
+	MedicalEquipment,
+	MedicalOrder,
+	MedicalOrderItem,
+	MedicalStoreProduct,
+	SupplierDailySales,
+	SupplierProductDailySales,
+)
+
+
+def _increment(model, key_fields, deltas):
+	"""
+	Add ``deltas`` ({key tuple: {field: amount}}) to aggregate rows in two queries:
+	one insert for rows that do not exist yet and one UPDATE for all of them.
+
+	Runs once the caller's transaction commits. Inside it, the locks on a supplier's
+	aggregate rows would be held until the whole checkout commits, queueing every
+	concurrent checkout for that supplier behind it. A crash between the commit and
+	the update leaves the aggregates short until rebuild_sales_aggregates.
+	"""
+	if deltas:
+		transaction.on_commit(lambda: _apply_increment(model, key_fields, deltas), robust=True)
+
+
+def _apply_increment(model, key_fields, deltas):
+	conditions = {key: Q(**dict(zip(key_fields, key))) for key in deltas}
+	fields = {field for amounts in deltas.values() for field in amounts}
+	updates = {
+		field: Case(
+			*[When(conditions[key], then=F(field) + amounts[field]) for key, amounts in deltas.items() if field in amounts],
+			default=F(field),
+			output_field=model._meta.get_field(field),
+		)
+		for field in fields
+	}
+	with transaction.atomic():
+		model.objects.bulk_create([model(**dict(zip(key_fields, key))) for key in deltas], ignore_conflicts=True)
+		model.objects.filter(reduce(or_, conditions.values())).update(**updates)
+
+
+def _money(value):
+	return str((value or Decimal("0")).quantize(Decimal("0.01")))
+
+
+def _add(deltas, key, **amounts):
+	row = deltas.setdefault(key, {})
+	for field, amount in amounts.items():
+		row[field] = row.get(field, 0) + amount
+
+
+def record_order_sales(orders, order_items):
+	"""Fold newly placed orders into the supplier daily aggregates"""
+	today = timezone.localdate()
+	daily = {}
+	products = {}
+	for order in orders:
+		_add(daily, (order.supplier_id, today), order_count=1, revenue=order.total_amount)
+	for item in order_items:
+		product_id = item.store_product_id if item.product_type == "STORE" else item.equipment_id
+		_add(daily, (item.order.supplier_id, today), units_sold=item.quantity)
+		_add(products, (item.order.supplier_id, today, item.product_type, product_id), units_sold=item.quantity, revenue=item.subtotal)
+	_increment(SupplierDailySales, ("supplier_id", "date"), daily)
+	_increment(SupplierProductDailySales, ("supplier_id", "date", "product_type", "product_id"), products)
+
+
+def record_cancelled_sales(order):
+	"""Count a cancellation against the day the order was placed"""
+	date = timezone.localdate(order.created_at)
+	_increment(SupplierDailySales, ("supplier_id", "date"), {
+		(order.supplier_id, date): {"cancelled_count": 1, "cancelled_revenue": order.total_amount},
+	})
+
+
+def rebuild_sales_aggregates(supplier_ids=None):
+	"""Recompute the daily aggregates from orders with DB-side aggregation"""
+	orders = MedicalOrder.objects.all()
+	items = MedicalOrderItem.objects.all()
+	if supplier_ids is not None:
+		orders = orders.filter(supplier_id__in=supplier_ids)
+		items = items.filter(order__supplier_id__in=supplier_ids)
+
+	daily = {}
+	for row in orders.annotate(date=TruncDate("created_at")).values("supplier_id", "date").annotate(
+		order_count=Count("id"),
+		revenue=Sum("total_amount"),
+		cancelled_count=Count("id", filter=Q(status="CANCELLED")),
+		cancelled_revenue=Sum("total_amount", filter=Q(status="CANCELLED")),
+	):
+		daily[(row["supplier_id"], row["date"])] = SupplierDailySales(
+			supplier_id=row["supplier_id"],
+			date=row["date"],
+			order_count=row["order_count"],
+			revenue=row["revenue"] or Decimal("0.00"),
+			cancelled_count=row["cancelled_count"],
+			cancelled_revenue=row["cancelled_revenue"] or Decimal("0.00"),
+		)
+
+	product_rows = []
+	for row in items.annotate(date=TruncDate("order__created_at")).values(
+		"order__supplier_id", "date", "product_type", "store_product_id", "equipment_id",
+	).annotate(units=Sum("quantity"), revenue=Sum("subtotal")):
+		key = (row["order__supplier_id"], row["date"])
+		if key in daily:
+			daily[key].units_sold += row["units"]
+		product_rows.append(SupplierProductDailySales(
+			supplier_id=row["order__supplier_id"],
+			date=row["date"],
+			product_type=row["product_type"],
+			product_id=row["store_product_id"] if row["product_type"] == "STORE" else row["equipment_id"],
+			units_sold=row["units"],
+			revenue=row["revenue"] or Decimal("0.00"),
+		))
+
+	with transaction.atomic():
+		existing_daily = SupplierDailySales.objects.all()
+		existing_products = SupplierProductDailySales.objects.all()
+		if supplier_ids is not None:
+			existing_daily = existing_daily.filter(supplier_id__in=supplier_ids)
+			existing_products = existing_products.filter(supplier_id__in=supplier_ids)
+		existing_daily.delete()
+		existing_products.delete()
+		SupplierDailySales.objects.bulk_create(daily.values(), batch_size=1000)
+		SupplierProductDailySales.objects.bulk_create(product_rows, batch_size=1000)
+	return len(daily)
+
+
+def supplier_sales_report(supplier, date_from, date_to, group_by="day", top=10, low_stock_threshold=10):
+	"""Revenue series, top products, status funnel and low-stock list for one supplier"""
+	daily = SupplierDailySales.objects.filter(supplier=supplier, date__gte=date_from, date__lte=date_to)
+	if group_by == "week":
+		daily = daily.annotate(period=TruncWeek("date"))
+	else:
+		daily = daily.annotate(period=F("date"))
+	revenue = [
+		{
+			"period": row["period"].isoformat() if hasattr(row["period"], "isoformat") else row["period"],
+			"orders": row["orders"],
+			"units": row["units"],
+			"revenue": _money(row["revenue"]),
+			"cancelled_orders": row["cancelled_orders"],
+			"cancelled_revenue": _money(row["cancelled_revenue"]),
+		}
+		for row in daily.values("period").annotate(
+			orders=Sum("order_count"),
+			units=Sum("units_sold"),
+			revenue=Sum("revenue"),
+			cancelled_orders=Sum("cancelled_count"),
+			cancelled_revenue=Sum("cancelled_revenue"),
+		).order_by("period")
+	]
+
+	top_rows = list(
+		SupplierProductDailySales.objects.filter(supplier=supplier, date__gte=date_from, date__lte=date_to)
+		.values("product_type", "product_id")
+		.annotate(units=Sum("units_sold"), revenue=Sum("revenue"))
+		.order_by("-units", "-revenue")[:top]
+	)
+	names = {}
+	for product_type, model in (("STORE", MedicalStoreProduct), ("EQUIPMENT", MedicalEquipment)):
+		ids = [row["product_id"] for row in top_rows if row["product_type"] == product_type]
+		if ids:
+			for pk, sku, name in model.objects.filter(pk__in=ids).values_list("pk", "sku", "name"):
+				names[(product_type, pk)] = (sku, name)
+	top_products = [
+		{
+			"product_type": row["product_type"],
+			"product_id": row["product_id"],
+			"sku": names.get((row["product_type"], row["product_id"]), (None, None))[0],
+			"name": names.get((row["product_type"], row["product_id"]), (None, None))[1],
+			"units": row["units"],
+			"revenue": _money(row["revenue"]),
+		}
+		for row in top_rows
+	]
+
+	status_funnel = {code: 0 for code, _ in MedicalOrder.STATUS_CHOICES}
+	for row in MedicalOrder.objects.filter(supplier=supplier).values("status").annotate(count=Count("id")).order_by():
+		status_funnel[row["status"]] = row["count"]
+
+	low_stock = []
+	for product_type, model in (("STORE", MedicalStoreProduct), ("EQUIPMENT", MedicalEquipment)):
+		for row in model.objects.filter(
+			supplier=supplier, is_active=True, quantity_available__lte=low_stock_threshold,
+		).order_by("quantity_available").values("id", "sku", "name", "quantity_available"):
+			low_stock.append({"product_type": product_type, **row})
+
+	return {
+		"date_from": date_from.isoformat(),
+		"date_to": date_to.isoformat(),
+		"group_by": group_by,
+		"revenue": revenue,
+		"top_products": top_products,
+		"status_funnel": status_funnel,
+		"low_stock": low_stock,
+	}
+
+
+def default_report_window(days=30):
+	date_to = timezone.localdate()
+	return date_to - timedelta(days=days - 1), date_to
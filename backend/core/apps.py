@@ -1,8 +1,19 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class CoreConfig(AppConfig):
 	default_auto_field = "django.db.models.BigAutoField"
 	name = "core"
 
+	def ready(self):
+		# Importing tasks registers them with the job queue
+		from . import authentication, autocomplete, cities, facets, fulltext, search, tasks, trigram
 
+		trigram.connect_signals()
+		autocomplete.connect_signals()
+		cities.connect_signals()
+		search.connect_signals()
+		facets.connect_signals()
+		authentication.connect_signals()
+		checks.register(fulltext.check_fulltext_triggers, checks.Tags.database)
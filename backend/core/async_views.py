@@ -0,0 +1,243 @@
+"""
+Native async versions of the hot read endpoints and of login, mounted in place of the DRF
+routes when ASYNC_VIEWS is on (the ASGI entry point turns it on). Under WSGI every
+async view would need its own event loop, so the sync DRF views stay in use there.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import exceptions, serializers
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .blood import ALL_BLOOD_GROUPS, BLOOD_COMPATIBILITY
+from .metrics import METRICS_CACHE_KEY, metrics_overview
+from .models import BloodDonationEvent, DonorProfile, EmergencyNeed
+from .passwords import aauthenticate_password
+from .serializers import CustomTokenObtainPairSerializer, DonorProfileSerializer, EmergencyNeedSerializer
+from .throttling import BUCKET_THROTTLES, LOW
+from .views import AccidentAlertViewSet, EmergencyNeedViewSet, HospitalViewSet
+
+
+def _json(data, status=200, headers=None):
+	return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder, headers=headers)
+
+
+# Bounded, so concurrent requests never hold more than this many extra connections
+query_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_QUERY_WORKERS, thread_name_prefix="async-query")
+
+
+async def run_query(function, *args):
+	"""
+	Run ``function`` on a ``query_executor`` thread, so that several calls awaited
+	together really overlap. Plain async ORM calls all share the request's one
+	connection and run one after another.
+
+	Each pool thread keeps its own connection between calls and closes it only as a
+	request thread would, i.e. once it is older than CONN_MAX_AGE or has errored.
+	"""
+	def call():
+		close_old_connections()
+		try:
+			return function(*args)
+		finally:
+			close_old_connections()
+	return await sync_to_async(call, thread_sensitive=False, executor=query_executor)()
+
+
+def _authenticate(request):
+	# The configured DRF authenticators; they may read the database
+	drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+	drf_request.user
+	return drf_request
+
+
+class AsyncAPIView(View):
+	"""
+	Base for async read views: CSRF-exempt like DRF views, JSON errors, and DRF
+	throttles applied from ``throttle_classes`` and ``throttle_scope``.
+	"""
+	throttle_classes = []
+	throttle_scope = None
+	authenticate = False
+
+	@classmethod
+	def as_view(cls, **initkwargs):
+		view = super().as_view(**initkwargs)
+		view.csrf_exempt = True
+		return view
+
+	async def dispatch(self, request, *args, **kwargs):
+		if self.authenticate:
+			try:
+				self.drf_request = await sync_to_async(_authenticate)(request)
+			except exceptions.AuthenticationFailed as exc:
+				return _json({"detail": str(exc.detail)}, status=401)
+		else:
+			self.drf_request = Request(request)
+		for throttle_class in self.throttle_classes:
+			throttle = throttle_class()
+			if not throttle.allow_request(self.drf_request, self):
+				wait = throttle.wait()
+				return _json(
+					{"detail": f"Request was throttled. Expected available in {max(int(wait), 1)} seconds."},
+					status=429,
+					headers={"Retry-After": str(max(int(wait), 1))},
+				)
+		return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncListView(AsyncAPIView):
+	"""
+	GET lists the records of a DRF ``viewset`` through the async ORM, reusing its
+	filters and serializer; other methods go to the viewset unchanged.
+
+	``select_related`` must cover every relation the serializer reads, since nothing
+	may touch the database once the rows are fetched. ``database_params`` are query
+	parameters whose filters read the database, e.g. resolving ?city=; when one is
+	given the queryset is built on a worker thread.
+	"""
+	viewset = None
+	select_related = []
+	database_params = ("city",)
+
+	def _viewset(self):
+		return self.viewset(request=self.drf_request, args=self.args, kwargs=self.kwargs, format_kwarg=None, action="list")
+
+	async def get(self, request, *args, **kwargs):
+		viewset = self._viewset()
+		if any(param in request.GET for param in self.database_params):
+			queryset = await sync_to_async(viewset.get_queryset)()
+		else:
+			queryset = viewset.get_queryset()
+		records = [record async for record in queryset.select_related(*self.select_related)]
+		return _json(viewset.get_serializer(records, many=True).data)
+
+	async def post(self, request, *args, **kwargs):
+		view = self.viewset.as_view({"get": "list", "post": "create"})
+		return await sync_to_async(view)(request, *args, **kwargs)
+
+
+class AsyncHospitalListView(AsyncListView):
+	viewset = HospitalViewSet
+	select_related = ["user"]
+
+
+class AsyncEmergencyNeedListView(AsyncListView):
+	viewset = EmergencyNeedViewSet
+	select_related = ["created_by"]
+
+
+class AsyncAccidentAlertListView(AsyncListView):
+	viewset = AccidentAlertViewSet
+	select_related = ["reported_by", "hospital_referred__user"]
+
+
+class AsyncMetricsOverviewView(AsyncAPIView):
+	throttle_classes = BUCKET_THROTTLES
+	throttle_scope = "metrics"
+	shed_priority = LOW
+
+	async def get(self, request):
+		metrics = await cache.aget(METRICS_CACHE_KEY)
+		if metrics is None:
+			metrics = await run_query(metrics_overview)
+			await cache.aset(METRICS_CACHE_KEY, metrics, settings.METRICS_CACHE_SECONDS)
+		return _json(metrics)
+
+
+def _donor(user_id):
+	return DonorProfile.objects.filter(pk=user_id).first()
+
+
+def _open_needs():
+	# Every open need; filtered by blood group once the donor's group is known
+	return list(EmergencyNeed.objects.select_related("created_by").filter(status="OPEN"))
+
+
+def _upcoming_events():
+	return list(
+		BloodDonationEvent.objects.filter(event_date__gte=timezone.now(), status="UPCOMING")
+		.select_related("hospital").order_by("event_date")[:10]
+	)
+
+
+class AsyncDonorDashboardView(AsyncAPIView):
+	"""
+	Same response as DonorProfileViewSet.dashboard. The donor, open needs and
+	upcoming events are read concurrently on separate connections; needs are matched
+	to the donor's blood group afterwards rather than waiting for the donor first.
+	"""
+	authenticate = True
+
+	async def get(self, request):
+		if not request.user.is_authenticated:
+			return _json({"detail": "Authentication credentials were not provided."}, status=401)
+		profile, needs, events = await asyncio.gather(
+			run_query(_donor, request.user.pk), run_query(_open_needs), run_query(_upcoming_events),
+		)
+		if profile is None:
+			return _json({"detail": "Donor profile not found."}, status=404)
+
+		compatible_groups = BLOOD_COMPATIBILITY.get(profile.blood_group, [])
+		is_universal = len(compatible_groups) == len(ALL_BLOOD_GROUPS)
+		if not is_universal and compatible_groups:
+			needs = [need for need in needs if not need.required_blood_group or need.required_blood_group in compatible_groups]
+
+		events_data = []
+		for event in events:
+			event_date = event.event_date
+			events_data.append({
+				"id": event.id,
+				"date": event_date.strftime("%a • %d %b"),
+				"title": event.title,
+				"location": event.location,
+				"hospital": event.hospital.name if event.hospital else "",
+				"event_date": event_date.isoformat(),
+				"start_time": str(event.start_time),
+				"end_time": str(event.end_time),
+			})
+
+		return _json(
+			{
+				"donor": DonorProfileSerializer(profile, context={"request": self.drf_request}).data,
+				"compatibility": {
+					"blood_group": profile.blood_group,
+					"can_donate_to": compatible_groups,
+					"is_universal": is_universal,
+				},
+				"recommended_needs": EmergencyNeedSerializer(needs, many=True).data,
+				"upcoming_events": events_data,
+			}
+		)
+
+
+class AsyncTokenObtainPairView(AsyncAPIView):
+	"""
+	Same request and response as CustomTokenObtainPairView. The password is checked
+	on the hashing pool while the event loop goes on serving other requests, rather
+	than holding a thread for the whole hash.
+	"""
+
+	async def post(self, request):
+		drf_request = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+		serializer = CustomTokenObtainPairSerializer()
+		try:
+			attrs = serializer.to_internal_value(drf_request.data)
+			user = await aauthenticate_password(attrs["email"], attrs["password"])
+			data = await sync_to_async(serializer.issue_tokens)(user, attrs.get("donor_module"))
+		except serializers.ValidationError as exc:
+			return _json(serializers.as_serializer_error(exc), status=400)
+		except exceptions.APIException as exc:
+			# Parse errors, and PasswordHashingBusy when the hashing pool is full
+			wait = getattr(exc, "wait", None)
+			return _json({"detail": str(exc.detail)}, status=exc.status_code, headers={"Retry-After": str(wait)} if wait else None)
+		return _json(data)
@@ -0,0 +1,320 @@
+import atexit
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, router, transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.signals import pre_save
+from django.utils import timezone
+from rest_framework import authentication, exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import API_KEY_PREFIX_LENGTH, DonorProfile, MedicalEssential, hash_api_key
+from .revocation import revocation_list
+
+
+logger = logging.getLogger(__name__)
+
+
+class PrincipalCache:
+	"""
+	Bounded LRU of {key hash: (user row, profile row)} so warm API keys skip the database.
+
+	Entries expire after ``ttl`` seconds, which bounds how long another worker keeps
+	accepting a key after it is regenerated or the supplier is deactivated.
+	"""
+
+	def __init__(self, max_size, ttl):
+		self.max_size = max_size
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._entries = OrderedDict()
+
+	def get(self, key_hash):
+		with self._lock:
+			entry = self._entries.get(key_hash)
+			if entry is None:
+				return None
+			principal, expires = entry
+			if expires <= time.monotonic():
+				del self._entries[key_hash]
+				return None
+			self._entries.move_to_end(key_hash)
+			return principal
+
+	def set(self, key_hash, principal):
+		with self._lock:
+			self._entries[key_hash] = (principal, time.monotonic() + self.ttl)
+			self._entries.move_to_end(key_hash)
+			while len(self._entries) > self.max_size:
+				self._entries.popitem(last=False)
+
+	def discard(self, key_hash):
+		with self._lock:
+			self._entries.pop(key_hash, None)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+
+class UsageCounter:
+	"""
+	Buffers per-key request counts in memory and writes them with one UPDATE once
+	``flush_every`` requests or ``flush_seconds`` have gone by.
+	"""
+
+	def __init__(self, flush_every, flush_seconds):
+		self.flush_every = flush_every
+		self.flush_seconds = flush_seconds
+		self._lock = threading.Lock()
+		self._pending = {}
+		self._total = 0
+		self._last_flush = time.monotonic()
+
+	def record(self, profile_id):
+		with self._lock:
+			count, _ = self._pending.get(profile_id, (0, None))
+			self._pending[profile_id] = (count + 1, timezone.now())
+			self._total += 1
+			due = self._total >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_seconds
+		if due:
+			self.flush()
+
+	def flush(self):
+		with self._lock:
+			pending, self._pending = self._pending, {}
+			self._total = 0
+			self._last_flush = time.monotonic()
+		if not pending:
+			return
+		try:
+			MedicalEssential.objects.filter(pk__in=pending.keys()).update(
+				api_key_usage_count=Case(
+					*[When(pk=pk, then=F("api_key_usage_count") + count) for pk, (count, _) in pending.items()],
+					default=F("api_key_usage_count"),
+					output_field=MedicalEssential._meta.get_field("api_key_usage_count"),
+				),
+				api_key_last_used_at=Case(
+					*[When(pk=pk, then=Value(last_used)) for pk, (_, last_used) in pending.items()],
+					default=F("api_key_last_used_at"),
+					output_field=DateTimeField(),
+				),
+			)
+		except DatabaseError:
+			# Usage stats are best effort; never fail the request that triggered the flush
+			logger.exception("Could not write API key usage counters")
+
+
+principal_cache = PrincipalCache(settings.API_KEY_CACHE_SIZE, settings.API_KEY_CACHE_TTL_SECONDS)
+usage_counter = UsageCounter(settings.API_KEY_USAGE_FLUSH_EVERY, settings.API_KEY_USAGE_FLUSH_SECONDS)
+atexit.register(usage_counter.flush)
+
+
+def _row(instance):
+	return tuple(getattr(instance, field.attname) for field in instance._meta.concrete_fields)
+
+
+def _from_row(model, row):
+	# A new instance per request; views edit and save the supplier, which must never
+	# change what other requests in this worker see
+	return model.from_db(router.db_for_read(model), [field.attname for field in model._meta.concrete_fields], row)
+
+
+def forget_api_key(key_hash):
+	"""Drop a replaced key from this worker's cache"""
+	principal_cache.discard(key_hash)
+
+
+class ApiKeyAuthentication(authentication.BaseAuthentication):
+	"""
+	Authenticates medical essential suppliers by the ``X-API-Key`` header.
+
+	The key's prefix finds the candidate profile and its SHA-256 is compared in
+	constant time, so no password hashing happens on the request path. Sets
+	``request.auth`` to the supplier's MedicalEssential profile.
+	"""
+	header = "HTTP_X_API_KEY"
+
+	def authenticate(self, request):
+		api_key = request.META.get(self.header)
+		if not api_key:
+			return None
+
+		key_hash = hash_api_key(api_key)
+		principal = principal_cache.get(key_hash)
+		if principal is None:
+			candidates = MedicalEssential.objects.select_related("user").filter(
+				api_key_prefix=api_key[:API_KEY_PREFIX_LENGTH],
+			)
+			profile = next((p for p in candidates if hmac.compare_digest(p.api_key_hash, key_hash)), None)
+			if profile is None:
+				raise exceptions.AuthenticationFailed("Invalid API key.")
+			# Only immutable row values are shared between requests, never the instances
+			principal_cache.set(key_hash, (_row(profile.user), _row(profile)))
+		else:
+			user_row, profile_row = principal
+			profile = _from_row(MedicalEssential, profile_row)
+			profile.user = _from_row(DonorProfile, user_row)
+
+		user = profile.user
+		if not profile.is_active or not user.is_active:
+			raise exceptions.AuthenticationFailed("API key is inactive.")
+		usage_counter.record(profile.pk)
+		return user, profile
+
+	def authenticate_header(self, request):
+		return "Api-Key"
+
+
+# User fields copied into every token at login; a user built from a token has only these
+TOKEN_CLAIMS = ("donor_module", "is_staff", "is_superuser")
+
+# Login time to the microsecond, copied into every token minted from that login. iat is
+# whole seconds, too coarse to tell a login from a revocation in the same second.
+AUTH_TIME_CLAIM = "auth_time"
+
+
+class TokenDenyList:
+	"""
+	{user id: cutoff} for users whose tokens issued before the cutoff are refused.
+
+	Reloaded from DonorProfile.tokens_valid_after every ``refresh_seconds``, which
+	bounds how long another worker keeps accepting a revoked token. Only cutoffs
+	younger than the longest a token can live are kept, so the map stays small.
+	"""
+
+	def __init__(self, refresh_seconds):
+		self.refresh_seconds = refresh_seconds
+		self._lock = threading.Lock()
+		self._cutoffs = {}
+		self._loaded_at = None
+
+	def _oldest_live_token(self):
+		# An access token made from a refresh token gets a new iat (iat is in RefreshToken.no_copy_claims)
+		return timezone.now() - max(api_settings.REFRESH_TOKEN_LIFETIME, api_settings.ACCESS_TOKEN_LIFETIME)
+
+	def is_denied(self, user_id, issued_at):
+		loaded_at = self._loaded_at
+		if loaded_at is None or time.monotonic() - loaded_at >= self.refresh_seconds:
+			self.refresh()
+		cutoff = self._cutoffs.get(user_id)
+		return cutoff is not None and (issued_at or 0) < cutoff
+
+	def refresh(self):
+		with self._lock:
+			# Other threads keep using the current map while one reloads it
+			self._loaded_at = time.monotonic()
+		since = self._oldest_live_token()
+		try:
+			rows = DonorProfile.objects.filter(tokens_valid_after__gte=since).values_list("pk", "tokens_valid_after")
+			cutoffs = {pk: valid_after.timestamp() for pk, valid_after in rows}
+		except DatabaseError:
+			logger.exception("Could not reload the token deny-list")
+			return
+		with self._lock:
+			# Keep local denials committed while the query ran
+			oldest = since.timestamp()
+			for pk, cutoff in self._cutoffs.items():
+				if cutoff >= oldest and cutoff > cutoffs.get(pk, 0):
+					cutoffs[pk] = cutoff
+			self._cutoffs = cutoffs
+
+	def deny(self, user_id, valid_after):
+		with self._lock:
+			cutoff = valid_after.timestamp()
+			self._cutoffs = {**self._cutoffs, user_id: max(cutoff, self._cutoffs.get(user_id, 0))}
+
+	def clear(self):
+		with self._lock:
+			self._cutoffs = {}
+			self._loaded_at = None
+
+
+token_deny_list = TokenDenyList(settings.JWT_DENYLIST_REFRESH_SECONDS)
+
+
+def revoke_user_tokens(user):
+	"""Refuse every access and refresh token issued to ``user`` so far"""
+	now = timezone.now()
+	DonorProfile.objects.filter(pk=user.pk).update(tokens_valid_after=now)
+	user.tokens_valid_after = now
+	transaction.on_commit(lambda: token_deny_list.deny(user.pk, now))
+
+
+def _token_user_id(token):
+	# SimpleJWT stores the id as a string
+	return DonorProfile._meta.pk.to_python(token.get(api_settings.USER_ID_CLAIM))
+
+
+def check_token_not_revoked(token):
+	# Tokens from before auth_time fall back to iat, so any from the second of the cutoff are refused
+	issued_at = token.get(AUTH_TIME_CLAIM, token.get("iat"))
+	if token_deny_list.is_denied(_token_user_id(token), issued_at) or revocation_list.is_revoked(
+		token.get(api_settings.JTI_CLAIM)
+	):
+		raise exceptions.AuthenticationFailed("Token has been revoked.", code="token_revoked")
+
+
+def user_from_claims(token):
+	"""
+	A DonorProfile built from the token's claims without a query.
+
+	Every other field is deferred; reading one loads the rest of the row in a single
+	query (see DonorProfile.refresh_from_db).
+	"""
+	values = {"id": _token_user_id(token), "is_active": True}
+	values.update((claim, token[claim]) for claim in TOKEN_CLAIMS)
+	# from_db() takes the values in field order
+	field_names = [field.attname for field in DonorProfile._meta.concrete_fields if field.attname in values]
+	return DonorProfile.from_db(
+		router.db_for_read(DonorProfile), field_names, [values[name] for name in field_names],
+	)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+	"""
+	JWT authentication that trusts the claims embedded at login instead of loading
+	the user on every request.
+
+	Deactivating a user, changing their password or any claimed field revokes their
+	tokens through the deny-list; single tokens are revoked through the revocation
+	list, e.g. on logout. Tokens issued before the claims were embedded fall
+	back to loading the user.
+	"""
+
+	def get_user(self, validated_token):
+		if api_settings.USER_ID_CLAIM not in validated_token:
+			raise InvalidToken("Token contained no recognizable user identification")
+		check_token_not_revoked(validated_token)
+		if not all(claim in validated_token for claim in TOKEN_CLAIMS):
+			return super().get_user(validated_token)
+		return user_from_claims(validated_token)
+
+
+def _revoke_on_change(sender, instance, raw=False, update_fields=None, **kwargs):
+	if raw or instance._state.adding or instance.pk is None:
+		return
+	# set_password() leaves the raw password here until the save; a hasher upgrade on login does not
+	if instance._password is not None:
+		revoke_user_tokens(instance)
+		return
+	fields = [
+		field for field in TOKEN_CLAIMS + ("is_active",)
+		if field not in instance.get_deferred_fields() and (update_fields is None or field in update_fields)
+	]
+	if not fields:
+		return
+	previous = DonorProfile.objects.filter(pk=instance.pk).values(*fields).first()
+	if previous is not None and any(previous[field] != getattr(instance, field) for field in fields):
+		revoke_user_tokens(instance)
+
+
+def connect_signals():
+	pre_save.connect(_revoke_on_change, sender=DonorProfile, dispatch_uid="revoke_tokens_on_change")
@@ -0,0 +1,299 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.signals import post_delete, post_save
+
+from .models import Appointment, DonationRequest, Hospital, MedicalEquipment, MedicalStoreProduct, SupplierProductDailySales
+from .trigram import RefreshedIndexes, normalize
+
+
+AUTOCOMPLETE_KINDS = ("hospital", "city", "product")
+
+# Most suggestions a single lookup may return; cached prefix lists keep this many
+MAX_SUGGESTIONS = 20
+
+# Prefixes whose range in the sorted index holds more entries than this keep their
+# top suggestions cached, so short and common prefixes ("h", "hosp") stay sub-millisecond
+CACHE_SCAN_THRESHOLD = 64
+
+
+class PrefixIndex:
+	"""
+	Sorted array of (term, key) pairs answering "top-k labels starting with prefix".
+
+	Every word position of a label is a term ("sunrise metro hospital", "metro
+	hospital", "hospital"), so a prefix of any word matches. A lookup is a bisect
+	plus a scan of the matching range; broad prefixes keep their top list cached,
+	and add/remove patch those lists in place.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._terms = []
+		# key -> (label, popularity, terms)
+		self._entries = {}
+		# prefix -> [key] ordered by popularity, at most MAX_SUGGESTIONS long
+		self._top = {}
+
+	def __len__(self):
+		return len(self._entries)
+
+	@staticmethod
+	def terms(label):
+		words = re.findall(r"\w+", normalize(label))
+		return tuple(sorted({" ".join(words[i:]) for i in range(len(words))}))
+
+	def _rank(self, key):
+		label, popularity, _ = self._entries[key]
+		return (-popularity, len(label), label)
+
+	def add(self, key, label, popularity=0):
+		with self._lock:
+			# A key only moving up in popularity keeps its place in the cached lists
+			previous = self._entries.get(key)
+			self._discard(key, keep_cached=previous is not None and previous[0] == label and popularity >= previous[1])
+			terms = self.terms(label)
+			if not terms:
+				return
+			self._entries[key] = (label, popularity, terms)
+			for term in terms:
+				insort(self._terms, (term, key))
+			for prefix in self._cached_prefixes(terms):
+				top = self._top[prefix]
+				if key in top:
+					top.remove(key)
+				top.append(key)
+				top.sort(key=self._rank)
+				del top[MAX_SUGGESTIONS:]
+
+	def load(self, rows):
+		"""Bulk-fill from (key, label, popularity) rows, sorting once instead of inserting one by one"""
+		with self._lock:
+			for key, label, popularity in rows:
+				terms = self.terms(label)
+				if terms:
+					self._entries[key] = (label, popularity, terms)
+			self._terms = sorted((term, key) for key, (_, _, terms) in self._entries.items() for term in terms)
+			self._top.clear()
+
+	def bump(self, key, amount=1):
+		"""Change a key's popularity; returns False when the key is not indexed"""
+		with self._lock:
+			entry = self._entries.get(key)
+		if entry is None:
+			return False
+		label, popularity, _ = entry
+		self.add(key, label, max(popularity + amount, 0))
+		return True
+
+	def popularity(self, key):
+		entry = self._entries.get(key)
+		return entry[1] if entry else None
+
+	def remove(self, key):
+		with self._lock:
+			self._discard(key)
+
+	def _discard(self, key, keep_cached=False):
+		entry = self._entries.get(key)
+		if entry is None:
+			return
+		terms = entry[2]
+		for term in terms:
+			position = bisect_left(self._terms, (term, key))
+			if position < len(self._terms) and self._terms[position] == (term, key):
+				del self._terms[position]
+		for prefix in () if keep_cached else self._cached_prefixes(terms):
+			if key in self._top[prefix]:
+				# The next best key is unknown here; recompute on the next lookup
+				del self._top[prefix]
+		del self._entries[key]
+
+	def _cached_prefixes(self, terms):
+		prefixes = set()
+		for term in terms:
+			for length in range(1, len(term) + 1):
+				if term[:length] in self._top:
+					prefixes.add(term[:length])
+		return prefixes
+
+	def search(self, prefix, limit=10):
+		"""Return [(key, label)] for labels with a word starting with ``prefix``, most popular first"""
+		prefix = " ".join(re.findall(r"\w+", normalize(prefix)))
+		if not prefix:
+			return []
+		limit = min(limit, MAX_SUGGESTIONS)
+		with self._lock:
+			top = self._top.get(prefix)
+			if top is None:
+				start = bisect_left(self._terms, (prefix,))
+				end = bisect_left(self._terms, (prefix + "\uffff",), lo=start)
+				keys = {key for _, key in self._terms[start:end]}
+				top = heapq.nsmallest(MAX_SUGGESTIONS, keys, key=self._rank)
+				if end - start > CACHE_SCAN_THRESHOLD:
+					self._top[prefix] = top
+			return [(key, self._entries[key][0]) for key in top[:limit]]
+
+
+def _hospital_popularity():
+	"""Appointments plus donation requests per hospital"""
+	popularity = Counter()
+	for model in (Appointment, DonationRequest):
+		for row in model.objects.values("hospital_id").annotate(total=Count("id")):
+			popularity[row["hospital_id"]] += row["total"]
+	return popularity
+
+
+def _product_popularity():
+	"""Units sold per (product_type, product_id)"""
+	rows = SupplierProductDailySales.objects.values("product_type", "product_id").annotate(units=Sum("units_sold"))
+	return {(row["product_type"], row["product_id"]): row["units"] or 0 for row in rows}
+
+
+def _city_key(city):
+	return " ".join((city or "").split()).lower()
+
+
+def _index_rows(kind):
+	"""(key, label, popularity) rows for one kind"""
+	if kind == "hospital":
+		popularity = _hospital_popularity()
+		for pk, name in Hospital.objects.values_list("pk", "name").iterator():
+			yield pk, name, popularity[pk]
+	elif kind == "city":
+		# A city's popularity is the number of hospitals in it
+		cities = Counter()
+		labels = {}
+		for city in Hospital.objects.values_list("city", flat=True).iterator():
+			key = _city_key(city)
+			if key:
+				cities[key] += 1
+				labels.setdefault(key, " ".join(city.split()))
+		for key, count in cities.items():
+			yield key, labels[key], count
+	else:
+		popularity = _product_popularity()
+		for product_type, model in (("STORE", MedicalStoreProduct), ("EQUIPMENT", MedicalEquipment)):
+			for pk, name in model.objects.filter(is_active=True).values_list("pk", "name").iterator():
+				yield (product_type, pk), name, popularity.get((product_type, pk), 0)
+
+
+def build_index(kind):
+	index = PrefixIndex()
+	index.load(_index_rows(kind))
+	return index
+
+
+class AutocompleteIndexes(RefreshedIndexes):
+	"""Per-kind prefix indexes, rebuilt after AUTOCOMPLETE_REBUILD_SECONDS"""
+
+	def ttl_seconds(self):
+		return settings.AUTOCOMPLETE_REBUILD_SECONDS
+
+	def get(self, kind):
+		return self._get(kind)
+
+	def build(self, kind):
+		return build_index(kind)
+
+	def built(self, kind):
+		return self._built(kind)
+
+
+autocomplete_indexes = AutocompleteIndexes()
+
+
+def autocomplete(kind, prefix, limit=10):
+	return autocomplete_indexes.get(kind).search(prefix, limit=limit)
+
+
+# The handlers capture what changed and patch the indexes once the write commits,
+# so a rolled-back save or delete never leaves a ghost suggestion behind
+
+def _hospital_saved(sender, instance, created, **kwargs):
+	pk, name, city = instance.pk, instance.name, instance.city
+
+	def patch():
+		hospitals = autocomplete_indexes.built("hospital")
+		if hospitals is not None:
+			hospitals.add(pk, name, hospitals.popularity(pk) or 0)
+		cities = autocomplete_indexes.built("city")
+		if cities is not None and created:
+			key = _city_key(city)
+			if key and not cities.bump(key):
+				cities.add(key, " ".join(city.split()), 1)
+
+	transaction.on_commit(patch)
+
+
+def _hospital_deleted(sender, instance, **kwargs):
+	pk, city = instance.pk, instance.city
+
+	def patch():
+		hospitals = autocomplete_indexes.built("hospital")
+		if hospitals is not None:
+			hospitals.remove(pk)
+		cities = autocomplete_indexes.built("city")
+		key = _city_key(city)
+		if cities is not None and key:
+			cities.bump(key, -1)
+			if cities.popularity(key) == 0:
+				cities.remove(key)
+
+	transaction.on_commit(patch)
+
+
+def _product_saved(sender, instance, **kwargs):
+	key = ("STORE" if sender is MedicalStoreProduct else "EQUIPMENT", instance.pk)
+	name, is_active = instance.name, instance.is_active
+
+	def patch():
+		products = autocomplete_indexes.built("product")
+		if products is None:
+			return
+		if is_active:
+			products.add(key, name, products.popularity(key) or 0)
+		else:
+			products.remove(key)
+
+	transaction.on_commit(patch)
+
+
+def _product_deleted(sender, instance, **kwargs):
+	key = ("STORE" if sender is MedicalStoreProduct else "EQUIPMENT", instance.pk)
+
+	def patch():
+		products = autocomplete_indexes.built("product")
+		if products is not None:
+			products.remove(key)
+
+	transaction.on_commit(patch)
+
+
+def _booking_created(sender, instance, created, **kwargs):
+	if not created:
+		return
+	hospital_id = instance.hospital_id
+
+	def patch():
+		hospitals = autocomplete_indexes.built("hospital")
+		if hospitals is not None:
+			hospitals.bump(hospital_id)
+
+	transaction.on_commit(patch)
+
+
+def connect_signals():
+	post_save.connect(_hospital_saved, sender=Hospital, dispatch_uid="autocomplete_hospital_saved")
+	post_delete.connect(_hospital_deleted, sender=Hospital, dispatch_uid="autocomplete_hospital_deleted")
+	for model in (MedicalStoreProduct, MedicalEquipment):
+		post_save.connect(_product_saved, sender=model, dispatch_uid=f"autocomplete_saved_{model.__name__}")
+		post_delete.connect(_product_deleted, sender=model, dispatch_uid=f"autocomplete_deleted_{model.__name__}")
+	for model in (Appointment, DonationRequest):
+		post_save.connect(_booking_created, sender=model, dispatch_uid=f"autocomplete_booking_{model.__name__}")
@@ -0,0 +1,18 @@
+ALL_BLOOD_GROUPS = {"O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"}
+
+# Donor blood group -> the groups it can be given to
+BLOOD_COMPATIBILITY = {
+	"O-": list(ALL_BLOOD_GROUPS),
+	"O+": ["O+", "A+", "B+", "AB+"],
+	"A-": ["A-", "A+", "AB-", "AB+"],
+	"A+": ["A+", "AB+"],
+	"B-": ["B-", "B+", "AB-", "AB+"],
+	"B+": ["B+", "AB+"],
+	"AB-": ["AB-", "AB+"],
+	"AB+": ["AB+"],
+}
+
+
+def donor_groups(blood_group):
+	"""The blood groups that can give to ``blood_group``"""
+	return [group for group, recipients in BLOOD_COMPATIBILITY.items() if blood_group in recipients]
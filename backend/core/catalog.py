@@ -0,0 +1,435 @@
+import csv
+import json
+import logging
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import DatabaseError, models, transaction
+from django.utils import timezone
+
+from .facets import invalidate_facets
+from .inventory import PRODUCT_FIELDS, fold_pending_movements
+from .models import CatalogImportJob, InventoryMovement, MedicalEquipment, MedicalStoreProduct
+from .search import index_queryset
+
+
+logger = logging.getLogger(__name__)
+
+# product_type -> (model, fields a supplier may set through a sync or import)
+CATALOG_TYPES = {
+	"STORE": (MedicalStoreProduct, [
+		"name", "description", "category", "brand", "price", "currency", "quantity_available",
+		"minimum_order_quantity", "unit", "expiry_date", "is_active", "is_prescription_required", "reorder_level",
+	]),
+	"EQUIPMENT": (MedicalEquipment, [
+		"name", "description", "equipment_type", "brand", "model_number", "price", "currency",
+		"quantity_available", "warranty_period_months", "specifications", "is_active", "is_new",
+	]),
+}
+
+# Fields that do not appear in search documents; changing only these skips re-indexing
+UNSEARCHED_FIELDS = {
+	"price", "currency", "quantity_available", "minimum_order_quantity", "unit", "expiry_date",
+	"is_prescription_required", "reorder_level", "warranty_period_months", "is_new",
+}
+
+# Fields a row must carry when its sku does not exist yet
+REQUIRED_ON_CREATE = ("name", "price")
+
+# Row errors kept in a report; counts beyond this are still reported
+MAX_REPORTED_ERRORS = 1000
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+FALSE_VALUES = {"0", "false", "no", "n", "f"}
+
+
+class InvalidRow:
+	"""Placeholder yielded by the readers for a line that could not be decoded"""
+
+	def __init__(self, message):
+		self.message = message
+
+
+def _field_parser(field):
+	"""Build a cheap value parser from a model field; avoids a serializer per row"""
+	if isinstance(field, models.BooleanField):
+		def parse(value):
+			if isinstance(value, bool):
+				return value
+			text = str(value).strip().lower()
+			if text in TRUE_VALUES:
+				return True
+			if text in FALSE_VALUES:
+				return False
+			raise ValueError("Must be true or false.")
+	elif isinstance(field, models.DecimalField):
+		def parse(value):
+			try:
+				number = Decimal(str(value).strip())
+			except InvalidOperation:
+				raise ValueError("A valid number is required.")
+			if not number.is_finite() or number < 0:
+				raise ValueError("Must be a non-negative number.")
+			try:
+				number = number.quantize(Decimal(1).scaleb(-field.decimal_places))
+			except InvalidOperation:
+				# Too many digits for the context precision, e.g. 1e30
+				raise ValueError(f"Ensure there are no more than {field.max_digits} digits in total.")
+			if len(number.as_tuple().digits) > field.max_digits:
+				raise ValueError(f"Ensure there are no more than {field.max_digits} digits in total.")
+			return number
+	elif isinstance(field, models.PositiveIntegerField):
+		def parse(value):
+			try:
+				number = int(str(value).strip())
+			except ValueError:
+				raise ValueError("A valid integer is required.")
+			if number < 0:
+				raise ValueError("Must be zero or more.")
+			return number
+	elif isinstance(field, models.DateField):
+		def parse(value):
+			try:
+				return date.fromisoformat(str(value).strip())
+			except ValueError:
+				raise ValueError("Date must be in YYYY-MM-DD format.")
+	else:
+		choices = {code for code, _ in field.choices} if field.choices else None
+
+		def parse(value):
+			text = str(value).strip()
+			if field.max_length and len(text) > field.max_length:
+				raise ValueError(f"Ensure this field has no more than {field.max_length} characters.")
+			if choices is not None and text not in choices:
+				raise ValueError(f"\"{text}\" is not a valid choice.")
+			return text
+	return parse
+
+
+PARSERS = {
+	product_type: {name: _field_parser(model._meta.get_field(name)) for name in fields}
+	for product_type, (model, fields) in CATALOG_TYPES.items()
+}
+SKU_PARSER = _field_parser(MedicalStoreProduct._meta.get_field("sku"))
+
+
+def parse_row(product_type, raw):
+	"""Return (sku, {field: value}, errors) for one incoming row. Blank values are left unchanged."""
+	if not isinstance(raw, dict):
+		return None, {}, {"non_field_errors": "Row must be an object."}
+	errors = {}
+	values = {}
+	sku = None
+	try:
+		sku = SKU_PARSER(raw.get("sku") or "")
+	except ValueError as exc:
+		errors["sku"] = str(exc)
+	if not sku and "sku" not in errors:
+		errors["sku"] = "This field is required."
+	for name, parse in PARSERS[product_type].items():
+		value = raw.get(name)
+		if value is None or value == "":
+			continue
+		try:
+			values[name] = parse(value)
+		except ValueError as exc:
+			errors[name] = str(exc)
+	return sku, values, errors
+
+
+def iter_json_rows(data):
+	"""Rows from an already-parsed JSON body: a list, or an object with a ``rows`` list"""
+	if isinstance(data, dict):
+		data = data.get("rows")
+	if not isinstance(data, list):
+		raise ValueError("Expected a JSON array of rows.")
+	return iter(data)
+
+
+def _decoded_lines(stream):
+	first = True
+	for line in stream:
+		if first:
+			line = line.removeprefix(b"\xef\xbb\xbf")
+			first = False
+		yield line.decode("utf-8", errors="replace")
+
+
+def iter_csv_rows(stream):
+	"""Rows from a binary CSV stream with a header line, read one line at a time"""
+	return csv.DictReader(_decoded_lines(stream))
+
+
+def iter_ndjson_rows(stream):
+	"""Rows from a binary newline-delimited JSON stream, read one line at a time"""
+	for line in _decoded_lines(stream):
+		line = line.strip()
+		if not line:
+			continue
+		try:
+			yield json.loads(line)
+		except ValueError:
+			yield InvalidRow("Invalid JSON.")
+
+
+class CatalogResult:
+	"""Running totals for a sync or import"""
+
+	def __init__(self):
+		self.processed = 0
+		self.created = 0
+		self.updated = 0
+		self.unchanged = 0
+		self.duplicates = 0
+		self.error_count = 0
+		self.errors = []
+
+	def add_error(self, row_number, sku, errors):
+		self.error_count += 1
+		if len(self.errors) < MAX_REPORTED_ERRORS:
+			self.errors.append({"row": row_number, "sku": sku, "errors": errors})
+
+	def as_dict(self):
+		return {
+			"processed": self.processed,
+			"created": self.created,
+			"updated": self.updated,
+			"unchanged": self.unchanged,
+			"duplicates": self.duplicates,
+			"error_count": self.error_count,
+			"errors": self.errors,
+		}
+
+
+def _adjustment(product_type, product, delta, user, note, applied_at):
+	"""An applied ledger row for stock a sync wrote directly to the product"""
+	return InventoryMovement(
+		supplier_id=product.supplier_id,
+		product_type=product_type,
+		store_product_id=product.pk if product_type == "STORE" else None,
+		equipment_id=product.pk if product_type == "EQUIPMENT" else None,
+		quantity_delta=delta,
+		reason="ADJUSTMENT",
+		created_by=user,
+		note=note,
+		applied_at=applied_at,
+	)
+
+
+def upsert_chunk(supplier, product_type, chunk, result, user=None, note=""):
+	"""
+	Validate and write one chunk of (row_number, raw_row) pairs.
+
+	The chunk costs a fold of the SKUs' pending ledger rows (a few queries, when there
+	are any), one locking SELECT for existing SKUs, one INSERT ... ON CONFLICT DO
+	NOTHING plus one SELECT for new SKUs, at most two INSERT ... ON CONFLICT (sku) DO
+	UPDATE statements for changed rows, one INSERT of ledger rows for stock changes,
+	and a search re-index of rows whose searchable text changed. When a sku repeats
+	within the chunk the last row wins.
+	"""
+	model, fields = CATALOG_TYPES[product_type]
+	parsed = {}
+	for row_number, raw in chunk:
+		result.processed += 1
+		if isinstance(raw, InvalidRow):
+			result.add_error(row_number, None, {"non_field_errors": raw.message})
+			continue
+		sku, values, errors = parse_row(product_type, raw)
+		if errors:
+			result.add_error(row_number, sku, errors)
+			continue
+		if sku in parsed:
+			result.duplicates += 1
+		parsed[sku] = (row_number, values)
+	if not parsed:
+		return
+
+	with transaction.atomic():
+		# Pending deltas of these products are folded first, as an absolute quantity
+		# written over them would count them twice once they are folded later
+		fold_pending_movements(**{f"{PRODUCT_FIELDS[product_type]}__sku__in": list(parsed)})
+		existing = model.objects.select_for_update().in_bulk(parsed.keys(), field_name="sku")
+		now = timezone.now()
+		# Rows that set stock and rows that leave it alone are written separately, so a
+		# price-only sync never overwrites quantity_available with the value read above
+		created = {}
+		with_stock = []
+		without_stock = []
+		adjustments = []
+		reindex = []
+		for sku, (row_number, values) in parsed.items():
+			product = existing.get(sku)
+			if product is None:
+				missing = {name: "This field is required." for name in REQUIRED_ON_CREATE if name not in values}
+				if missing:
+					result.add_error(row_number, sku, missing)
+					continue
+				created[sku] = (row_number, model(supplier=supplier, sku=sku, **values))
+				continue
+			if product.supplier_id != supplier.pk:
+				result.add_error(row_number, sku, {"sku": "This SKU belongs to another supplier."})
+				continue
+			changed = {name: value for name, value in values.items() if getattr(product, name) != value}
+			if not changed:
+				result.unchanged += 1
+				continue
+			delta = changed.get("quantity_available", product.quantity_available) - product.quantity_available
+			if delta:
+				adjustments.append(_adjustment(product_type, product, delta, user, note, now))
+			for name, value in changed.items():
+				setattr(product, name, value)
+			(with_stock if "quantity_available" in changed else without_stock).append(product)
+			if changed.keys() - UNSEARCHED_FIELDS:
+				reindex.append(sku)
+			result.updated += 1
+
+		if created:
+			# Conflicts are ignored, never updated: sku is unique across suppliers, and one
+			# inserted by another supplier since the read above must not be overwritten
+			model.objects.bulk_create([product for _, product in created.values()], ignore_conflicts=True)
+			for sku, pk, supplier_id in model.objects.filter(sku__in=list(created)).values_list("sku", "pk", "supplier_id"):
+				row_number, product = created[sku]
+				if supplier_id != supplier.pk:
+					result.add_error(row_number, sku, {"sku": "This SKU belongs to another supplier."})
+					continue
+				product.pk = pk
+				if product.quantity_available:
+					adjustments.append(_adjustment(product_type, product, product.quantity_available, user, note, now))
+				reindex.append(sku)
+				result.created += 1
+
+		for products, update_fields in (
+			(with_stock, fields),
+			(without_stock, [name for name in fields if name != "quantity_available"]),
+		):
+			if products:
+				model.objects.bulk_create(
+					products,
+					update_conflicts=True,
+					unique_fields=["sku"],
+					update_fields=update_fields + ["updated_at"],
+				)
+		InventoryMovement.objects.bulk_create(adjustments)
+		# bulk_create skips the post_save signals that normally keep search documents
+		# and facet counts current
+		if reindex:
+			index_queryset(product_type, model.objects.filter(sku__in=reindex))
+		if reindex or with_stock or without_stock:
+			# Once committed, so a reader cannot cache the old counts under the new version
+			transaction.on_commit(lambda: invalidate_facets(product_type))
+
+
+def upsert_rows(supplier, product_type, rows, chunk_size=1000, max_rows=None, user=None, note="", on_chunk=None):
+	"""
+	Upsert an iterable of raw rows for ``supplier`` in chunks, keyed by sku.
+
+	Rows are consumed lazily so a streamed upload is never held in memory as a
+	whole. ``on_chunk(result)`` is called after every chunk, e.g. to report progress.
+	Returns the CatalogResult.
+	"""
+	result = CatalogResult()
+	chunk = []
+	for row_number, raw in enumerate(rows, start=1):
+		if max_rows is not None and row_number > max_rows:
+			result.add_error(row_number, None, {"non_field_errors": f"Only the first {max_rows} rows are accepted."})
+			break
+		chunk.append((row_number, raw))
+		if len(chunk) >= chunk_size:
+			upsert_chunk(supplier, product_type, chunk, result, user=user, note=note)
+			chunk = []
+			if on_chunk:
+				on_chunk(result)
+	if chunk:
+		upsert_chunk(supplier, product_type, chunk, result, user=user, note=note)
+		if on_chunk:
+			on_chunk(result)
+	return result
+
+
+def _job_counts(result):
+	return {
+		"processed_rows": result.processed,
+		"created_count": result.created,
+		"updated_count": result.updated,
+		"unchanged_count": result.unchanged,
+		"duplicate_count": result.duplicates,
+		"error_count": result.error_count,
+		"errors": result.errors,
+	}
+
+
+def run_import_job(job, chunk_size=1000):
+	"""
+	Stream ``job.file`` through upsert_rows, saving progress on the job after every
+	chunk. The file is read line by line, so memory use does not grow with its size.
+	Chunks already written stay written if a later one fails. Returns the final status.
+	"""
+	bytes_read = [0]
+
+	def counted(lines):
+		for line in lines:
+			bytes_read[0] += len(line)
+			yield line
+
+	def save_progress(result):
+		CatalogImportJob.objects.filter(pk=job.pk).update(
+			bytes_processed=bytes_read[0], updated_at=timezone.now(), **_job_counts(result),
+		)
+
+	reader = iter_csv_rows if job.file_format == "CSV" else iter_ndjson_rows
+	try:
+		with job.file.open("rb") as file:
+			result = upsert_rows(
+				job.supplier, job.product_type, reader(counted(file)), chunk_size=chunk_size,
+				user=job.created_by, note=f"Catalog import #{job.pk}", on_chunk=save_progress,
+			)
+	except Exception as exc:
+		if isinstance(exc, (csv.Error, OSError, DatabaseError)):
+			detail = str(exc)
+		else:
+			# A bug rather than a bad file; the job must still not stay RUNNING
+			logger.exception("Catalog import #%s failed", job.pk)
+			detail = f"Unexpected error: {exc!r}"
+		CatalogImportJob.objects.filter(pk=job.pk).update(
+			status="FAILED", detail=detail, bytes_processed=bytes_read[0],
+			finished_at=timezone.now(), updated_at=timezone.now(),
+		)
+		return "FAILED"
+	CatalogImportJob.objects.filter(pk=job.pk).update(
+		status="COMPLETED", bytes_processed=bytes_read[0], finished_at=timezone.now(),
+		updated_at=timezone.now(), **_job_counts(result),
+	)
+	return "COMPLETED"
+
+
+def requeue_stale_imports(lease_seconds=None):
+	"""
+	Give back RUNNING imports that saved no progress for ``lease_seconds``, presumably
+	because their worker died. Rerunning an import is safe: unchanged rows are skipped.
+	"""
+	lease_seconds = lease_seconds or settings.CATALOG_IMPORT_LEASE_SECONDS
+	return CatalogImportJob.objects.filter(
+		status="RUNNING", updated_at__lt=timezone.now() - timedelta(seconds=lease_seconds),
+	).update(status="PENDING", started_at=None, updated_at=timezone.now())
+
+
+def run_pending_imports(limit=None, chunk_size=1000):
+	"""Claim and run queued import jobs oldest first; returns how many were run"""
+	requeue_stale_imports()
+	ran = 0
+	while limit is None or ran < limit:
+		job = CatalogImportJob.objects.select_related("supplier", "created_by").filter(
+			status="PENDING",
+		).order_by("created_at").first()
+		if job is None:
+			break
+		# Another worker may have claimed the same job between the two queries
+		claimed = CatalogImportJob.objects.filter(pk=job.pk, status="PENDING").update(
+			status="RUNNING", started_at=timezone.now(), updated_at=timezone.now(),
+		)
+		if not claimed:
+			continue
+		run_import_job(job, chunk_size=chunk_size)
+		ran += 1
+	return ran
@@ -0,0 +1,218 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import (
+	AccidentAlert,
+	City,
+	CityAlias,
+	DeceasedDonorRequest,
+	DonorProfile,
+	EmergencyNeed,
+	Hospital,
+	MarketplaceItem,
+	MedicalEssential,
+	OrganDonor,
+	SearchDocument,
+)
+from .trigram import fuzzy_city_filter
+
+
+# model -> (free-text city column, canonical City foreign key)
+CITY_FIELDS = {
+	DonorProfile: ("city", "city_ref"),
+	EmergencyNeed: ("city", "city_ref"),
+	OrganDonor: ("city", "city_ref"),
+	Hospital: ("city", "city_ref"),
+	MarketplaceItem: ("city", "city_ref"),
+	DeceasedDonorRequest: ("deceased_city", "deceased_city_ref"),
+	AccidentAlert: ("city", "city_ref"),
+	MedicalEssential: ("city", "city_ref"),
+}
+
+# Trailing words dropped from the key, so "Pune City" and "Pune" are one city
+GENERIC_SUFFIXES = ("city", "district")
+
+
+def city_key(text):
+	"""
+	Normalized lookup key for a city name: accents, punctuation, case and
+	repeated spaces are ignored and a trailing "city"/"district" is dropped.
+	"""
+	text = unicodedata.normalize("NFKD", text or "")
+	text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+	words = re.findall(r"[a-z0-9]+", text)
+	while len(words) > 1 and words[-1] in GENERIC_SUFFIXES:
+		words.pop()
+	return " ".join(words)
+
+
+def display_name(text):
+	words = " ".join((text or "").split())
+	return words if words != words.lower() else words.title()
+
+
+class CityResolver:
+	"""
+	Per-process {key: city id} map, so resolving a known city costs no query.
+
+	A City or CityAlias change in any process bumps a version kept in the Django
+	cache, which empties every process's map on its next lookup. Entries are also
+	dropped after ``ttl`` seconds, which bounds how stale a map can get when the
+	cache is local to each process.
+	"""
+
+	VERSION_KEY = "cities:version"
+
+	def __init__(self, ttl):
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._ids = {}
+		self._version = None
+		self._loaded_at = None
+
+	def _current_version(self):
+		version = cache.get_or_set(self.VERSION_KEY, 1, None)
+		now = time.monotonic()
+		with self._lock:
+			if version != self._version or self._loaded_at is None or now - self._loaded_at >= self.ttl:
+				self._ids = {}
+				self._version = version
+				self._loaded_at = now
+		return version
+
+	def resolve(self, text):
+		"""
+		Return the City id for free-text ``text`` by canonical name or alias, or None
+		for blank or unknown input. Cities and aliases are only added through the
+		admin, so a typo in a form never becomes a canonical city.
+		"""
+		key = city_key(text)
+		if not key:
+			return None
+		version = self._current_version()
+		city_id = self._ids.get(key)
+		if city_id is not None:
+			return city_id
+
+		city_id = (
+			CityAlias.objects.filter(key=key).values_list("city_id", flat=True).first()
+			or City.objects.filter(key=key).values_list("id", flat=True).first()
+		)
+		if city_id is None:
+			return None
+		# Cached only once committed; the city may have been added by this very
+		# transaction, which could still be rolled back
+		transaction.on_commit(lambda: self._remember(version, key, city_id))
+		return city_id
+
+	def _remember(self, version, key, city_id):
+		with self._lock:
+			# A map emptied since the lookup may no longer hold this city
+			if version == self._version:
+				self._ids[key] = city_id
+
+	def invalidate(self):
+		"""Empty this process's map now and every other process's on its next lookup"""
+		self.clear()
+		try:
+			cache.incr(self.VERSION_KEY)
+		except ValueError:
+			# The counter was evicted; restart from a value no earlier map can carry
+			cache.set(self.VERSION_KEY, time.time_ns(), None)
+
+	def clear(self):
+		with self._lock:
+			self._ids = {}
+			self._version = None
+			self._loaded_at = None
+
+
+city_resolver = CityResolver(settings.CITY_CACHE_TTL_SECONDS)
+
+
+def resolve_city(text):
+	return city_resolver.resolve(text)
+
+
+def city_filter(queryset, city):
+	"""
+	Filter ``queryset`` to rows in ``city``. A known city or alias is an indexed
+	foreign key lookup; anything else falls back to the fuzzy text match.
+	"""
+	text_field, ref_field = CITY_FIELDS[queryset.model]
+	city_id = resolve_city(city)
+	if city_id is not None:
+		return queryset.filter(**{f"{ref_field}_id": city_id})
+	return fuzzy_city_filter(queryset, text_field, city)
+
+
+def link_unresolved_cities(batch_size=1000):
+	"""
+	Point rows whose city text matched no city when saved at the city or alias it
+	matches now, e.g. after an admin added it. Returns (rows linked, Counter of the
+	city names still unresolved) so the common ones can be reviewed and added.
+	"""
+	linked = 0
+	unresolved = Counter()
+	ids = {}
+	for model, (text_field, ref_field) in [*CITY_FIELDS.items(), (SearchDocument, ("city", "city_ref"))]:
+		last_pk = 0
+		while True:
+			rows = list(
+				model.objects.filter(pk__gt=last_pk, **{f"{ref_field}__isnull": True})
+				.order_by("pk").values_list("pk", text_field)[:batch_size]
+			)
+			if not rows:
+				break
+			by_city = {}
+			for pk, text in rows:
+				key = city_key(text)
+				if not key:
+					continue
+				if key not in ids:
+					ids[key] = resolve_city(text)
+				if ids[key] is None:
+					unresolved[display_name(text)] += 1
+				else:
+					by_city.setdefault(ids[key], []).append(pk)
+			for city_id, pks in by_city.items():
+				linked += model.objects.filter(pk__in=pks).update(**{f"{ref_field}_id": city_id})
+			last_pk = rows[-1][0]
+	return linked, unresolved
+
+
+def _resolve_instance_city(sender, instance, **kwargs):
+	text_field, ref_field = CITY_FIELDS[sender]
+	update_fields = kwargs.get("update_fields")
+	if update_fields is not None and text_field not in update_fields:
+		return
+	setattr(instance, f"{ref_field}_id", resolve_city(getattr(instance, text_field)))
+	if update_fields is not None and ref_field not in update_fields:
+		# Django only writes the listed fields; the instance's frozenset cannot be extended here
+		sender.objects.filter(pk=instance.pk).update(**{ref_field: getattr(instance, f"{ref_field}_id")})
+
+
+def _forget_cities(sender, created=False, **kwargs):
+	# Renamed or merged cities and new aliases must not keep resolving to stale ids;
+	# a brand new city cannot make a cached id stale
+	if sender is City and created:
+		return
+	city_resolver.clear()
+	# Other processes are told once the change is committed, so they cannot reload the old row
+	transaction.on_commit(city_resolver.invalidate)
+
+
+def connect_signals():
+	for model in CITY_FIELDS:
+		pre_save.connect(_resolve_instance_city, sender=model, dispatch_uid=f"resolve_city_{model.__name__}")
+	for model in (City, CityAlias):
+		post_save.connect(_forget_cities, sender=model, dispatch_uid=f"forget_cities_save_{model.__name__}")
+		post_delete.connect(_forget_cities, sender=model, dispatch_uid=f"forget_cities_delete_{model.__name__}")
@@ -0,0 +1,80 @@
+from django.core.exceptions import ObjectDoesNotExist
+
+from .models import DonorProfile, MedicalEssential
+
+
+# attribute on RequestProfiles -> reverse one-to-one accessor on the user
+PROFILE_RELATIONS = {
+	"hospital": "hospital_profile",
+	"supplier": "medical_essential_profile",
+	"organ_donor": "organ_donor",
+}
+
+
+class RequestProfiles:
+	"""
+	The signed-in user's hospital, supplier (MedicalEssential) and organ donor
+	profiles, each None when the user has none.
+
+	All three are loaded together by one query on first access and kept for the rest
+	of the request. Reads the user lazily, so it works after DRF authentication has
+	replaced the anonymous user the middleware saw.
+	"""
+
+	def __init__(self, request):
+		self._request = request
+		self._user_pk = None
+		self._profiles = {}
+
+	def _user(self):
+		user = getattr(self._request, "user", None)
+		return user if user is not None and user.is_authenticated else None
+
+	def _get(self, name):
+		user = self._user()
+		if user is None:
+			return None
+		if self._user_pk != user.pk:
+			self._user_pk = user.pk
+			self._profiles = {}
+		if name == "supplier" and name not in self._profiles:
+			# API key authentication already loaded the supplier
+			auth = getattr(self._request, "auth", None)
+			if isinstance(auth, MedicalEssential) and auth.user_id == user.pk:
+				self._profiles[name] = auth
+		if name not in self._profiles:
+			self._load(user, [relation for relation in PROFILE_RELATIONS if relation not in self._profiles])
+		return self._profiles[name]
+
+	def _load(self, user, names):
+		loaded = DonorProfile.objects.select_related(*(PROFILE_RELATIONS[name] for name in names)).filter(pk=user.pk).first()
+		if loaded is not None:
+			# A user built from token claims gets the rest of its row from this query
+			for field in user.get_deferred_fields():
+				setattr(user, field, getattr(loaded, field))
+		for name in names:
+			try:
+				profile = getattr(loaded, PROFILE_RELATIONS[name]) if loaded else None
+			except ObjectDoesNotExist:
+				profile = None
+			if profile is not None:
+				# Point back at the request's user object rather than the copy loaded here
+				setattr(profile, "user", user)
+			self._profiles[name] = profile
+
+	@property
+	def hospital(self):
+		return self._get("hospital")
+
+	@property
+	def supplier(self):
+		return self._get("supplier")
+
+	@property
+	def organ_donor(self):
+		return self._get("organ_donor")
+
+	def forget(self):
+		"""Drop memoized profiles, e.g. after creating one during the request"""
+		self._user_pk = None
+		self._profiles = {}
@@ -0,0 +1,142 @@
+import hashlib
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Value, When
+from django.db.models.signals import post_delete, post_save
+
+from .models import MarketplaceItem, MedicalEquipment, MedicalStoreProduct
+
+
+# kind -> (model, facets offered). price_band is computed from PRICE_BANDS.
+FACETS = {
+	"STORE": (MedicalStoreProduct, ["category", "brand", "price_band"]),
+	"EQUIPMENT": (MedicalEquipment, ["equipment_type", "brand", "is_new", "price_band"]),
+	"MARKETPLACE": (MarketplaceItem, ["category", "price_band"]),
+}
+
+# kind -> (price field, band lower bounds); the last band is open-ended
+PRICE_BANDS = {
+	"STORE": ("price", [0, 100, 500, 1000, 5000]),
+	"EQUIPMENT": ("price", [0, 10000, 50000, 100000, 500000]),
+	"MARKETPLACE": ("price_cents", [0, 10000, 50000, 100000, 500000]),
+}
+
+# Query parameters that never change the result
+IGNORED_PARAMS = {"format", "page", "limit", "offset"}
+
+
+def band_labels(kind):
+	_, bounds = PRICE_BANDS[kind]
+	return [
+		f"{low}-{high}" if high is not None else f"{low}+"
+		for low, high in zip(bounds, bounds[1:] + [None])
+	]
+
+
+def _price_band_expression(kind):
+	field, bounds = PRICE_BANDS[kind]
+	labels = band_labels(kind)
+	return Case(
+		*[When(**{f"{field}__lt": high}, then=Value(label)) for high, label in zip(bounds[1:], labels)],
+		default=Value(labels[-1]),
+		output_field=CharField(),
+	)
+
+
+def filter_price_band(queryset, kind, label):
+	"""Restrict ``queryset`` to one price band label such as "100-500" or "5000+"; unknown labels match nothing"""
+	field, bounds = PRICE_BANDS[kind]
+	labels = band_labels(kind)
+	if label not in labels:
+		return queryset.none()
+	position = labels.index(label)
+	queryset = queryset.filter(**{f"{field}__gte": bounds[position]})
+	if position + 1 < len(bounds):
+		queryset = queryset.filter(**{f"{field}__lt": bounds[position + 1]})
+	return queryset
+
+
+def compute_facets(queryset, kind, names):
+	"""
+	Counts per value of every facet in ``names`` for the rows in ``queryset``.
+
+	One grouped query over the combination of the requested columns; the rows are
+	rolled up per facet in Python, so N facets cost one query instead of N.
+	Returns {facet: [{"value", "label", "count"}]}, largest counts first and price
+	bands in band order.
+	"""
+	model, _ = FACETS[kind]
+	queryset = queryset.order_by()
+	if "price_band" in names:
+		queryset = queryset.annotate(price_band=_price_band_expression(kind))
+	counts = {name: defaultdict(int) for name in names}
+	for row in queryset.values(*names).annotate(facet_total=Count("pk")):
+		for name in names:
+			counts[name][row[name]] += row["facet_total"]
+
+	facets = {}
+	for name in names:
+		choices = {} if name == "price_band" else dict(model._meta.get_field(name).flatchoices)
+		order = band_labels(kind) if name == "price_band" else None
+		values = [
+			{"value": value, "label": choices.get(value, value), "count": count}
+			for value, count in counts[name].items()
+			if value not in (None, "")
+		]
+		if order:
+			values.sort(key=lambda item: order.index(item["value"]))
+		else:
+			values.sort(key=lambda item: (-item["count"], str(item["value"])))
+		facets[name] = values
+	return facets
+
+
+def _version_key(kind):
+	return f"facets:version:{kind}"
+
+
+def cache_key(kind, params, scope=""):
+	"""Key from the normalized filter parameters: sorted, repeated values merged, paging ignored"""
+	normalized = "&".join(
+		f"{name}={','.join(sorted(params.getlist(name)))}"
+		for name in sorted(params)
+		if name not in IGNORED_PARAMS
+	)
+	version = cache.get_or_set(_version_key(kind), 1, None)
+	digest = hashlib.sha1(f"{normalized}|{scope}".encode()).hexdigest()
+	return f"facets:{kind}:{version}:{digest}"
+
+
+def cached_facets(kind, queryset, names, params, scope=""):
+	key = cache_key(kind, params, scope)
+	facets = cache.get(key)
+	if facets is None:
+		facets = compute_facets(queryset, kind, names)
+		cache.set(key, facets, settings.FACET_CACHE_SECONDS)
+	return facets
+
+
+def invalidate_facets(kind):
+	"""
+	Make every cached count for ``kind`` stale. Saves and deletes do this through
+	signals; writes that send none, such as bulk_create, must call it themselves.
+	"""
+	# Old entries are never read again and age out on their own
+	try:
+		cache.incr(_version_key(kind))
+	except ValueError:
+		# The counter was evicted; restart from a value no earlier entry can carry
+		cache.set(_version_key(kind), time.time_ns(), None)
+
+
+def _bump_version(sender, **kwargs):
+	invalidate_facets(next(kind for kind, (model, _) in FACETS.items() if model is sender))
+
+
+def connect_signals():
+	for model, _ in FACETS.values():
+		post_save.connect(_bump_version, sender=model, dispatch_uid=f"facets_version_save_{model.__name__}")
+		post_delete.connect(_bump_version, sender=model, dispatch_uid=f"facets_version_delete_{model.__name__}")
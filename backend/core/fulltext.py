@@ -0,0 +1,208 @@
+import re
+
+from django.core import checks
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+
+# index name -> (table, indexed columns, column weights). The product indexes are
+# keyed by product_type; name matches rank above brand/SKU matches, which rank above
+# matches in the long text fields.
+FULLTEXT_INDEXES = {
+	"STORE": ("core_medicalstoreproduct", ["name", "brand", "sku", "description"], [10.0, 4.0, 4.0, 1.0]),
+	"EQUIPMENT": (
+		"core_medicalequipment",
+		["name", "brand", "model_number", "sku", "specifications", "description"],
+		[10.0, 4.0, 4.0, 4.0, 2.0, 1.0],
+	),
+	"SEARCH": ("core_searchdocument", ["title", "subtitle", "body"], [10.0, 4.0, 1.0]),
+}
+
+# Triggers on each indexed table that keep its SQLite FTS5 table in sync
+SQLITE_TRIGGERS = ("ai", "ad", "au")
+
+# Postgres tsvector weight class per column position
+POSTGRES_WEIGHTS = "ABBBCD"
+
+MAX_TERMS = 8
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+
+def search_terms(query):
+	"""Split user input into plain word tokens; anything else is dropped, so no query syntax leaks through"""
+	return re.findall(r"\w+", (query or "").lower())[:MAX_TERMS]
+
+
+def fts_table(table):
+	return f"{table}_fts"
+
+
+_ready_fts_tables = set()
+
+
+def _sqlite_fts_ready(table):
+	"""Whether the FTS5 table exists; the SQLite build may lack FTS5, in which case the migration skipped it"""
+	fts = fts_table(table)
+	if fts not in _ready_fts_tables and fts in connection.introspection.table_names():
+		_ready_fts_tables.add(fts)
+	return fts in _ready_fts_tables
+
+
+def sqlite_has_fts5(cursor):
+	cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+	return bool(cursor.fetchone()[0])
+
+
+def create_sqlite_index(cursor, table, columns):
+	"""
+	External-content FTS5 table plus the triggers that keep it in sync with ``table``.
+
+	SQLite drops a table's triggers whenever a migration rebuilds it, which it does
+	for most AlterField and RemoveField operations. The index then silently stops
+	following edits, so after such a migration run ``manage.py rebuild_fulltext_index``
+	(or call this again from the migration).
+	"""
+	fts = fts_table(table)
+	column_list = ", ".join(columns)
+	new_values = ", ".join(f"new.{column}" for column in columns)
+	old_values = ", ".join(f"old.{column}" for column in columns)
+	cursor.execute(
+		f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, content='{table}', content_rowid='id', "
+		f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+	)
+	cursor.execute(
+		f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+		f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+	)
+	cursor.execute(
+		f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+		f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+	)
+	# Only text edits touch the index; stock and price updates leave it alone
+	cursor.execute(
+		f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column_list} ON {table} BEGIN "
+		f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+		f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+	)
+	cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_sqlite_index(cursor, table):
+	fts = fts_table(table)
+	for suffix in SQLITE_TRIGGERS:
+		cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+	cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def missing_sqlite_triggers(using="default"):
+	"""{index: names of its missing triggers} for every FTS5 index on ``using`` that lost any"""
+	db = connections[using]
+	if db.vendor != "sqlite":
+		return {}
+	tables = set(db.introspection.table_names())
+	missing = {}
+	with db.cursor() as cursor:
+		cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+		triggers = {row[0] for row in cursor.fetchall()}
+	for index, (table, _, _) in FULLTEXT_INDEXES.items():
+		fts = fts_table(table)
+		if fts not in tables:
+			continue
+		lost = [f"{fts}_{suffix}" for suffix in SQLITE_TRIGGERS if f"{fts}_{suffix}" not in triggers]
+		if lost:
+			missing[index] = lost
+	return missing
+
+
+def rebuild_sqlite_index(index, using="default"):
+	"""Recreate an FTS5 index and its triggers and refill it from its table"""
+	table, columns, _ = FULLTEXT_INDEXES[index]
+	with transaction.atomic(using=using), connections[using].cursor() as cursor:
+		drop_sqlite_index(cursor, table)
+		create_sqlite_index(cursor, table, columns)
+
+
+def check_fulltext_triggers(databases=None, **kwargs):
+	"""System check (database tag): FTS5 indexes whose sync triggers a table rebuild dropped"""
+	errors = []
+	for using in databases or ():
+		for index, lost in missing_sqlite_triggers(using).items():
+			errors.append(checks.Error(
+				f"The {index} full-text index on '{using}' is missing trigger(s) {', '.join(lost)}, so it no longer follows edits.",
+				hint="A migration rebuilt its table; run 'manage.py rebuild_fulltext_index'.",
+				id="core.E001",
+			))
+	return errors
+
+
+def create_postgres_index(cursor, table, columns):
+	"""Generated, weighted tsvector column with a GIN index"""
+	vector = " || ".join(
+		f"setweight(to_tsvector('simple', coalesce({column}, '')), '{POSTGRES_WEIGHTS[position]}')"
+		for position, column in enumerate(columns)
+	)
+	cursor.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED")
+	cursor.execute(f"CREATE INDEX {table}_search_idx ON {table} USING GIN (search_vector)")
+
+
+def drop_postgres_index(cursor, table):
+	cursor.execute(f"DROP INDEX IF EXISTS {table}_search_idx")
+	cursor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+
+
+def fulltext_search(queryset, index, query, highlight=False):
+	"""
+	Filter ``queryset`` to rows matching every word of ``query`` (the last
+	characters of each word may be missing) and order them best match first.
+	``index`` names an entry of FULLTEXT_INDEXES.
+
+	Uses the FTS5 table on SQLite and the tsvector column on Postgres. Adds a
+	``search_rank`` attribute and, with ``highlight``, ``search_highlight`` (the name
+	with matches marked) and ``search_snippet`` (a marked excerpt of the best
+	matching text). Other databases fall back to unranked substring matching.
+	"""
+	terms = search_terms(query)
+	if not terms:
+		return queryset.none()
+	table, columns, weights = FULLTEXT_INDEXES[index]
+
+	if connection.vendor == "sqlite" and _sqlite_fts_ready(table):
+		fts = fts_table(table)
+		select = {"search_rank": f"bm25({fts}, {', '.join(str(weight) for weight in weights)})"}
+		if highlight:
+			select["search_highlight"] = f"highlight({fts}, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}')"
+			select["search_snippet"] = f"snippet({fts}, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '...', 16)"
+		return queryset.extra(
+			select=select,
+			tables=[fts],
+			where=[f"{fts} MATCH %s", f"{fts}.rowid = {table}.id"],
+			params=[" ".join(f'"{term}"*' for term in terms)],
+		).order_by("search_rank")
+
+	if connection.vendor == "postgresql":
+		tsquery = " & ".join(f"{term}:*" for term in terms)
+		select = {"search_rank": f"ts_rank_cd({table}.search_vector, to_tsquery('simple', %s))"}
+		select_params = [tsquery]
+		if highlight:
+			options = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}"
+			select["search_highlight"] = f"ts_headline('simple', {table}.name, to_tsquery('simple', %s), '{options}, HighlightAll=true')"
+			select["search_snippet"] = (
+				f"ts_headline('simple', concat_ws(' ', {', '.join(f'{table}.{column}' for column in columns[1:])}), "
+				f"to_tsquery('simple', %s), '{options}, MaxWords=16, MinWords=6')"
+			)
+			select_params += [tsquery, tsquery]
+		return queryset.extra(
+			select=select,
+			select_params=select_params,
+			where=[f"{table}.search_vector @@ to_tsquery('simple', %s)"],
+			params=[tsquery],
+		).order_by("-search_rank")
+
+	condition = Q()
+	for term in terms:
+		term_condition = Q()
+		for column in columns:
+			term_condition |= Q(**{f"{column}__icontains": term})
+		condition &= term_condition
+	return queryset.filter(condition)
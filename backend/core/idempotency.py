@@ -0,0 +1,150 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def _owner(request):
+	user = getattr(request, "user", None)
+	if user is not None and user.is_authenticated:
+		return f"user:{user.pk}"
+	# Anonymous callers are told apart by client address (as the throttles see it) and user agent
+	client = f"{BaseThrottle().get_ident(request)}\n{request.META.get('HTTP_USER_AGENT', '')}"
+	return f"anonymous:{hashlib.sha256(client.encode()).hexdigest()[:32]}"
+
+
+def _fingerprint(request):
+	"""Hash of the method, path and body so a key cannot be reused for a different request"""
+	data = request.data
+	if hasattr(data, "lists"):
+		data = {key: values for key, values in data.lists()}
+	body = json.dumps(data, sort_keys=True, cls=JSONEncoder)
+	return hashlib.sha256(f"{request.method}\n{request.path}\n{body}".encode()).hexdigest()
+
+
+def _replay(record):
+	response = Response(record.response_body, status=record.response_status)
+	response[REPLAY_HEADER] = "true"
+	return response
+
+
+def _acquire(scope, owner, key, fingerprint):
+	"""
+	Take the lock for ``key`` or find its earlier outcome.
+
+	Returns (record, None) when the caller should run the view, or (None, response)
+	when the stored response (or a conflict) should be returned instead. A retry of
+	a finished request costs one SELECT.
+	"""
+	now = timezone.now()
+	record = IdempotencyKey.objects.filter(scope=scope, owner=owner, key=key).first()
+	if record is not None and record.expires_at <= now:
+		IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+		record = None
+
+	if record is None:
+		try:
+			with transaction.atomic():
+				return IdempotencyKey.objects.create(
+					scope=scope,
+					owner=owner,
+					key=key,
+					fingerprint=fingerprint,
+					locked_at=now,
+					expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+				), None
+		except IntegrityError:
+			# A concurrent duplicate inserted the row first
+			record = IdempotencyKey.objects.get(scope=scope, owner=owner, key=key)
+
+	if record.fingerprint != fingerprint:
+		return None, Response(
+			{"detail": f"{HEADER} was already used for a different request."},
+			status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+		)
+	if record.status == "COMPLETED":
+		return None, _replay(record)
+
+	# The original request is still running, unless its worker died holding the lock
+	stale_before = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+	taken = IdempotencyKey.objects.filter(
+		pk=record.pk, status="IN_PROGRESS", locked_at__lte=stale_before,
+	).update(locked_at=now)
+	if taken:
+		record.locked_at = now
+		return record, None
+	return None, Response(
+		{"detail": f"A request with this {HEADER} is still being processed."},
+		status=status.HTTP_409_CONFLICT,
+		headers={"Retry-After": "1"},
+	)
+
+
+def _store(record, response):
+	body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+	IdempotencyKey.objects.filter(pk=record.pk).update(
+		status="COMPLETED",
+		response_status=response.status_code,
+		response_body=body,
+	)
+
+
+def idempotent(scope):
+	"""
+	Make a POST view method safe to retry with an ``Idempotency-Key`` header.
+
+	The first request under a key is run and its response stored; retries with the
+	same key and body get the stored response back without running the view again.
+	Server errors are not stored, so the client can retry them. Requests without the
+	header are unaffected.
+	"""
+	def decorator(view):
+		@wraps(view)
+		def wrapper(self, request, *args, **kwargs):
+			key = request.headers.get(HEADER)
+			if not key:
+				return view(self, request, *args, **kwargs)
+			if len(key) > 255:
+				return Response({"detail": f"{HEADER} must be at most 255 characters."}, status=status.HTTP_400_BAD_REQUEST)
+
+			record, response = _acquire(scope, _owner(request), key, _fingerprint(request))
+			if response is not None:
+				return response
+			try:
+				response = view(self, request, *args, **kwargs)
+			except Exception:
+				IdempotencyKey.objects.filter(pk=record.pk).delete()
+				raise
+			if response.status_code >= 500:
+				IdempotencyKey.objects.filter(pk=record.pk).delete()
+			else:
+				_store(record, response)
+			return response
+		return wrapper
+	return decorator
+
+
+def purge_expired_keys(batch_size=1000):
+	"""Delete expired keys in batches; returns how many were removed"""
+	purged = 0
+	while True:
+		ids = list(
+			IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list("pk", flat=True)[:batch_size]
+		)
+		if not ids:
+			return purged
+		purged += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,113 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import InventoryMovement
+
+
+# Reasons whose deltas are left pending and folded into quantity_available later.
+# Only increments are deferred: a late increment can never oversell, whereas
+# decrements have to hit the product row straight away to guard the stock.
+PENDING_REASONS = {"CANCEL", "RESTOCK"}
+
+# Ledger field pointing at the product, per product_type
+PRODUCT_FIELDS = {"STORE": "store_product", "EQUIPMENT": "equipment"}
+
+
+def build_movements(lines, products, reason, sign=-1, orders_by_supplier=None, created_by=None, note=""):
+	"""Build unsaved ledger rows for ``lines`` ({(product_type, product_id): quantity})"""
+	applied_at = None if reason in PENDING_REASONS else timezone.now()
+	movements = []
+	for (product_type, pk), quantity in lines.items():
+		product = products[(product_type, pk)]
+		movements.append(InventoryMovement(
+			supplier_id=product.supplier_id,
+			product_type=product_type,
+			store_product_id=pk if product_type == "STORE" else None,
+			equipment_id=pk if product_type == "EQUIPMENT" else None,
+			quantity_delta=sign * quantity,
+			reason=reason,
+			order=(orders_by_supplier or {}).get(product.supplier_id),
+			created_by=created_by,
+			note=note,
+			applied_at=applied_at,
+		))
+	return movements
+
+
+def record_order_cancellation(order, user=None):
+	"""Append pending CANCEL movements that put a cancelled order's items back in stock"""
+	movements = []
+	for item in order.items.all():
+		movements.append(InventoryMovement(
+			supplier_id=order.supplier_id,
+			product_type=item.product_type,
+			store_product_id=item.store_product_id,
+			equipment_id=item.equipment_id,
+			quantity_delta=item.quantity,
+			reason="CANCEL",
+			order=order,
+			created_by=user,
+			note=f"Order {order.order_number} cancelled",
+		))
+	InventoryMovement.objects.bulk_create(movements)
+	return movements
+
+
+def record_adjustment(product_type, product, old_quantity, user=None, note=""):
+	"""Log a direct edit of quantity_available; the product row already holds the new value"""
+	delta = product.quantity_available - old_quantity
+	if not delta:
+		return None
+	return InventoryMovement.objects.create(
+		supplier_id=product.supplier_id,
+		product_type=product_type,
+		store_product=product if product_type == "STORE" else None,
+		equipment=product if product_type == "EQUIPMENT" else None,
+		quantity_delta=delta,
+		reason="ADJUSTMENT",
+		created_by=user,
+		note=note,
+		applied_at=timezone.now(),
+	)
+
+
+def fold_pending_movements(batch_size=1000, **filters):
+	"""
+	Apply pending ledger deltas to quantity_available in batches; returns how many
+	movements were folded. Each batch is read under row locks and stamped with
+	applied_at before its deltas are applied, so concurrent folders never apply the
+	same movement twice.
+
+	``filters`` narrow the fold to some movements, e.g. those of products whose
+	quantity is about to be overwritten with an absolute value, which would
+	otherwise have the pending deltas added on top when they are folded later.
+	"""
+	from .orders import increment_stock
+
+	folded = 0
+	while True:
+		with transaction.atomic():
+			# With SKIP LOCKED (PostgreSQL, MySQL 8) concurrent folders take disjoint
+			# batches; SQLite has a single writer, so a second folder cannot interleave
+			batch = list(
+				InventoryMovement.objects.select_for_update(skip_locked=True)
+				.filter(applied_at__isnull=True, **filters).order_by("created_at")
+				.values_list("pk", "product_type", "store_product_id", "equipment_id", "quantity_delta")[:batch_size]
+			)
+			if not batch:
+				return folded
+			claimed = InventoryMovement.objects.filter(
+				pk__in=[row[0] for row in batch], applied_at__isnull=True,
+			).update(applied_at=timezone.now())
+			if claimed != len(batch):
+				# Another folder got to some of these first; read the batch again
+				transaction.set_rollback(True)
+				continue
+			lines = {}
+			# Exactly the rows read above; re-reading by applied_at would also pick up
+			# another folder's batch stamped with the same time
+			for _, product_type, store_product_id, equipment_id, delta in batch:
+				key = (product_type, store_product_id if product_type == "STORE" else equipment_id)
+				lines[key] = lines.get(key, 0) + delta
+			increment_stock(lines)
+		folded += claimed
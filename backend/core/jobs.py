@@ -0,0 +1,164 @@
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+# Retry n waits about RETRY_BASE_SECONDS * 2 ** (n - 1), at most RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 3600
+
+# Task name -> function, filled by @task
+TASKS = {}
+
+
+def task(name, max_attempts=5):
+	"""Register a function as a job task; its job payload is passed as keyword arguments"""
+	def decorator(function):
+		TASKS[name] = (function, max_attempts)
+		return function
+	return decorator
+
+
+def enqueue(name, run_after=None, **payload):
+	"""
+	Queue ``name`` to run with ``payload`` (JSON-serializable keyword arguments).
+
+	One INSERT on the caller's connection: called inside transaction.atomic() with a
+	business write, the job exists exactly when that write commits.
+	"""
+	if name not in TASKS:
+		raise ValueError(f"Unknown job task {name!r}")
+	return Job.objects.create(
+		task=name,
+		payload=payload,
+		run_after=run_after or timezone.now(),
+		max_attempts=TASKS[name][1],
+	)
+
+
+def retry_delay(attempts):
+	delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+	# Jitter keeps jobs that failed together from retrying together
+	return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def worker_name():
+	return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_jobs(worker, limit=10):
+	"""
+	Mark up to ``limit`` due jobs RUNNING for ``worker`` and return them, oldest first.
+
+	With SKIP LOCKED (PostgreSQL, MySQL 8) concurrent workers lock and take disjoint
+	batches without waiting on each other. Backends without row locks (SQLite) ignore
+	it; there the conditional update alone decides which worker gets a job.
+	"""
+	now = timezone.now()
+	due = Job.objects.filter(status="PENDING", run_after__lte=now).order_by("run_after", "pk")
+	locking = connection.features.has_select_for_update_skip_locked
+	# A read then write in one SQLite transaction can fail outright when another worker writes first
+	with transaction.atomic() if locking else nullcontext():
+		ids = list(due.select_for_update(skip_locked=True).values_list("pk", flat=True)[:limit])
+		if not ids:
+			return []
+		Job.objects.filter(pk__in=ids, status="PENDING").update(
+			status="RUNNING", locked_by=worker, locked_at=now, attempts=F("attempts") + 1, updated_at=now,
+		)
+	return list(Job.objects.filter(pk__in=ids, status="RUNNING", locked_by=worker, locked_at=now).order_by("run_after", "pk"))
+
+
+def run_job(job):
+	"""Run a claimed job and record the outcome; failures are retried with backoff until max_attempts"""
+	now = timezone.now()
+	mine = Job.objects.filter(pk=job.pk, status="RUNNING", locked_by=job.locked_by)
+	entry = TASKS.get(job.task)
+	try:
+		if entry is None:
+			raise LookupError(f"Unknown job task {job.task!r}")
+		entry[0](**job.payload)
+	except Exception:
+		error = traceback.format_exc()
+		if job.attempts >= job.max_attempts:
+			logger.error("Job %s (%s) failed for good after %s attempt(s)", job.pk, job.task, job.attempts, exc_info=True)
+			mine.update(status="FAILED", last_error=error, finished_at=timezone.now(), updated_at=timezone.now())
+			return "FAILED"
+		logger.warning("Job %s (%s) failed, attempt %s of %s", job.pk, job.task, job.attempts, job.max_attempts, exc_info=True)
+		mine.update(
+			status="PENDING", last_error=error, locked_by="", locked_at=None,
+			run_after=now + retry_delay(job.attempts), updated_at=timezone.now(),
+		)
+		return "PENDING"
+	mine.update(status="COMPLETED", finished_at=timezone.now(), updated_at=timezone.now())
+	return "COMPLETED"
+
+
+def requeue_stale_jobs(lease_seconds=None):
+	"""Give back RUNNING jobs whose worker has held them past the lease, presumably because it died"""
+	lease_seconds = lease_seconds or settings.JOB_LEASE_SECONDS
+	stale = Job.objects.filter(status="RUNNING", locked_at__lt=timezone.now() - timedelta(seconds=lease_seconds))
+	failed = stale.filter(attempts__gte=F("max_attempts")).update(
+		status="FAILED", last_error="Worker lease expired", finished_at=timezone.now(), updated_at=timezone.now(),
+	)
+	requeued = stale.update(status="PENDING", locked_by="", locked_at=None, updated_at=timezone.now())
+	return requeued, failed
+
+
+def run_worker(batch_size=10, poll_seconds=1.0, burst=False, should_stop=lambda: False):
+	"""
+	Claim and run jobs until ``should_stop()``; with ``burst``, stop once none are due.
+	Returns how many jobs were run.
+	"""
+	worker = worker_name()
+	ran = 0
+	next_lease_check = 0
+	while not should_stop():
+		close_old_connections()
+		try:
+			if time.monotonic() >= next_lease_check:
+				requeue_stale_jobs()
+				next_lease_check = time.monotonic() + poll_seconds * 30
+			jobs = claim_jobs(worker, batch_size)
+		except DatabaseError:
+			# e.g. SQLite "database is locked" under write contention; try again shortly
+			logger.warning("Could not claim jobs", exc_info=True)
+			jobs = []
+		for job in jobs:
+			try:
+				run_job(job)
+			except DatabaseError:
+				# The outcome was not recorded; the job stays RUNNING until its lease expires
+				logger.warning("Could not record the outcome of job %s (%s)", job.pk, job.task, exc_info=True)
+			ran += 1
+		if not jobs:
+			if burst:
+				break
+			time.sleep(poll_seconds)
+	return ran
+
+
+def purge_finished_jobs(older_than_days, batch_size=1000):
+	"""Delete jobs completed or failed more than ``older_than_days`` ago; returns how many were removed"""
+	cutoff = timezone.now() - timedelta(days=older_than_days)
+	purged = 0
+	while True:
+		ids = list(
+			Job.objects.filter(status__in=["COMPLETED", "FAILED"], finished_at__lte=cutoff).values_list("pk", flat=True)[:batch_size]
+		)
+		if not ids:
+			return purged
+		purged += Job.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from core.models import DonorProfile
+from core.serializers import CustomTokenObtainPairSerializer
+from core.throttling import load_shedder
+
+
+DEFAULT_PATHS = ["/api/hospitals/", "/api/needs/", "/api/accident-alerts/", "/api/metrics/overview/"]
+
+
+def _host():
+	# A host the requests pass ALLOWED_HOSTS with
+	return next((host for host in settings.ALLOWED_HOSTS if host != "*" and not host.startswith(".")), "localhost")
+
+
+def _summary(mode, latencies, statuses, elapsed):
+	latencies = sorted(latencies)
+	return {
+		"mode": mode,
+		"requests": len(latencies),
+		"seconds": elapsed,
+		"per_second": len(latencies) / elapsed,
+		"p50_ms": latencies[len(latencies) // 2] * 1000,
+		"p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+		"statuses": dict(Counter(statuses)),
+	}
+
+
+def _run_wsgi(paths, total, concurrency, headers):
+	# A threaded WSGI server: one thread, and one database connection, per request in flight
+	handler = WSGIHandler()
+	factory = RequestFactory()
+	local = threading.local()
+
+	def one(index):
+		started = time.perf_counter()
+		environ = factory.get(paths[index % len(paths)], HTTP_HOST=_host(), **headers).environ
+		response = handler(environ, lambda status, response_headers, exc_info=None: setattr(local, "status", int(status[:3])))
+		response.close()
+		return time.perf_counter() - started, local.status
+
+	started = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=concurrency) as executor:
+		results = list(executor.map(one, range(total)))
+	elapsed = time.perf_counter() - started
+	return _summary("wsgi", [r[0] for r in results], [r[1] for r in results], elapsed)
+
+
+def _run_asgi(paths, total, concurrency, headers):
+	# An ASGI server: every request in flight is a task on one event loop
+	handler = ASGIHandler()
+	raw_headers = [(b"host", _host().encode())] + [
+		(name[5:].lower().replace("_", "-").encode(), value.encode()) for name, value in headers.items()
+	]
+
+	async def one(index, slots):
+		async with slots:
+			path, _, query = paths[index % len(paths)].partition("?")
+			scope = {
+				"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+				"path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+				"headers": raw_headers, "client": ("127.0.0.1", 50000), "server": (_host(), 80),
+			}
+			sent = []
+
+			async def receive():
+				return {"type": "http.request", "body": b"", "more_body": False}
+
+			async def send(message):
+				sent.append(message)
+
+			started = time.perf_counter()
+			await handler(scope, receive, send)
+			return time.perf_counter() - started, sent[0]["status"]
+
+	async def run_all():
+		slots = asyncio.Semaphore(concurrency)
+		return await asyncio.gather(*(one(index, slots) for index in range(total)))
+
+	started = time.perf_counter()
+	results = asyncio.run(run_all())
+	elapsed = time.perf_counter() - started
+	return _summary("asgi", [r[0] for r in results], [r[1] for r in results], elapsed)
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare WSGI and ASGI throughput of the hot read endpoints at high concurrency, in process "
+		"and without a network server. Each mode runs in its own subprocess, ASGI with the async views; "
+		"throttles and load shedding are switched off there. Use the same database as production."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--path", action="append", dest="paths", help=f"Path to request; repeatable, default {' '.join(DEFAULT_PATHS)}")
+		parser.add_argument("--requests", type=int, default=1000)
+		parser.add_argument("--concurrency", type=int, default=100)
+		parser.add_argument("--user", help="Email of a user to sign requests as; adds /api/donors/dashboard/ to the default paths")
+		parser.add_argument("--mode", choices=["wsgi", "asgi"], help="Run one mode in this process and print JSON (used internally)")
+
+	def handle(self, *args, **options):
+		paths = options["paths"] or DEFAULT_PATHS + (["/api/donors/dashboard/"] if options["user"] else [])
+		if options["mode"]:
+			return self._run_mode(options["mode"], paths, options)
+
+		results = []
+		for mode in ("wsgi", "asgi"):
+			command = [sys.executable, "-m", "django", "benchmark_asgi", "--mode", mode,
+				"--requests", str(options["requests"]), "--concurrency", str(options["concurrency"])]
+			command += [argument for path in paths for argument in ("--path", path)]
+			if options["user"]:
+				command += ["--user", options["user"]]
+			env = dict(os.environ, ASYNC_VIEWS="true" if mode == "asgi" else "false")
+			completed = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+			if completed.returncode:
+				raise CommandError(f"{mode} run failed:\n{completed.stderr}")
+			results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+		self.stdout.write(f"{options['requests']} requests, {options['concurrency']} concurrent, over {', '.join(paths)}")
+		for result in results:
+			self.stdout.write(
+				f"{result['mode']}: {result['per_second']:.0f} req/s, p50 {result['p50_ms']:.1f} ms, "
+				f"p99 {result['p99_ms']:.1f} ms, statuses {result['statuses']}"
+			)
+
+	def _run_mode(self, mode, paths, options):
+		settings.THROTTLE_BUCKETS = {}
+		load_shedder.max_in_flight = sys.maxsize
+		headers = {}
+		if options["user"]:
+			user = DonorProfile.objects.filter(email=options["user"]).first()
+			if user is None:
+				raise CommandError(f"No user with email {options['user']}")
+			token = CustomTokenObtainPairSerializer.get_token(user).access_token
+			headers["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+		run = _run_asgi if mode == "asgi" else _run_wsgi
+		result = run(paths, options["requests"], options["concurrency"], headers)
+		self.stdout.write(json.dumps(result))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.inventory import fold_pending_movements
+
+
+class Command(BaseCommand):
+	help = "Fold pending inventory ledger movements (cancellations, restocks) into product stock. Run periodically from cron."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--batch-size", type=int, default=1000)
+
+	def handle(self, *args, **options):
+		folded = fold_pending_movements(batch_size=options["batch_size"])
+		self.stdout.write(self.style.SUCCESS(f"Folded {folded} inventory movement(s)."))
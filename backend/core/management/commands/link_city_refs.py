@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.cities import link_unresolved_cities
+
+
+class Command(BaseCommand):
+	help = (
+		"Link records whose free-text city matched no city to the city or alias it matches now. "
+		"Run after adding cities or aliases in the admin; lists the most common unresolved names to review."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--batch-size", type=int, default=1000)
+		parser.add_argument("--show", type=int, default=20, help="How many unresolved names to list")
+
+	def handle(self, *args, **options):
+		linked, unresolved = link_unresolved_cities(batch_size=options["batch_size"])
+		for name, count in unresolved.most_common(options["show"]):
+			self.stdout.write(f"{count:>8}  {name}")
+		self.stdout.write(self.style.SUCCESS(
+			f"Linked {linked} record(s); {sum(unresolved.values())} still have a city matching no city or alias."
+		))
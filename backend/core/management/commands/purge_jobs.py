@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.jobs import purge_finished_jobs
+
+
+class Command(BaseCommand):
+	help = "Delete background jobs that completed or failed a while ago. Run periodically from cron."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--days", type=int, default=7, help="Keep jobs finished within this many days")
+		parser.add_argument("--batch-size", type=int, default=1000)
+
+	def handle(self, *args, **options):
+		purged = purge_finished_jobs(options["days"], batch_size=options["batch_size"])
+		self.stdout.write(self.style.SUCCESS(f"Purged {purged} job(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.revocation import purge_expired_tokens
+
+
+class Command(BaseCommand):
+	help = "Delete revocations of tokens that have expired. Run periodically from cron."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--batch-size", type=int, default=1000)
+
+	def handle(self, *args, **options):
+		purged = purge_expired_tokens(batch_size=options["batch_size"])
+		self.stdout.write(self.style.SUCCESS(f"Purged {purged} revoked token(s)."))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.fulltext import FULLTEXT_INDEXES, missing_sqlite_triggers, rebuild_sqlite_index, sqlite_has_fts5
+
+
+class Command(BaseCommand):
+	help = (
+		"Recreate SQLite full-text indexes whose sync triggers were dropped, as happens when a migration "
+		"rebuilds a product or search document table. Run after such migrations; --check only reports."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--index", action="append", dest="indexes", help=f"Index to rebuild even if intact ({', '.join(FULLTEXT_INDEXES)}); repeatable")
+		parser.add_argument("--check", action="store_true", help="Exit with an error if any index lost triggers, without changing anything")
+		parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+	def handle(self, *args, **options):
+		using = options["database"]
+		if connections[using].vendor != "sqlite":
+			self.stdout.write("Only SQLite keeps full-text indexes in sync through triggers; nothing to do.")
+			return
+		unknown = set(options["indexes"] or ()) - set(FULLTEXT_INDEXES)
+		if unknown:
+			raise CommandError(f"Unknown index(es): {', '.join(sorted(unknown))}")
+
+		missing = missing_sqlite_triggers(using)
+		for index, lost in missing.items():
+			self.stdout.write(f"{index}: missing {', '.join(lost)}")
+		if options["check"]:
+			if missing:
+				raise CommandError(f"{len(missing)} full-text index(es) no longer follow edits.")
+			self.stdout.write(self.style.SUCCESS("All full-text index triggers are in place."))
+			return
+
+		rebuild = sorted(set(missing) | set(options["indexes"] or ()))
+		if rebuild:
+			with connections[using].cursor() as cursor:
+				if not sqlite_has_fts5(cursor):
+					raise CommandError("This SQLite build has no FTS5.")
+		for index in rebuild:
+			rebuild_sqlite_index(index, using)
+			self.stdout.write(f"{index}: rebuilt")
+		self.stdout.write(self.style.SUCCESS("Full-text indexes rebuilt."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.analytics import rebuild_sales_aggregates
+
+
+class Command(BaseCommand):
+	help = "Recompute supplier daily sales aggregates from orders. Use for backfills or to repair drift."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--supplier", type=int, action="append", dest="suppliers", help="Only rebuild this supplier id (repeatable)")
+
+	def handle(self, *args, **options):
+		rows = rebuild_sales_aggregates(supplier_ids=options["suppliers"])
+		self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} supplier-day aggregate(s)."))
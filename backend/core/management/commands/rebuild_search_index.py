@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import SEARCH_SOURCES, rebuild_search_documents
+
+
+class Command(BaseCommand):
+	help = "Rebuild the denormalized search documents behind /api/search/ from their source tables."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--type", action="append", dest="types", help=f"Entity type to rebuild ({', '.join(SEARCH_SOURCES)}); repeatable, default all")
+		parser.add_argument("--chunk-size", type=int, default=1000)
+
+	def handle(self, *args, **options):
+		types = options["types"]
+		unknown = set(types or ()) - set(SEARCH_SOURCES)
+		if unknown:
+			raise CommandError(f"Unknown type(s): {', '.join(sorted(unknown))}")
+		counts = rebuild_search_documents(types, chunk_size=options["chunk_size"])
+		for entity_type, count in counts.items():
+			self.stdout.write(f"{entity_type}: {count} document(s)")
+		self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.catalog import run_pending_imports
+
+
+class Command(BaseCommand):
+	help = "Run queued supplier catalogue imports. Run periodically from cron."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--limit", type=int, default=None, help="Stop after this many jobs")
+		parser.add_argument("--chunk-size", type=int, default=1000)
+
+	def handle(self, *args, **options):
+		ran = run_pending_imports(limit=options["limit"], chunk_size=options["chunk_size"])
+		self.stdout.write(self.style.SUCCESS(f"Ran {ran} catalog import(s)."))
@@ -0,0 +1,78 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import run_worker
+
+
+# How often the parent checks for workers that died
+RESTART_CHECK_SECONDS = 1
+
+
+def _worker(stop, batch_size, poll_seconds, burst):
+	# Children leave shutdown to the parent, which sets ``stop`` on SIGINT or SIGTERM
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	signal.signal(signal.SIGTERM, signal.SIG_IGN)
+	run_worker(batch_size=batch_size, poll_seconds=poll_seconds, burst=burst, should_stop=stop.is_set)
+
+
+class Command(BaseCommand):
+	help = (
+		"Run queued background jobs in worker processes until interrupted. "
+		"Workers finish the batch in hand on SIGINT or SIGTERM."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--processes", type=int, default=settings.JOB_WORKER_PROCESSES)
+		parser.add_argument("--batch-size", type=int, default=10, help="Jobs claimed per query")
+		parser.add_argument("--poll-seconds", type=float, default=1.0, help="Wait between polls while no job is due")
+		parser.add_argument("--burst", action="store_true", help="Exit once no job is due, e.g. from cron")
+
+	def handle(self, *args, **options):
+		# Forked children inherit the loaded Django project instead of setting it up again
+		context = multiprocessing.get_context("fork")
+		stop = context.Event()
+		worker_args = (stop, options["batch_size"], options["poll_seconds"], options["burst"])
+
+		stopping = []
+
+		def shut_down(signum, frame):
+			# Only flag it here: setting ``stop`` could deadlock on its lock if the loop below holds it
+			stopping.append(signum)
+
+		signal.signal(signal.SIGINT, shut_down)
+		signal.signal(signal.SIGTERM, shut_down)
+		# Children must not share the parent's database connections
+		connections.close_all()
+
+		def start(index):
+			process = context.Process(target=_worker, args=worker_args, name=f"job-worker-{index}")
+			process.start()
+			return process
+
+		workers = [start(index) for index in range(options["processes"])]
+		# Replace workers that die before shutdown; in burst mode a clean exit means the queue is drained
+		while not stopping:
+			time.sleep(RESTART_CHECK_SECONDS)
+			if stopping:
+				break
+			running = 0
+			for index, process in enumerate(workers):
+				if process.is_alive():
+					running += 1
+				elif not (options["burst"] and process.exitcode == 0):
+					self.stderr.write(f"{process.name} exited with code {process.exitcode}; restarting it.")
+					workers[index] = start(index)
+					running += 1
+			if not running:
+				break
+		if stopping:
+			self.stdout.write("Stopping workers after their current batch...")
+			stop.set()
+		for process in workers:
+			process.join()
+		self.stdout.write(self.style.SUCCESS(f"{len(workers)} worker(s) stopped."))
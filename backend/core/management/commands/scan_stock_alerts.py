@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.alerts import scan_stock_alerts
+
+
+class Command(BaseCommand):
+	help = "Raise expiry and low-stock alerts for medical store products. Run daily from cron."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--days", type=int, default=settings.STOCK_ALERT_EXPIRY_DAYS)
+		parser.add_argument("--chunk-size", type=int, default=1000)
+
+	def handle(self, *args, **options):
+		flagged, resolved = scan_stock_alerts(options["days"], chunk_size=options["chunk_size"])
+		self.stdout.write(self.style.SUCCESS(f"Flagged {flagged} product(s), resolved {resolved} alert(s)."))
@@ -0,0 +1,50 @@
+from .models import (
+	AccidentAlert,
+	Appointment,
+	DeceasedDonorRequest,
+	DonationRequest,
+	DonorProfile,
+	EmergencyNeed,
+	Hospital,
+	HospitalNeed,
+	MarketplaceItem,
+	MedicalEquipment,
+	MedicalOrder,
+	MedicalStoreProduct,
+	OrganDonor,
+)
+
+
+# Overview counts are shared by every visitor of the landing page
+METRICS_CACHE_KEY = "metrics:overview"
+
+
+def metrics_overview():
+	"""Aggregate counts shown on the public landing page"""
+	donors_count = DonorProfile.objects.count()
+
+	needs_served = EmergencyNeed.objects.filter(status="FULFILLED").count() + \
+		HospitalNeed.objects.filter(status__in=["FULFILLED", "COMPLETED"]).count()
+
+	hospitals_count = Hospital.objects.count()
+
+	items_listed = (
+		MarketplaceItem.objects.count()
+		+ MedicalStoreProduct.objects.count()
+		+ MedicalEquipment.objects.count()
+	)
+
+	module_breakdown = {
+		"donor": donors_count + DonationRequest.objects.count(),
+		"hospital": hospitals_count + HospitalNeed.objects.count() + Appointment.objects.count(),
+		"organ": OrganDonor.objects.count() + DeceasedDonorRequest.objects.count() + AccidentAlert.objects.count(),
+		"marketplace": items_listed + MedicalOrder.objects.count(),
+	}
+
+	return {
+		"donors": donors_count,
+		"needs_served": needs_served,
+		"hospitals": hospitals_count,
+		"items_listed": items_listed,
+		"module_breakdown": module_breakdown,
+	}
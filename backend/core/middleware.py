@@ -0,0 +1,66 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import JsonResponse
+
+from .context import RequestProfiles
+from .throttling import load_shedder, view_priority
+
+
+class RequestProfilesMiddleware:
+	"""Attach ``request.profiles``, the lazily loaded profiles of the signed-in user"""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		if iscoroutinefunction(get_response):
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		request.profiles = RequestProfiles(request)
+		# Under ASGI get_response is a coroutine function and its awaitable is returned as is
+		return self.get_response(request)
+
+
+class LoadSheddingMiddleware:
+	"""
+	Refuse requests with 503 while this process is overloaded, lowest priority
+	first, so CRITICAL views such as emergency posting keep getting through.
+	"""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		if iscoroutinefunction(get_response):
+			markcoroutinefunction(self)
+			# Checked on the event loop rather than through a thread
+			self.process_view = self._aprocess_view
+
+	def __call__(self, request):
+		if iscoroutinefunction(self):
+			return self.__acall__(request)
+		load_shedder.started()
+		try:
+			return self.get_response(request)
+		finally:
+			load_shedder.finished()
+
+	async def __acall__(self, request):
+		load_shedder.started()
+		try:
+			return await self.get_response(request)
+		finally:
+			load_shedder.finished()
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		return self._refusal(request, view_func)
+
+	async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+		return self._refusal(request, view_func)
+
+	def _refusal(self, request, view_func):
+		if load_shedder.admit(view_priority(view_func, request.method)):
+			return None
+		response = JsonResponse({"detail": "Server is busy, please retry shortly."}, status=503)
+		response["Retry-After"] = "1"
+		return response
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_medicalequipment_medicalessential_medicalorder_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product_type', models.CharField(choices=[('STORE', 'Store Product'), ('EQUIPMENT', 'Equipment')], max_length=20)),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('CONVERTED', 'Converted to order'), ('RELEASED', 'Released')], default='ACTIVE', max_length=20)),
+                ('expires_at', models.DateTimeField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to=settings.AUTH_USER_MODEL)),
+                ('equipment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='core.medicalequipment')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='core.medicalorder')),
+                ('store_product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='core.medicalstoreproduct')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='core_stockr_status_1d8a8b_idx'), models.Index(fields=['customer', 'status'], name='core_stockr_custome_553a03_idx')],
+            },
+        ),
+    ]
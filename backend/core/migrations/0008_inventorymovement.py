@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_ordernumbersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product_type', models.CharField(choices=[('STORE', 'Store Product'), ('EQUIPMENT', 'Equipment')], max_length=20)),
+                ('quantity_delta', models.IntegerField(help_text='Signed change in stock')),
+                ('reason', models.CharField(choices=[('ORDER', 'Order placed'), ('CANCEL', 'Order cancelled'), ('RESTOCK', 'Restock'), ('ADJUSTMENT', 'Manual adjustment'), ('HOLD', 'Cart hold'), ('RELEASE', 'Cart hold released')], max_length=20)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('applied_at', models.DateTimeField(blank=True, help_text='When the delta was folded into quantity_available', null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_movements', to=settings.AUTH_USER_MODEL)),
+                ('equipment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='core.medicalequipment')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_movements', to='core.medicalorder')),
+                ('store_product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='core.medicalstoreproduct')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='core.medicalessential')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['supplier', 'created_at'], name='core_invent_supplie_3953b4_idx'), models.Index(condition=models.Q(('applied_at__isnull', True)), fields=['created_at'], name='inventory_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_inventorymovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SupplierProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('product_type', models.CharField(choices=[('STORE', 'Store Product'), ('EQUIPMENT', 'Equipment')], max_length=20)),
+                ('product_id', models.PositiveBigIntegerField(help_text='MedicalStoreProduct or MedicalEquipment id, per product_type')),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='medicalorder',
+            index=models.Index(fields=['supplier', 'status'], name='core_medica_supplie_85927f_idx'),
+        ),
+        migrations.AddField(
+            model_name='supplierproductdailysales',
+            name='supplier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_daily_sales', to='core.medicalessential'),
+        ),
+        migrations.AddField(
+            model_name='supplierdailysales',
+            name='supplier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='core.medicalessential'),
+        ),
+        migrations.AddConstraint(
+            model_name='supplierproductdailysales',
+            constraint=models.UniqueConstraint(fields=('supplier', 'date', 'product_type', 'product_id'), name='unique_supplier_product_daily_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='supplierdailysales',
+            constraint=models.UniqueConstraint(fields=('supplier', 'date'), name='unique_supplier_daily_sales'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_supplier_sales_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('alert_type', models.CharField(choices=[('EXPIRING', 'Expiring soon'), ('EXPIRED', 'Expired'), ('LOW_STOCK', 'Low stock')], max_length=20)),
+                ('expiry_date', models.DateField(blank=True, null=True)),
+                ('quantity_available', models.PositiveIntegerField(default=0)),
+                ('message', models.CharField(blank=True, max_length=255)),
+                ('is_resolved', models.BooleanField(default=False)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='medicalstoreproduct',
+            name='reorder_level',
+            field=models.PositiveIntegerField(default=10, help_text='Raise a low-stock alert at or below this quantity'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalstoreproduct',
+            index=models.Index(fields=['is_active', 'expiry_date'], name='core_medica_is_acti_7fc9e3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalstoreproduct',
+            index=models.Index(fields=['supplier', 'expiry_date'], name='core_medica_supplie_d2f772_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalstoreproduct',
+            index=models.Index(fields=['supplier', 'quantity_available'], name='core_medica_supplie_947cbd_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockalert',
+            name='store_product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='core.medicalstoreproduct'),
+        ),
+        migrations.AddField(
+            model_name='stockalert',
+            name='supplier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='core.medicalessential'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(fields=['supplier', 'is_resolved', 'created_at'], name='core_stocka_supplie_d5da2e_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_resolved', False)), fields=('store_product', 'alert_type'), name='unique_open_stock_alert'),
+        ),
+    ]
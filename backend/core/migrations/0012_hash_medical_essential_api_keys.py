@@ -0,0 +1,53 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_existing_keys(apps, schema_editor):
+	MedicalEssential = apps.get_model("core", "MedicalEssential")
+	profiles = list(MedicalEssential.objects.only("pk", "api_key"))
+	for profile in profiles:
+		profile.api_key_prefix = profile.api_key[:11]
+		profile.api_key_hash = hashlib.sha256(profile.api_key.encode()).hexdigest()
+	MedicalEssential.objects.bulk_update(profiles, ["api_key_prefix", "api_key_hash"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+	dependencies = [
+		("core", "0011_idempotencykey"),
+	]
+
+	operations = [
+		migrations.AddField(
+			model_name="medicalessential",
+			name="api_key_prefix",
+			field=models.CharField(db_index=True, default="", help_text="Leading characters of the API key, used to look it up", max_length=16),
+			preserve_default=False,
+		),
+		migrations.AddField(
+			model_name="medicalessential",
+			name="api_key_hash",
+			field=models.CharField(help_text="SHA-256 of the API key", max_length=64, null=True),
+		),
+		migrations.AddField(
+			model_name="medicalessential",
+			name="api_key_last_used_at",
+			field=models.DateTimeField(blank=True, null=True),
+		),
+		migrations.AddField(
+			model_name="medicalessential",
+			name="api_key_usage_count",
+			field=models.PositiveBigIntegerField(default=0),
+		),
+		migrations.RunPython(hash_existing_keys, migrations.RunPython.noop),
+		migrations.RemoveField(
+			model_name="medicalessential",
+			name="api_key",
+		),
+		migrations.AlterField(
+			model_name="medicalessential",
+			name="api_key_hash",
+			field=models.CharField(help_text="SHA-256 of the API key", max_length=64, unique=True),
+		),
+	]
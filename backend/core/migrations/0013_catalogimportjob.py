@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_hash_medical_essential_api_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product_type', models.CharField(choices=[('STORE', 'Store Product'), ('EQUIPMENT', 'Equipment')], max_length=20)),
+                ('file', models.FileField(upload_to='catalog_imports/')),
+                ('file_format', models.CharField(choices=[('CSV', 'CSV'), ('NDJSON', 'Newline-delimited JSON')], max_length=10)),
+                ('file_size', models.PositiveBigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('bytes_processed', models.PositiveBigIntegerField(default=0)),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('updated_count', models.PositiveIntegerField(default=0)),
+                ('unchanged_count', models.PositiveIntegerField(default=0)),
+                ('duplicate_count', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('detail', models.TextField(blank=True, help_text='Why the import failed')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='catalog_imports', to=settings.AUTH_USER_MODEL)),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_imports', to='core.medicalessential')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='core_catalo_status_ee49f9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+# (table, column) pairs searched with pg_trgm similarity
+TRIGRAM_COLUMNS = [
+	("core_hospital", "name"),
+	("core_hospital", "city"),
+	("core_doctor", "name"),
+	("core_doctor", "specialization"),
+]
+
+
+def create_indexes(apps, schema_editor):
+	# SQLite and other databases use the in-process index in core.trigram instead
+	if schema_editor.connection.vendor != "postgresql":
+		return
+	schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+	for table, column in TRIGRAM_COLUMNS:
+		schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column}_trgm_idx ON {table} USING GIN ({column} gin_trgm_ops)")
+
+
+def drop_indexes(apps, schema_editor):
+	if schema_editor.connection.vendor != "postgresql":
+		return
+	for table, column in TRIGRAM_COLUMNS:
+		schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+	dependencies = [
+		("core", "0014_product_fulltext_search"),
+	]
+
+	operations = [
+		migrations.RunPython(create_indexes, drop_indexes),
+	]
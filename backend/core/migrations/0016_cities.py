@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='City',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=120)),
+                ('key', models.CharField(help_text='Normalized name, see core.cities.city_key', max_length=120, unique=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'cities',
+            },
+        ),
+        migrations.CreateModel(
+            name='CityAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=120)),
+                ('key', models.CharField(max_length=120, unique=True)),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='core.city')),
+            ],
+            options={
+                'verbose_name_plural': 'city aliases',
+            },
+        ),
+        migrations.AddField(
+            model_name='accidentalert',
+            name='city_ref',
+            field=models.ForeignKey(blank=True, help_text='Canonical city resolved from city', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='accident_alerts', to='core.city'),
+        ),
+        migrations.AddField(
+            model_name='deceaseddonorrequest',
+            name='deceased_city_ref',
+            field=models.ForeignKey(blank=True, help_text='Canonical city resolved from deceased_city', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deceased_donor_requests', to='core.city'),
+        ),
+        migrations.AddField(
+            model_name='donorprofile',
+            name='city_ref',
+            field=models.ForeignKey(blank=True, help_text='Canonical city resolved from city', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='donors', to='core.city'),
+        ),
+        migrations.AddField(
+            model_name='emergencyneed',
+            name='city_ref',
+            field=models.ForeignKey(blank=True, help_text='Canonical city resolved from city', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='emergency_needs', to='core.city'),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='city_ref',
+            field=models.ForeignKey(blank=True, help_text='Canonical city resolved from city', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='hospitals', to='core.city'),
+        ),
+        migrations.AddField(
+            model_name='marketplaceitem',
+            name='city_ref',
+            field=models.ForeignKey(blank=True, help_text='Canonical city resolved from city', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='marketplace_items', to='core.city'),
+        ),
+        migrations.AddField(
+            model_name='medicalessential',
+            name='city_ref',
+            field=models.ForeignKey(blank=True, help_text='Canonical city resolved from city', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='medical_essentials', to='core.city'),
+        ),
+        migrations.AddField(
+            model_name='organdonor',
+            name='city_ref',
+            field=models.ForeignKey(blank=True, help_text='Canonical city resolved from city', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='organ_donors', to='core.city'),
+        ),
+    ]
@@ -0,0 +1,116 @@
+import re
+import unicodedata
+
+from django.db import migrations
+from django.db.models import Avg
+
+
+BATCH_SIZE = 1000
+
+# Frozen copy of core.cities.CITY_FIELDS at the time of this migration
+CITY_FIELDS = [
+	("DonorProfile", "city", "city_ref"),
+	("EmergencyNeed", "city", "city_ref"),
+	("OrganDonor", "city", "city_ref"),
+	("Hospital", "city", "city_ref"),
+	("MarketplaceItem", "city", "city_ref"),
+	("DeceasedDonorRequest", "deceased_city", "deceased_city_ref"),
+	("AccidentAlert", "city", "city_ref"),
+	("MedicalEssential", "city", "city_ref"),
+]
+
+# canonical name -> former names and common spellings
+SEED_ALIASES = {
+	"Bengaluru": ["Bangalore", "Banglore", "Bengalore"],
+	"Mumbai": ["Bombay"],
+	"Chennai": ["Madras"],
+	"Kolkata": ["Calcutta"],
+	"Gurugram": ["Gurgaon"],
+	"Pune": ["Poona"],
+	"Mysuru": ["Mysore"],
+	"Mangaluru": ["Mangalore"],
+	"Thiruvananthapuram": ["Trivandrum"],
+	"Kochi": ["Cochin"],
+	"Kozhikode": ["Calicut"],
+	"Vadodara": ["Baroda"],
+	"Varanasi": ["Benares", "Banaras"],
+	"Prayagraj": ["Allahabad"],
+	"Puducherry": ["Pondicherry"],
+	"Visakhapatnam": ["Vizag", "Vishakhapatnam"],
+	"Delhi": ["New Delhi"],
+}
+
+
+def city_key(text):
+	# Frozen copy of core.cities.city_key
+	text = unicodedata.normalize("NFKD", text or "")
+	text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+	words = re.findall(r"[a-z0-9]+", text)
+	while len(words) > 1 and words[-1] in ("city", "district"):
+		words.pop()
+	return " ".join(words)
+
+
+def backfill_cities(apps, schema_editor):
+	City = apps.get_model("core", "City")
+	CityAlias = apps.get_model("core", "CityAlias")
+
+	for name, aliases in SEED_ALIASES.items():
+		city, _ = City.objects.get_or_create(key=city_key(name), defaults={"name": name})
+		for alias in aliases:
+			CityAlias.objects.get_or_create(key=city_key(alias), defaults={"city": city, "name": alias})
+
+	ids = dict(CityAlias.objects.values_list("key", "city_id"))
+	ids.update(City.objects.values_list("key", "id"))
+
+	# Only the seeded cities and aliases are linked; any other text, typos included,
+	# keeps city_ref NULL until an admin adds it and link_city_refs is run
+	def resolve(text):
+		return ids.get(city_key(text))
+
+	# Keyset batches; each batch is one read plus one UPDATE per distinct city in it
+	for model_name, text_field, ref_field in CITY_FIELDS:
+		model = apps.get_model("core", model_name)
+		last_pk = 0
+		while True:
+			rows = list(
+				model.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", text_field)[:BATCH_SIZE]
+			)
+			if not rows:
+				break
+			by_city = {}
+			for pk, text in rows:
+				city_id = resolve(text)
+				if city_id is not None:
+					by_city.setdefault(city_id, []).append(pk)
+			for city_id, pks in by_city.items():
+				model.objects.filter(pk__in=pks).update(**{f"{ref_field}_id": city_id})
+			last_pk = rows[-1][0]
+
+	# Centroid of each city from its hospitals' coordinates
+	Hospital = apps.get_model("core", "Hospital")
+	centroids = Hospital.objects.filter(
+		city_ref__isnull=False, latitude__isnull=False, longitude__isnull=False,
+	).values("city_ref").annotate(lat=Avg("latitude"), lng=Avg("longitude"))
+	for row in centroids:
+		City.objects.filter(pk=row["city_ref"], latitude__isnull=True).update(
+			latitude=round(row["lat"], 6), longitude=round(row["lng"], 6),
+		)
+
+
+def clear_city_refs(apps, schema_editor):
+	for model_name, _, ref_field in CITY_FIELDS:
+		apps.get_model("core", model_name).objects.update(**{ref_field: None})
+
+
+class Migration(migrations.Migration):
+	# Each batch commits on its own, so a large table is never locked for the whole backfill
+	atomic = False
+
+	dependencies = [
+		("core", "0016_cities"),
+	]
+
+	operations = [
+		migrations.RunPython(backfill_cities, clear_city_refs),
+	]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_backfill_cities'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('HOSPITAL', 'Hospital'), ('DOCTOR', 'Doctor'), ('STORE', 'Store Product'), ('EQUIPMENT', 'Equipment'), ('MARKETPLACE', 'Marketplace Item')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('subtitle', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('city', models.CharField(blank=True, max_length=120)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('city_ref', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='search_documents', to='core.city')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('entity_type', 'object_id'), name='unique_search_document'),
+        ),
+    ]
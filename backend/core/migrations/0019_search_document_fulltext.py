@@ -0,0 +1,99 @@
+from django.db import migrations
+
+
+# Frozen copy of core.fulltext.FULLTEXT_INDEXES["SEARCH"] at the time of this migration
+TABLE = "core_searchdocument"
+COLUMNS = ["title", "subtitle", "body"]
+
+
+# Frozen copies of the core.fulltext DDL helpers at the time of this migration, so
+# later changes to that module cannot change what this migration does
+POSTGRES_WEIGHTS = "ABBBCD"
+
+
+def fts_table(table):
+	return f"{table}_fts"
+
+
+def sqlite_has_fts5(cursor):
+	cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+	return bool(cursor.fetchone()[0])
+
+
+# SQLite drops these triggers whenever a later migration rebuilds the table (most
+# AlterField and RemoveField operations), and the index then silently goes stale.
+# After such a migration run "manage.py rebuild_fulltext_index"; "manage.py check
+# --database default" reports the loss.
+def create_sqlite_index(cursor, table, columns):
+	fts = fts_table(table)
+	column_list = ", ".join(columns)
+	new_values = ", ".join(f"new.{column}" for column in columns)
+	old_values = ", ".join(f"old.{column}" for column in columns)
+	cursor.execute(
+		f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, content='{table}', content_rowid='id', "
+		f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+	)
+	cursor.execute(
+		f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+		f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+	)
+	cursor.execute(
+		f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+		f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+	)
+	cursor.execute(
+		f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column_list} ON {table} BEGIN "
+		f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+		f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+	)
+	cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_sqlite_index(cursor, table):
+	fts = fts_table(table)
+	for suffix in ("ai", "ad", "au"):
+		cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+	cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def create_postgres_index(cursor, table, columns):
+	vector = " || ".join(
+		f"setweight(to_tsvector('simple', coalesce({column}, '')), '{POSTGRES_WEIGHTS[position]}')"
+		for position, column in enumerate(columns)
+	)
+	cursor.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED")
+	cursor.execute(f"CREATE INDEX {table}_search_idx ON {table} USING GIN (search_vector)")
+
+
+def drop_postgres_index(cursor, table):
+	cursor.execute(f"DROP INDEX IF EXISTS {table}_search_idx")
+	cursor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+
+
+def create_index(apps, schema_editor):
+	connection = schema_editor.connection
+	with connection.cursor() as cursor:
+		if connection.vendor == "sqlite" and sqlite_has_fts5(cursor):
+			create_sqlite_index(cursor, TABLE, COLUMNS)
+		elif connection.vendor == "postgresql":
+			create_postgres_index(cursor, TABLE, COLUMNS)
+
+
+def drop_index(apps, schema_editor):
+	connection = schema_editor.connection
+	with connection.cursor() as cursor:
+		if connection.vendor == "sqlite":
+			drop_sqlite_index(cursor, TABLE)
+		elif connection.vendor == "postgresql":
+			drop_postgres_index(cursor, TABLE)
+
+
+class Migration(migrations.Migration):
+
+	dependencies = [
+		("core", "0018_searchdocument"),
+	]
+
+	operations = [
+		migrations.RunPython(create_index, drop_index),
+	]
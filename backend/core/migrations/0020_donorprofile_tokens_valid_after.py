@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_search_document_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donorprofile',
+            name='tokens_valid_after',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Access and refresh tokens issued before this are refused, see core.authentication', null=True),
+        ),
+    ]
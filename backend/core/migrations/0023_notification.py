@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('EMERGENCY_NEED', 'Emergency Need'), ('ACCIDENT_ALERT', 'Accident Alert')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField(help_text='The need or alert notified about')),
+                ('channel', models.CharField(choices=[('sms', 'SMS'), ('email', 'Email'), ('push', 'Push')], max_length=10)),
+                ('address', models.CharField(help_text='Phone number, email address or user id the message goes to', max_length=255)),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='donorprofile',
+            index=models.Index(fields=['city_ref', 'blood_group'], name='core_donorp_city_re_bd4dcc_idx'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recipient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['kind', 'object_id', 'recipient', 'created_at'], name='core_notifi_kind_aa220a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'created_at'], name='core_notifi_recipie_4a67cf_idx'),
+        ),
+    ]
@@ -0,0 +1,119 @@
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+# Frozen copy of core.search.DOCUMENT_FIELDS at the time of this migration
+DOCUMENT_FIELDS = ["title", "subtitle", "body", "city", "city_ref"]
+
+
+def _join(*parts, separator=" · "):
+	return separator.join(part for part in parts if part)
+
+
+# Frozen copies of the core.search document builders at the time of this migration
+
+def _hospital_document(hospital):
+	return {
+		"title": hospital.name,
+		"subtitle": _join(hospital.get_hospital_type_display(), hospital.city),
+		"body": _join(hospital.address, hospital.zip_code, separator=" "),
+		"city": hospital.city,
+		"city_ref_id": hospital.city_ref_id,
+	}
+
+
+def _doctor_document(doctor):
+	hospital = doctor.hospital
+	return {
+		"title": doctor.name,
+		"subtitle": _join(doctor.specialization, hospital.name if hospital else ""),
+		"body": doctor.qualifications,
+		"city": hospital.city if hospital else "",
+		"city_ref_id": hospital.city_ref_id if hospital else None,
+	}
+
+
+def _store_product_document(product):
+	if not product.is_active:
+		return None
+	return {
+		"title": product.name,
+		"subtitle": _join(product.brand, product.get_category_display()),
+		"body": _join(product.sku, product.description, separator=" "),
+		"city": product.supplier.city,
+		"city_ref_id": product.supplier.city_ref_id,
+	}
+
+
+def _equipment_document(equipment):
+	if not equipment.is_active:
+		return None
+	return {
+		"title": equipment.name,
+		"subtitle": _join(equipment.brand, equipment.model_number, equipment.get_equipment_type_display()),
+		"body": _join(equipment.sku, equipment.specifications, equipment.description, separator=" "),
+		"city": equipment.supplier.city,
+		"city_ref_id": equipment.supplier.city_ref_id,
+	}
+
+
+def _marketplace_document(item):
+	if not item.is_active:
+		return None
+	return {
+		"title": item.title,
+		"subtitle": _join(item.get_category_display(), item.city),
+		"body": item.description,
+		"city": item.city,
+		"city_ref_id": item.city_ref_id,
+	}
+
+
+SEARCH_SOURCES = [
+	("HOSPITAL", "Hospital", [], _hospital_document),
+	("DOCTOR", "Doctor", ["hospital"], _doctor_document),
+	("STORE", "MedicalStoreProduct", ["supplier"], _store_product_document),
+	("EQUIPMENT", "MedicalEquipment", ["supplier"], _equipment_document),
+	("MARKETPLACE", "MarketplaceItem", [], _marketplace_document),
+]
+
+
+def backfill_search_documents(apps, schema_editor):
+	# 0018 created the table empty; without this /api/search/ finds nothing until
+	# rebuild_search_index is run. Rerunning it is harmless: documents are upserted.
+	SearchDocument = apps.get_model("core", "SearchDocument")
+	for entity_type, model_name, related, build in SEARCH_SOURCES:
+		queryset = apps.get_model("core", model_name).objects.select_related(*related).order_by("pk")
+		last_pk = 0
+		while True:
+			chunk = list(queryset.filter(pk__gt=last_pk)[:BATCH_SIZE])
+			if not chunk:
+				break
+			documents = []
+			for instance in chunk:
+				values = build(instance)
+				if values is not None:
+					values["title"] = values["title"][:200]
+					values["subtitle"] = values["subtitle"][:255]
+					documents.append(SearchDocument(entity_type=entity_type, object_id=instance.pk, **values))
+			SearchDocument.objects.bulk_create(
+				documents,
+				update_conflicts=True,
+				unique_fields=["entity_type", "object_id"],
+				update_fields=DOCUMENT_FIELDS + ["updated_at"],
+			)
+			last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+	# Each batch commits on its own, so a large table is never locked for the whole backfill
+	atomic = False
+
+	dependencies = [
+		("core", "0023_notification"),
+	]
+
+	operations = [
+		migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+	]
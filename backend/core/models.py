@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 import secrets
@@ -61,6 +62,7 @@ class DonorProfile(AbstractBaseUser, PermissionsMixin):
 
     blood_group = models.CharField(max_length=3, choices=BLOOD_GROUP_CHOICES, null=True, blank=True)
     city = models.CharField(max_length=120, null=True, blank=True)
+    city_ref = models.ForeignKey("City", on_delete=models.SET_NULL, null=True, blank=True, related_name="donors", help_text="Canonical city resolved from city")
     zip_code = models.CharField(max_length=20, blank=True, null=True)
     is_platelet_donor = models.BooleanField(default=False)
     last_donated_on = models.DateField(null=True, blank=True)
@@ -75,6 +77,14 @@ class DonorProfile(AbstractBaseUser, PermissionsMixin):
         blank=True
     )
 
+    # ---- Token revocation ----
+    tokens_valid_after = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Access and refresh tokens issued before this are refused, see core.authentication"
+    )
+
     # ---- User Manager ----
     objects = CustomUserManager()
 
@@ -82,9 +92,25 @@ class DonorProfile(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []   # No username needed
 
+    class Meta:
+        indexes = [
+            # Donors to notify about a need: one city, compatible blood groups
+            models.Index(fields=["city_ref", "blood_group"]),
+        ]
+
     def __str__(self):
         return self.email
 
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # Touching one deferred field loads all of them, so a user built from token
+        # claims costs one query however many other attributes are read
+        if fields is not None:
+            fields = set(fields)
+            deferred_fields = self.get_deferred_fields()
+            if fields & deferred_fields:
+                fields |= deferred_fields
+        super().refresh_from_db(using, fields, **kwargs)
+
 
 class TimeStampedModel(models.Model):
 	created_at = models.DateTimeField(auto_now_add=True)
@@ -93,6 +119,34 @@ class TimeStampedModel(models.Model):
 	class Meta:
 		abstract = True
 
+
+class City(TimeStampedModel):
+	"""Canonical city; free-text city columns resolve to one of these at write time"""
+	name = models.CharField(max_length=120)
+	key = models.CharField(max_length=120, unique=True, help_text="Normalized name, see core.cities.city_key")
+	latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+	longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+
+	class Meta:
+		verbose_name_plural = "cities"
+
+	def __str__(self):
+		return self.name
+
+
+class CityAlias(models.Model):
+	"""Other spelling or former name of a city, e.g. Bangalore for Bengaluru"""
+	city = models.ForeignKey(City, on_delete=models.CASCADE, related_name="aliases")
+	name = models.CharField(max_length=120)
+	key = models.CharField(max_length=120, unique=True)
+
+	class Meta:
+		verbose_name_plural = "city aliases"
+
+	def __str__(self):
+		return f"{self.name} -> {self.city.name}"
+
+
 class EmergencyNeed(TimeStampedModel):
 	NEED_TYPE_CHOICES = [
 		("BLOOD", "Blood"),
@@ -114,6 +168,7 @@ class EmergencyNeed(TimeStampedModel):
 	need_type = models.CharField(max_length=16, choices=NEED_TYPE_CHOICES, default="BLOOD")
 	required_blood_group = models.CharField(max_length=3, blank=True)
 	city = models.CharField(max_length=120)
+	city_ref = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, related_name="emergency_needs", help_text="Canonical city resolved from city")
 	zip_code = models.CharField(max_length=20, blank=True)
 	contact_phone = models.CharField(max_length=32, blank=True)
 	status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="OPEN")
@@ -139,6 +194,7 @@ class OrganDonor(TimeStampedModel):
 	user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="organ_donor")
 	organs = models.CharField(max_length=255, help_text="Comma-separated organ codes, e.g. HEART,KIDNEY")
 	city = models.CharField(max_length=120)
+	city_ref = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, related_name="organ_donors", help_text="Canonical city resolved from city")
 	zip_code = models.CharField(max_length=20, blank=True)
 	consent_provided = models.BooleanField(default=False)
 	# Enhanced fields
@@ -170,6 +226,7 @@ class Hospital(TimeStampedModel):
 	name = models.CharField(max_length=200)
 	hospital_type = models.CharField(max_length=20, choices=HOSPITAL_TYPE_CHOICES, default="HOSPITAL")
 	city = models.CharField(max_length=120)
+	city_ref = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, related_name="hospitals", help_text="Canonical city resolved from city")
 	zip_code = models.CharField(max_length=20, blank=True)
 	address = models.TextField(blank=True)
 	phone = models.CharField(max_length=32, blank=True)
@@ -274,6 +331,7 @@ class MarketplaceItem(TimeStampedModel):
 	price_cents = models.PositiveIntegerField()
 	currency = models.CharField(max_length=8, default="USD")
 	city = models.CharField(max_length=120)
+	city_ref = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, related_name="marketplace_items", help_text="Canonical city resolved from city")
 	zip_code = models.CharField(max_length=20, blank=True)
 	quantity_available = models.PositiveIntegerField(default=1)
 	is_active = models.BooleanField(default=True)
@@ -334,6 +392,7 @@ class DeceasedDonorRequest(TimeStampedModel):
 	deceased_date_of_death = models.DateField()
 	deceased_blood_group = models.CharField(max_length=3, blank=True)
 	deceased_city = models.CharField(max_length=120)
+	deceased_city_ref = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, related_name="deceased_donor_requests", help_text="Canonical city resolved from deceased_city")
 	deceased_address = models.TextField(blank=True)
 	organs_available = models.CharField(max_length=255, help_text="Comma-separated organ codes")
 	medical_student_donation = models.BooleanField(default=False)
@@ -373,6 +432,7 @@ class AccidentAlert(TimeStampedModel):
 	description = models.TextField(blank=True)
 	location = models.CharField(max_length=200, help_text="Accident location")
 	city = models.CharField(max_length=120)
+	city_ref = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, related_name="accident_alerts", help_text="Canonical city resolved from city")
 	latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
 	longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
 	severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default="MEDIUM")
@@ -418,6 +478,14 @@ class BloodDonationEvent(TimeStampedModel):
 		return f"{self.title} - {self.hospital.name} ({self.event_date})"
 
 
+API_KEY_PREFIX_LENGTH = 11
+
+
+def hash_api_key(api_key):
+	"""API keys are long random strings, so a fast unsalted digest is enough"""
+	return hashlib.sha256(api_key.encode()).hexdigest()
+
+
 class MedicalEssential(TimeStampedModel):
 	"""Medical Essential user profile with API key"""
 	user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="medical_essential_profile")
@@ -438,23 +506,32 @@ class MedicalEssential(TimeStampedModel):
 	email = models.EmailField()
 	address = models.TextField()
 	city = models.CharField(max_length=120)
+	city_ref = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, related_name="medical_essentials", help_text="Canonical city resolved from city")
 	zip_code = models.CharField(max_length=20, blank=True)
 	license_number = models.CharField(max_length=100, blank=True, help_text="Business license/registration number")
 	tax_id = models.CharField(max_length=100, blank=True, help_text="Tax identification number")
-	api_key = models.CharField(max_length=64, unique=True, db_index=True, help_text="API key for authentication")
+	api_key_prefix = models.CharField(max_length=16, db_index=True, help_text="Leading characters of the API key, used to look it up")
+	api_key_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the API key")
 	api_key_created_at = models.DateTimeField(auto_now_add=True)
+	api_key_last_used_at = models.DateTimeField(null=True, blank=True)
+	api_key_usage_count = models.PositiveBigIntegerField(default=0)
 	is_active = models.BooleanField(default=True)
 	is_verified = models.BooleanField(default=False, help_text="Verified supplier status")
 
 	def generate_api_key(self):
-		"""Generate a secure API key"""
-		random_token = secrets.token_urlsafe(32)
-		api_key = f"me_{hashlib.sha256(random_token.encode()).hexdigest()[:32]}"
-		self.api_key = api_key
+		"""
+		Generate a secure API key and return it. Only its prefix and hash are stored,
+		so the plain key is kept on ``raw_api_key`` for the response that shows it.
+		"""
+		api_key = f"me_{secrets.token_hex(24)}"
+		self.api_key_prefix = api_key[:API_KEY_PREFIX_LENGTH]
+		self.api_key_hash = hash_api_key(api_key)
+		self.api_key_created_at = timezone.now()
+		self.raw_api_key = api_key
 		return api_key
 
 	def save(self, *args, **kwargs):
-		if not self.api_key:
+		if not self.api_key_hash:
 			self.generate_api_key()
 		super().save(*args, **kwargs)
 
@@ -487,6 +564,14 @@ class MedicalStoreProduct(TimeStampedModel):
 	image = models.ImageField(upload_to="medical_store/", blank=True, null=True)
 	is_active = models.BooleanField(default=True)
 	is_prescription_required = models.BooleanField(default=False)
+	reorder_level = models.PositiveIntegerField(default=10, help_text="Raise a low-stock alert at or below this quantity")
+
+	class Meta:
+		indexes = [
+			models.Index(fields=["is_active", "expiry_date"]),
+			models.Index(fields=["supplier", "expiry_date"]),
+			models.Index(fields=["supplier", "quantity_available"]),
+		]
 
 	def __str__(self):
 		return f"{self.name} - {self.supplier.company_name}"
@@ -554,14 +639,17 @@ class MedicalOrder(TimeStampedModel):
 	notes = models.TextField(blank=True)
 	estimated_delivery = models.DateField(null=True, blank=True)
 
+	class Meta:
+		indexes = [
+			models.Index(fields=["supplier", "status"]),
+		]
+
 	def generate_order_number(self):
 		"""Generate unique order number"""
 		if not self.order_number:
-			import random
-			import string
+			from .order_numbers import next_order_number
 			prefix = "ME" if self.order_type == "STORE" else "EQ"
-			random_part = ''.join(random.choices(string.digits, k=8))
-			self.order_number = f"{prefix}-{random_part}"
+			self.order_number = next_order_number(prefix)
 		return self.order_number
 
 	def save(self, *args, **kwargs):
@@ -573,6 +661,15 @@ class MedicalOrder(TimeStampedModel):
 		return f"Order {self.order_number} - {self.customer.email}"
 
 
+class OrderNumberSequence(models.Model):
+	"""Counter that order number blocks are carved from"""
+	name = models.CharField(max_length=50, unique=True)
+	next_value = models.PositiveBigIntegerField(default=1)
+
+	def __str__(self):
+		return f"{self.name}: {self.next_value}"
+
+
 class MedicalOrderItem(TimeStampedModel):
 	"""Individual items in an order"""
 	order = models.ForeignKey(MedicalOrder, on_delete=models.CASCADE, related_name="items")
@@ -592,3 +689,327 @@ class MedicalOrderItem(TimeStampedModel):
 		return f"{product_name} x{self.quantity} - Order {self.order.order_number}"
 
 
+
+
+class StockReservation(TimeStampedModel):
+	"""Time-limited hold on product stock while a buyer checks out"""
+	STATUS_CHOICES = [
+		("ACTIVE", "Active"),
+		("CONVERTED", "Converted to order"),
+		("RELEASED", "Released"),
+	]
+
+	customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="stock_reservations")
+	product_type = models.CharField(max_length=20, choices=[("STORE", "Store Product"), ("EQUIPMENT", "Equipment")])
+	store_product = models.ForeignKey(MedicalStoreProduct, on_delete=models.CASCADE, null=True, blank=True, related_name="reservations")
+	equipment = models.ForeignKey(MedicalEquipment, on_delete=models.CASCADE, null=True, blank=True, related_name="reservations")
+	quantity = models.PositiveIntegerField()
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="ACTIVE")
+	expires_at = models.DateTimeField()
+	order = models.ForeignKey(MedicalOrder, on_delete=models.SET_NULL, null=True, blank=True, related_name="reservations")
+
+	class Meta:
+		indexes = [
+			models.Index(fields=["status", "expires_at"]),
+			models.Index(fields=["customer", "status"]),
+		]
+
+	def __str__(self):
+		product_name = self.store_product.name if self.store_product else (self.equipment.name if self.equipment else "Unknown")
+		return f"Hold {product_name} x{self.quantity} - {self.status}"
+
+
+class InventoryMovement(TimeStampedModel):
+	"""
+	Append-only ledger of stock changes. Decrements are applied to
+	quantity_available as they happen; increments are left pending (applied_at
+	unset) and folded into the product rows periodically by fold_inventory_ledger.
+	"""
+	REASON_CHOICES = [
+		("ORDER", "Order placed"),
+		("CANCEL", "Order cancelled"),
+		("RESTOCK", "Restock"),
+		("ADJUSTMENT", "Manual adjustment"),
+		("HOLD", "Cart hold"),
+		("RELEASE", "Cart hold released"),
+	]
+
+	supplier = models.ForeignKey(MedicalEssential, on_delete=models.CASCADE, related_name="inventory_movements")
+	product_type = models.CharField(max_length=20, choices=[("STORE", "Store Product"), ("EQUIPMENT", "Equipment")])
+	store_product = models.ForeignKey(MedicalStoreProduct, on_delete=models.CASCADE, null=True, blank=True, related_name="inventory_movements")
+	equipment = models.ForeignKey(MedicalEquipment, on_delete=models.CASCADE, null=True, blank=True, related_name="inventory_movements")
+	quantity_delta = models.IntegerField(help_text="Signed change in stock")
+	reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+	order = models.ForeignKey(MedicalOrder, on_delete=models.SET_NULL, null=True, blank=True, related_name="inventory_movements")
+	created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="inventory_movements")
+	note = models.CharField(max_length=255, blank=True)
+	applied_at = models.DateTimeField(null=True, blank=True, help_text="When the delta was folded into quantity_available")
+
+	class Meta:
+		indexes = [
+			models.Index(fields=["supplier", "created_at"]),
+			models.Index(fields=["created_at"], condition=models.Q(applied_at__isnull=True), name="inventory_pending_idx"),
+		]
+
+	def __str__(self):
+		product_name = self.store_product.name if self.store_product else (self.equipment.name if self.equipment else "Unknown")
+		return f"{self.reason} {product_name} {self.quantity_delta:+d}"
+
+
+class SupplierDailySales(models.Model):
+	"""Per-supplier daily order totals, incremented as orders are placed and cancelled"""
+	supplier = models.ForeignKey(MedicalEssential, on_delete=models.CASCADE, related_name="daily_sales")
+	date = models.DateField()
+	order_count = models.PositiveIntegerField(default=0)
+	units_sold = models.PositiveIntegerField(default=0)
+	revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	cancelled_count = models.PositiveIntegerField(default=0)
+	cancelled_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=["supplier", "date"], name="unique_supplier_daily_sales"),
+		]
+
+	def __str__(self):
+		return f"{self.supplier_id} {self.date}: {self.revenue}"
+
+
+class SupplierProductDailySales(models.Model):
+	"""Per-product daily units and revenue for a supplier"""
+	supplier = models.ForeignKey(MedicalEssential, on_delete=models.CASCADE, related_name="product_daily_sales")
+	date = models.DateField()
+	product_type = models.CharField(max_length=20, choices=[("STORE", "Store Product"), ("EQUIPMENT", "Equipment")])
+	product_id = models.PositiveBigIntegerField(help_text="MedicalStoreProduct or MedicalEquipment id, per product_type")
+	units_sold = models.PositiveIntegerField(default=0)
+	revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=["supplier", "date", "product_type", "product_id"], name="unique_supplier_product_daily_sales"),
+		]
+
+	def __str__(self):
+		return f"{self.supplier_id} {self.date} {self.product_type}#{self.product_id}: {self.units_sold}"
+
+
+class StockAlert(TimeStampedModel):
+	"""Expiry and low-stock warnings raised for a supplier's store products"""
+	ALERT_TYPE_CHOICES = [
+		("EXPIRING", "Expiring soon"),
+		("EXPIRED", "Expired"),
+		("LOW_STOCK", "Low stock"),
+	]
+
+	supplier = models.ForeignKey(MedicalEssential, on_delete=models.CASCADE, related_name="stock_alerts")
+	store_product = models.ForeignKey(MedicalStoreProduct, on_delete=models.CASCADE, related_name="stock_alerts")
+	alert_type = models.CharField(max_length=20, choices=ALERT_TYPE_CHOICES)
+	expiry_date = models.DateField(null=True, blank=True)
+	quantity_available = models.PositiveIntegerField(default=0)
+	message = models.CharField(max_length=255, blank=True)
+	is_resolved = models.BooleanField(default=False)
+	resolved_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		constraints = [
+			# At most one open alert of each type per product, so rescans are idempotent
+			models.UniqueConstraint(
+				fields=["store_product", "alert_type"],
+				condition=models.Q(is_resolved=False),
+				name="unique_open_stock_alert",
+			),
+		]
+		indexes = [
+			models.Index(fields=["supplier", "is_resolved", "created_at"]),
+		]
+
+	def __str__(self):
+		return f"{self.alert_type}: {self.store_product.name}"
+
+
+class IdempotencyKey(models.Model):
+	"""Stored outcome of a POST made with an Idempotency-Key header, replayed on retries"""
+	STATUS_CHOICES = [
+		("IN_PROGRESS", "In progress"),
+		("COMPLETED", "Completed"),
+	]
+
+	key = models.CharField(max_length=255)
+	scope = models.CharField(max_length=100)
+	owner = models.CharField(max_length=50)
+	fingerprint = models.CharField(max_length=64)
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="IN_PROGRESS")
+	response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+	response_body = models.JSONField(null=True, blank=True)
+	locked_at = models.DateTimeField()
+	expires_at = models.DateTimeField()
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=["scope", "owner", "key"], name="unique_idempotency_key"),
+		]
+		indexes = [
+			models.Index(fields=["expires_at"]),
+		]
+
+	def __str__(self):
+		return f"{self.scope}: {self.key}"
+
+
+class RevokedToken(models.Model):
+	"""A single access or refresh token refused before it expires, e.g. on logout"""
+	jti = models.CharField(max_length=255, unique=True)
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="revoked_tokens")
+	token_type = models.CharField(max_length=20)
+	reason = models.CharField(max_length=100, blank=True)
+	expires_at = models.DateTimeField()
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=["expires_at"]),
+		]
+
+	def __str__(self):
+		return f"{self.token_type} {self.jti}"
+
+
+class CatalogImportJob(TimeStampedModel):
+	"""A supplier catalogue file queued for a streaming import, polled for progress"""
+	STATUS_CHOICES = [
+		("PENDING", "Pending"),
+		("RUNNING", "Running"),
+		("COMPLETED", "Completed"),
+		("FAILED", "Failed"),
+	]
+	FORMAT_CHOICES = [
+		("CSV", "CSV"),
+		("NDJSON", "Newline-delimited JSON"),
+	]
+
+	supplier = models.ForeignKey(MedicalEssential, on_delete=models.CASCADE, related_name="catalog_imports")
+	created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="catalog_imports")
+	product_type = models.CharField(max_length=20, choices=[("STORE", "Store Product"), ("EQUIPMENT", "Equipment")])
+	file = models.FileField(upload_to="catalog_imports/")
+	file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+	file_size = models.PositiveBigIntegerField(default=0)
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
+	bytes_processed = models.PositiveBigIntegerField(default=0)
+	processed_rows = models.PositiveIntegerField(default=0)
+	created_count = models.PositiveIntegerField(default=0)
+	updated_count = models.PositiveIntegerField(default=0)
+	unchanged_count = models.PositiveIntegerField(default=0)
+	duplicate_count = models.PositiveIntegerField(default=0)
+	error_count = models.PositiveIntegerField(default=0)
+	errors = models.JSONField(default=list, blank=True)
+	detail = models.TextField(blank=True, help_text="Why the import failed")
+	started_at = models.DateTimeField(null=True, blank=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=["status", "created_at"]),
+		]
+
+	def __str__(self):
+		return f"{self.supplier.company_name} {self.product_type} import ({self.status})"
+
+
+class Job(TimeStampedModel):
+	"""
+	Background work for ``manage.py run_workers``, inserted in the same transaction
+	as the write that needs it so the two commit or roll back together.
+	"""
+	STATUS_CHOICES = [
+		("PENDING", "Pending"),
+		("RUNNING", "Running"),
+		("COMPLETED", "Completed"),
+		("FAILED", "Failed"),
+	]
+
+	task = models.CharField(max_length=100)
+	payload = models.JSONField(default=dict, blank=True)
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
+	run_after = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time; pushed back between retries")
+	attempts = models.PositiveSmallIntegerField(default=0)
+	max_attempts = models.PositiveSmallIntegerField(default=5)
+	last_error = models.TextField(blank=True)
+	locked_by = models.CharField(max_length=100, blank=True, help_text="Worker running the job")
+	locked_at = models.DateTimeField(null=True, blank=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=["status", "run_after"]),
+		]
+
+	def __str__(self):
+		return f"{self.task} #{self.pk} ({self.status})"
+
+
+class Notification(models.Model):
+	"""One message about a need or alert to one recipient on one channel, with its delivery state"""
+	KIND_CHOICES = [
+		("EMERGENCY_NEED", "Emergency Need"),
+		("ACCIDENT_ALERT", "Accident Alert"),
+	]
+	CHANNEL_CHOICES = [
+		("sms", "SMS"),
+		("email", "Email"),
+		("push", "Push"),
+	]
+	STATUS_CHOICES = [
+		("PENDING", "Pending"),
+		("SENT", "Sent"),
+		("FAILED", "Failed"),
+	]
+
+	recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notifications")
+	kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+	object_id = models.PositiveBigIntegerField(help_text="The need or alert notified about")
+	channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+	address = models.CharField(max_length=255, help_text="Phone number, email address or user id the message goes to")
+	title = models.CharField(max_length=200)
+	body = models.TextField(blank=True)
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
+	created_at = models.DateTimeField(auto_now_add=True)
+	sent_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		indexes = [
+			# Recent notifications about the same object, checked before notifying again
+			models.Index(fields=["kind", "object_id", "recipient", "created_at"]),
+			models.Index(fields=["recipient", "created_at"]),
+		]
+
+	def __str__(self):
+		return f"{self.channel} to {self.address}: {self.title}"
+
+
+class SearchDocument(models.Model):
+	"""Denormalized, full-text indexed copy of a searchable record; kept in sync by core.search"""
+	ENTITY_TYPE_CHOICES = [
+		("HOSPITAL", "Hospital"),
+		("DOCTOR", "Doctor"),
+		("STORE", "Store Product"),
+		("EQUIPMENT", "Equipment"),
+		("MARKETPLACE", "Marketplace Item"),
+	]
+
+	entity_type = models.CharField(max_length=20, choices=ENTITY_TYPE_CHOICES)
+	object_id = models.PositiveBigIntegerField()
+	title = models.CharField(max_length=200)
+	subtitle = models.CharField(max_length=255, blank=True)
+	body = models.TextField(blank=True)
+	city = models.CharField(max_length=120, blank=True)
+	city_ref = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, related_name="search_documents")
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=["entity_type", "object_id"], name="unique_search_document"),
+		]
+
+	def __str__(self):
+		return f"{self.entity_type}#{self.object_id}: {self.title}"
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .blood import donor_groups
+from .cities import city_filter
+from .jobs import enqueue
+from .models import DonorProfile, Hospital, Notification
+
+
+logger = logging.getLogger(__name__)
+
+# Recipients read, deduplicated and inserted per round trip
+CHUNK_SIZE = 2000
+
+# Columns written by _insert_notifications, in order
+INSERT_FIELDS = ("recipient", "kind", "object_id", "channel", "address", "title", "body", "status", "created_at")
+
+
+class Channel:
+	"""
+	Delivers the notifications of one channel, named in NOTIFICATION_CHANNELS.
+
+	send() takes a batch and returns the notifications that can never be delivered,
+	e.g. to a malformed address, which are marked FAILED. Raising retries the whole
+	batch later, so providers should not be left with half a batch sent.
+	"""
+
+	def __init__(self, name):
+		self.name = name
+
+	def send(self, notifications):
+		raise NotImplementedError
+
+
+class ConsoleChannel(Channel):
+	"""Logs each message instead of sending it"""
+
+	def send(self, notifications):
+		for notification in notifications:
+			logger.info("%s to %s: %s", self.name, notification.address, notification.title)
+		return []
+
+
+class FileChannel(Channel):
+	"""Appends each message as a JSON line to NOTIFICATION_FILE_DIR/<channel>.jsonl, standing in for an SMS or push provider"""
+
+	def send(self, notifications):
+		os.makedirs(settings.NOTIFICATION_FILE_DIR, exist_ok=True)
+		path = os.path.join(settings.NOTIFICATION_FILE_DIR, f"{self.name}.jsonl")
+		lines = [
+			json.dumps({
+				"id": notification.pk,
+				"to": notification.address,
+				"title": notification.title,
+				"body": notification.body,
+				"created_at": notification.created_at.isoformat(),
+			}) + "\n"
+			for notification in notifications
+		]
+		with open(path, "a", encoding="utf-8") as file:
+			file.writelines(lines)
+		return []
+
+
+class EmailChannel(Channel):
+	"""Sends over one connection of Django's EMAIL_BACKEND, whose console and file backends work as stand-ins"""
+
+	def send(self, notifications):
+		messages = [EmailMessage(notification.title, notification.body, to=[notification.address]) for notification in notifications]
+		with get_connection() as mail_connection:
+			mail_connection.send_messages(messages)
+		return []
+
+
+@lru_cache(maxsize=None)
+def get_channel(name):
+	return import_string(settings.NOTIFICATION_CHANNELS[name])(name)
+
+
+def _in_city(queryset, obj):
+	# A resolved city is an indexed foreign key match; otherwise match the name like searches do
+	if obj.city_ref_id is not None:
+		return queryset.filter(city_ref_id=obj.city_ref_id)
+	return city_filter(queryset, obj.city)
+
+
+def _insert_notifications(rows):
+	"""
+	Insert (recipient id, kind, object id, channel, address, title, body, status,
+	created_at) tuples whose values are ready for the database. bulk_create would
+	spend most of a fan-out preparing each value of each model instance.
+
+	Returns the new ids from INSERT ... RETURNING, or None on backends that cannot
+	return them from a multi-row insert (MySQL).
+	"""
+	fields = [Notification._meta.get_field(name) for name in INSERT_FIELDS]
+	columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+	placeholders = "(" + ", ".join(["%s"] * len(fields)) + ")"
+	batch_size = connection.ops.bulk_batch_size(fields, rows)
+	returning = ""
+	if connection.features.can_return_rows_from_bulk_insert:
+		returning, _ = connection.ops.return_insert_columns([Notification._meta.pk])
+	ids = []
+	with connection.cursor() as cursor:
+		for start in range(0, len(rows), batch_size):
+			batch = rows[start:start + batch_size]
+			cursor.execute(
+				f"INSERT INTO {connection.ops.quote_name(Notification._meta.db_table)} ({columns}) "
+				f"VALUES {', '.join([placeholders] * len(batch))} {returning}",
+				[value for row in batch for value in row],
+			)
+			if returning:
+				ids.extend(row[0] for row in cursor.fetchall())
+	return ids if returning else None
+
+
+def fan_out(kind, obj, audiences, title, body, chunk_size=CHUNK_SIZE):
+	"""
+	Create a ``kind`` notification about ``obj`` for every recipient in ``audiences``
+	and queue their delivery; returns how many were created.
+
+	``audiences`` are (channel, queryset, recipient field, address field) tuples. Each
+	is walked in primary-key chunks. Recipients already told about ``obj`` on that
+	channel within NOTIFICATION_DEDUP_SECONDS are skipped, which also covers recipients
+	reached through an earlier audience and a rerun of the same fan-out. Each chunk
+	costs a read, a dedup lookup, a multi-row insert returning the new ids (plus an
+	id lookup on backends without RETURNING) and one delivery job.
+
+	A chunk's dedup lookup, insert and delivery job commit together while holding a
+	row lock on ``obj``, so a failed chunk leaves nothing behind for the retry to skip
+	and concurrent fan-outs about the same object cannot both pass the dedup check.
+	"""
+	cutoff = timezone.now() - timedelta(seconds=settings.NOTIFICATION_DEDUP_SECONDS)
+	recent = Notification.objects.filter(kind=kind, object_id=obj.pk, created_at__gte=cutoff)
+	created = 0
+	for channel, queryset, recipient_field, address_field in audiences:
+		rows = queryset.order_by("pk").values_list("pk", recipient_field, address_field)
+		last_pk = 0
+		while True:
+			chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+			if not chunk:
+				break
+			last_pk = chunk[-1][0]
+			addresses = {recipient: str(address) for _, recipient, address in chunk if recipient and address}
+			with transaction.atomic():
+				# Backends without row locks (SQLite) serialize the writing transactions instead
+				list(type(obj).objects.select_for_update().filter(pk=obj.pk).values_list("pk", flat=True))
+				notified = set(recent.filter(channel=channel, recipient_id__in=list(addresses)).values_list("recipient_id", flat=True))
+				recipients = [recipient for recipient in addresses if recipient not in notified]
+				if not recipients:
+					continue
+				created_at = Notification._meta.get_field("created_at").get_db_prep_value(timezone.now(), connection)
+				ids = _insert_notifications([
+					(recipient, kind, obj.pk, channel, addresses[recipient], title, body, "PENDING", created_at)
+					for recipient in recipients
+				])
+				if ids is None:
+					# The dedup lookup above found no recent row for these recipients and the
+					# lock keeps other fan-outs out, so the recent ones are this chunk's
+					ids = list(recent.filter(channel=channel, recipient_id__in=recipients).values_list("pk", flat=True))
+				enqueue("deliver_notifications", channel=channel, ids=ids)
+			created += len(recipients)
+	return created
+
+
+def deliver(channel, ids):
+	"""Send the still pending notifications among ``ids`` on ``channel``; returns how many were sent"""
+	notifications = list(Notification.objects.filter(pk__in=ids, channel=channel, status="PENDING").order_by("pk"))
+	if not notifications:
+		return 0
+	undeliverable = {notification.pk for notification in get_channel(channel).send(notifications)}
+	now = timezone.now()
+	if undeliverable:
+		Notification.objects.filter(pk__in=undeliverable).update(status="FAILED")
+	Notification.objects.filter(
+		pk__in=[notification.pk for notification in notifications if notification.pk not in undeliverable],
+	).update(status="SENT", sent_at=now)
+	return len(notifications) - len(undeliverable)
+
+
+def _hospital_audiences(hospitals):
+	hospitals = hospitals.filter(user__isnull=False)
+	return [
+		("sms", hospitals.exclude(phone=""), "user_id", "phone"),
+		("email", hospitals.exclude(user__email__isnull=True), "user_id", "user__email"),
+	]
+
+
+def notify_need(need):
+	"""Tell the hospitals of the need's city by SMS and email, and its compatible available donors by push"""
+	donors = _in_city(
+		DonorProfile.objects.filter(donor_module="donor", is_active=True, is_available=True), need,
+	).exclude(pk=need.created_by_id)
+	if need.need_type == "PLATELETS":
+		donors = donors.filter(is_platelet_donor=True)
+	if need.required_blood_group:
+		donors = donors.filter(blood_group__in=donor_groups(need.required_blood_group))
+	audiences = _hospital_audiences(_in_city(Hospital.objects.all(), need)) + [("push", donors, "pk", "pk")]
+
+	needed = need.required_blood_group or need.get_need_type_display()
+	body = "\n".join(part for part in [need.title, need.description, f"Contact: {need.contact_phone}" if need.contact_phone else ""] if part)
+	return fan_out("EMERGENCY_NEED", need, audiences, f"Urgent: {needed} needed in {need.city}", body)
+
+
+def notify_accident(alert):
+	"""Tell the referred hospital and the other hospitals of the alert's city by SMS and email"""
+	audiences = []
+	if alert.hospital_referred_id:
+		audiences += _hospital_audiences(Hospital.objects.filter(pk=alert.hospital_referred_id))
+	audiences += _hospital_audiences(_in_city(Hospital.objects.all(), alert))
+	body = f"{alert.title} at {alert.location}. Severity: {alert.get_severity_display()}."
+	return fan_out("ACCIDENT_ALERT", alert, audiences, f"Accident alert in {alert.city}", body)
@@ -0,0 +1,87 @@
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderNumberSequence
+
+
+SEQUENCE_NAME = "medical_order"
+
+
+def _claim(count):
+	"""Reserve ``count`` consecutive values from the shared sequence; returns the first"""
+	with transaction.atomic():
+		updated = OrderNumberSequence.objects.filter(name=SEQUENCE_NAME).update(next_value=F("next_value") + count)
+		if not updated:
+			try:
+				with transaction.atomic():
+					OrderNumberSequence.objects.create(name=SEQUENCE_NAME, next_value=1 + count)
+				return 1
+			except IntegrityError:
+				# Another worker created the row first
+				OrderNumberSequence.objects.filter(name=SEQUENCE_NAME).update(next_value=F("next_value") + count)
+		next_value = OrderNumberSequence.objects.values_list("next_value", flat=True).get(name=SEQUENCE_NAME)
+	return next_value - count
+
+
+class OrderNumberAllocator:
+	"""
+	Hands out order number values from blocks claimed off OrderNumberSequence, so
+	only one query in every ``block_size`` orders touches the database.
+
+	A block claimed inside an open transaction would be handed to another worker
+	again if that transaction rolled back, so refills only keep a block when the
+	connection is in autocommit. Call ``ensure`` before opening a transaction that
+	creates orders.
+	"""
+
+	def __init__(self, block_size):
+		self.block_size = block_size
+		self._lock = threading.Lock()
+		self._pid = None
+		self._next = 0
+		self._limit = 0
+
+	def _remaining(self):
+		# A forked worker must not reuse the block its parent was holding
+		if self._pid != os.getpid():
+			return 0
+		return self._limit - self._next
+
+	def ensure(self, count):
+		"""Make sure the next ``count`` values can be handed out without a query"""
+		with self._lock:
+			if self._remaining() >= count or transaction.get_connection().in_atomic_block:
+				return
+			size = max(count, self.block_size)
+			self._pid = os.getpid()
+			self._next = _claim(size)
+			self._limit = self._next + size
+
+	def next_value(self):
+		with self._lock:
+			if self._remaining() > 0:
+				value = self._next
+				self._next += 1
+				return value
+			if transaction.get_connection().in_atomic_block:
+				# Claim just this value; if the transaction rolls back the order goes with it
+				return _claim(1)
+			self._pid = os.getpid()
+			self._next = _claim(self.block_size)
+			self._limit = self._next + self.block_size
+			value = self._next
+			self._next += 1
+			return value
+
+
+allocator = OrderNumberAllocator(settings.ORDER_NUMBER_BLOCK_SIZE)
+
+
+def next_order_number(prefix):
+	"""Return a unique, roughly time-ordered order number such as ME-261019-0000042"""
+	return f"{prefix}-{timezone.now():%y%m%d}-{allocator.next_value():07d}"
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+
+from .analytics import record_order_sales
+from .inventory import build_movements
+from .models import MedicalStoreProduct, MedicalEquipment, MedicalOrder, MedicalOrderItem, InventoryMovement
+
+
+# product_type -> (model, request id key, MedicalOrderItem field, not-found message)
+PRODUCT_TYPES = {
+	"STORE": (MedicalStoreProduct, "store_product_id", "store_product", "Store product not found."),
+	"EQUIPMENT": (MedicalEquipment, "equipment_id", "equipment", "Equipment not found."),
+}
+
+
+class OrderError(Exception):
+	"""Order could not be placed; carries the detail and HTTP status for the response"""
+
+	def __init__(self, detail, status_code=400):
+		super().__init__(detail)
+		self.detail = detail
+		self.status_code = status_code
+
+
+def parse_order_lines(items_data, allow_empty=False):
+	"""Validate request items and merge them into {(product_type, product_id): quantity}"""
+	if allow_empty and not items_data:
+		return OrderedDict()
+	if not items_data or not isinstance(items_data, list):
+		raise OrderError("Order must contain at least one item.")
+
+	lines = OrderedDict()
+	for item_data in items_data:
+		if not isinstance(item_data, dict):
+			raise OrderError("Invalid order item.")
+		product_type = item_data.get("product_type")
+		if product_type not in PRODUCT_TYPES:
+			raise OrderError("Invalid product type.")
+		id_key = PRODUCT_TYPES[product_type][1]
+		try:
+			product_id = int(item_data.get(id_key))
+			quantity = int(item_data.get("quantity", 1))
+		except (TypeError, ValueError):
+			raise OrderError(f"Invalid {id_key} or quantity.")
+		if quantity < 1:
+			raise OrderError("Quantity must be at least 1.")
+		key = (product_type, product_id)
+		lines[key] = lines.get(key, 0) + quantity
+	return lines
+
+
+def load_products(lines):
+	"""Fetch every product referenced by ``lines`` with one IN query per product type"""
+	products = {}
+	for product_type, (model, _, _, not_found) in PRODUCT_TYPES.items():
+		ids = {pk for line_type, pk in lines if line_type == product_type}
+		if not ids:
+			continue
+		found = model.objects.select_related("supplier").in_bulk(ids)
+		if len(found) != len(ids):
+			raise OrderError(not_found, status_code=404)
+		for pk, product in found.items():
+			products[(product_type, pk)] = product
+	return products
+
+
+def build_order_items(lines, products):
+	"""Build unsaved order items priced from ``products``; returns (items, total_amount)"""
+	order_items = []
+	total_amount = Decimal("0.00")
+	for (product_type, pk), quantity in lines.items():
+		product = products[(product_type, pk)]
+		subtotal = product.price * quantity
+		total_amount += subtotal
+		order_items.append(MedicalOrderItem(**{
+			"product_type": product_type,
+			PRODUCT_TYPES[product_type][2]: product,
+			"quantity": quantity,
+			"unit_price": product.price,
+			"subtotal": subtotal,
+		}))
+	return order_items, total_amount
+
+
+def decrement_stock(lines):
+	"""
+	Take ordered quantities out of stock with one conditional UPDATE per product type.
+
+	Rows are only touched while they still hold enough stock, so a checkout that lost
+	the race sees a short row count and raises, rolling back the caller's transaction
+	instead of overselling. Run this first inside the transaction: writing before
+	reading means SQLite takes its write lock up front rather than failing to upgrade
+	a read lock, and Postgres holds the row locks for the shortest possible time.
+	"""
+	for product_type, (model, _, _, not_found) in PRODUCT_TYPES.items():
+		quantities = {pk: quantity for (line_type, pk), quantity in lines.items() if line_type == product_type}
+		if not quantities:
+			continue
+		condition = Q()
+		for pk, quantity in quantities.items():
+			condition |= Q(pk=pk, quantity_available__gte=quantity)
+		updated = model.objects.filter(condition).update(
+			quantity_available=Case(
+				*[When(pk=pk, then=F("quantity_available") - quantity) for pk, quantity in quantities.items()],
+				default=F("quantity_available"),
+				output_field=model._meta.get_field("quantity_available"),
+			)
+		)
+		if updated == len(quantities):
+			continue
+
+		# Work out which line failed so the client gets the same errors as before
+		found = model.objects.in_bulk(quantities.keys())
+		if len(found) != len(quantities):
+			raise OrderError(not_found, status_code=404)
+		for pk, quantity in quantities.items():
+			if found[pk].quantity_available < quantity:
+				raise OrderError(f"Insufficient stock for {found[pk].name}")
+		raise OrderError("Insufficient stock for one or more items.", status_code=409)
+
+
+def increment_stock(lines):
+	"""Put quantities back into stock with one UPDATE per product type"""
+	for product_type, (model, _, _, _) in PRODUCT_TYPES.items():
+		quantities = {pk: quantity for (line_type, pk), quantity in lines.items() if line_type == product_type}
+		if not quantities:
+			continue
+		model.objects.filter(pk__in=quantities.keys()).update(
+			quantity_available=Case(
+				*[When(pk=pk, then=F("quantity_available") + quantity) for pk, quantity in quantities.items()],
+				default=F("quantity_available"),
+				output_field=model._meta.get_field("quantity_available"),
+			)
+		)
+
+
+def merge_lines(*line_sets):
+	"""Combine several {(product_type, product_id): quantity} mappings"""
+	merged = OrderedDict()
+	for lines in line_sets:
+		for key, quantity in lines.items():
+			merged[key] = merged.get(key, 0) + quantity
+	return merged
+
+
+def place_orders(customer, order_fields, lines, single_supplier=False, reserved_lines=None):
+	"""
+	Create one order per supplier for ``lines`` in a single transaction.
+
+	``order_fields`` holds the validated shipping details shared by every order.
+	``reserved_lines`` are lines whose stock was already taken by a reservation;
+	they are ordered without touching the product rows again. Orders and items are
+	each written with one bulk insert, so the query count does not grow with the
+	size of the cart. Returns the orders in cart order.
+
+	Call ``order_number_allocator.ensure(len(lines))`` before opening any surrounding
+	transaction so the order numbers come from memory.
+	"""
+	with transaction.atomic():
+		# Update stock first, then price the lines from the same transaction
+		decrement_stock(lines)
+		all_lines = merge_lines(reserved_lines or {}, lines)
+		if not all_lines:
+			raise OrderError("Order must contain at least one item.")
+		products = load_products(all_lines)
+		order_items, _ = build_order_items(all_lines, products)
+
+		groups = OrderedDict()
+		for item in order_items:
+			product = item.store_product if item.product_type == "STORE" else item.equipment
+			groups.setdefault(product.supplier_id, []).append(item)
+		if single_supplier and len(groups) > 1:
+			raise OrderError("Items from multiple suppliers must be ordered through checkout.")
+
+		orders = []
+		for supplier_id, items in groups.items():
+			order = MedicalOrder(
+				customer=customer,
+				supplier_id=supplier_id,
+				order_type=items[0].product_type,
+				total_amount=sum((item.subtotal for item in items), Decimal("0.00")),
+				**order_fields,
+			)
+			order.generate_order_number()
+			orders.append(order)
+		MedicalOrder.objects.bulk_create(orders)
+
+		for order, items in zip(orders, groups.values()):
+			for item in items:
+				item.order = order
+		MedicalOrderItem.objects.bulk_create(order_items)
+
+		# Reserved stock was logged when it was held
+		orders_by_supplier = {order.supplier_id: order for order in orders}
+		InventoryMovement.objects.bulk_create(
+			build_movements(lines, products, "ORDER", orders_by_supplier=orders_by_supplier, created_by=customer)
+		)
+		record_order_sales(orders, order_items)
+	return orders
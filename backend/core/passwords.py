@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import exceptions, status
+
+from .models import DonorProfile
+
+
+class PasswordHashingBusy(exceptions.APIException):
+	"""Every hashing slot is taken; answered with 503 and Retry-After rather than queueing"""
+	status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+	default_detail = "Too many sign-ins at the moment, please retry shortly."
+	default_code = "password_hashing_busy"
+	wait = 1
+
+
+class PasswordHasherPool:
+	"""
+	Runs password hashing and verification on a bounded thread pool.
+
+	PBKDF2 (hashlib) and Argon2 (argon2-cffi) release the GIL, so hashing on
+	``workers`` threads caps the CPU that logins can take while request threads
+	waiting on a result stay idle. At most ``max_pending`` calls run or wait at
+	once; beyond that calls fail fast with PasswordHashingBusy instead of piling up.
+	"""
+
+	def __init__(self, workers, max_pending):
+		self.workers = workers
+		self._slots = threading.BoundedSemaphore(max_pending)
+		self._executor = None
+		self._lock = threading.Lock()
+
+	def _submit(self, function, *args):
+		if not self._slots.acquire(blocking=False):
+			raise PasswordHashingBusy()
+		with self._lock:
+			if self._executor is None:
+				self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+		try:
+			future = self._executor.submit(function, *args)
+		except BaseException:
+			self._slots.release()
+			raise
+		future.add_done_callback(lambda _: self._slots.release())
+		return future
+
+	def run(self, function, *args):
+		return self._submit(function, *args).result()
+
+	async def arun(self, function, *args):
+		return await asyncio.wrap_future(self._submit(function, *args))
+
+
+password_pool = PasswordHasherPool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_MAX_PENDING)
+
+
+def _verify(raw_password, encoded):
+	# Returns (matches, new hash when the stored one uses an outdated hasher or work factor)
+	upgraded = []
+	matches = check_password(raw_password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+	return matches, upgraded[0] if upgraded else None
+
+
+def hash_password(raw_password):
+	"""make_password() on the hashing pool"""
+	return password_pool.run(make_password, raw_password)
+
+
+async def ahash_password(raw_password):
+	return await password_pool.arun(make_password, raw_password)
+
+
+def _upgrade_hash(user, encoded):
+	# A rehash is not a password change, so skip save() and the token revocation it triggers
+	DonorProfile.objects.filter(pk=user.pk).update(password=encoded)
+	user.password = encoded
+
+
+def authenticate_password(email, raw_password):
+	"""
+	The active user with this email and password, or None.
+
+	The lookup runs on the calling thread and only hashing goes to the pool. A stored
+	hash made with an older hasher or fewer iterations is replaced on success.
+	"""
+	user = DonorProfile.objects.filter(email=email).first()
+	if user is None:
+		# Hash anyway so unknown emails take as long as wrong passwords
+		hash_password(raw_password)
+		return None
+	matches, upgraded = password_pool.run(_verify, raw_password, user.password)
+	if not matches or not user.is_active:
+		return None
+	if upgraded:
+		_upgrade_hash(user, upgraded)
+	return user
+
+
+async def aauthenticate_password(email, raw_password):
+	"""authenticate_password() for the async login view; the event loop is never blocked on hashing"""
+	user = await DonorProfile.objects.filter(email=email).afirst()
+	if user is None:
+		await ahash_password(raw_password)
+		return None
+	matches, upgraded = await password_pool.arun(_verify, raw_password, user.password)
+	if not matches or not user.is_active:
+		return None
+	if upgraded:
+		await sync_to_async(_upgrade_hash)(user, upgraded)
+	return user
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import build_movements
+from .models import StockReservation, InventoryMovement
+from .orders import OrderError, PRODUCT_TYPES, decrement_stock, increment_stock, load_products
+
+
+# Stock held by an ACTIVE reservation has already been taken out of
+# quantity_available, so quantity_available is always on-hand stock minus active
+# holds. A hold costs one short conditional UPDATE on the product row; checkout
+# then converts holds into order lines without touching the product rows again,
+# and expired holds are handed back by release_expired_reservations.
+
+
+def _reservation_lines(reservations):
+	lines = OrderedDict()
+	for reservation in reservations:
+		product_id = reservation.store_product_id if reservation.product_type == "STORE" else reservation.equipment_id
+		key = (reservation.product_type, product_id)
+		lines[key] = lines.get(key, 0) + reservation.quantity
+	return lines
+
+
+def reserve_stock(customer, lines, ttl=None):
+	"""Hold stock for ``lines`` until the TTL runs out; returns the new reservations"""
+	ttl = ttl if ttl is not None else settings.STOCK_RESERVATION_TTL_SECONDS
+	expires_at = timezone.now() + timedelta(seconds=ttl)
+	reservations = [
+		StockReservation(**{
+			"customer": customer,
+			"product_type": product_type,
+			PRODUCT_TYPES[product_type][2] + "_id": pk,
+			"quantity": quantity,
+			"expires_at": expires_at,
+		})
+		for (product_type, pk), quantity in lines.items()
+	]
+	with transaction.atomic():
+		decrement_stock(lines)
+		StockReservation.objects.bulk_create(reservations)
+		InventoryMovement.objects.bulk_create(
+			build_movements(lines, load_products(lines), "HOLD", created_by=customer)
+		)
+	return reservations
+
+
+def claim_reservations(customer, reservation_ids):
+	"""
+	Mark the customer's live reservations as converted; call inside the checkout
+	transaction. Returns (lines, reservations) for the claimed holds.
+	"""
+	try:
+		reservation_ids = {int(pk) for pk in reservation_ids}
+	except (TypeError, ValueError):
+		raise OrderError("reservation_ids must be a list of reservation ids.")
+	if not reservation_ids:
+		return OrderedDict(), []
+	claimed = StockReservation.objects.filter(
+		pk__in=reservation_ids,
+		customer=customer,
+		status="ACTIVE",
+		expires_at__gt=timezone.now(),
+	).update(status="CONVERTED")
+	if claimed != len(reservation_ids):
+		raise OrderError("One or more reservations have expired or do not exist.", status_code=409)
+	reservations = list(
+		StockReservation.objects.select_related("store_product", "equipment").filter(pk__in=reservation_ids)
+	)
+	return _reservation_lines(reservations), reservations
+
+
+def attach_orders(reservations, orders):
+	"""Point each converted reservation at the order its supplier's lines went into"""
+	orders_by_supplier = {order.supplier_id: order for order in orders}
+	for reservation in reservations:
+		product = reservation.store_product if reservation.product_type == "STORE" else reservation.equipment
+		reservation.order = orders_by_supplier.get(product.supplier_id)
+	StockReservation.objects.bulk_update(reservations, ["order"])
+
+
+def _release(queryset):
+	with transaction.atomic():
+		reservations = list(queryset.select_related("store_product", "equipment").select_for_update(of=("self",)))
+		if not reservations:
+			return 0
+		released = StockReservation.objects.filter(
+			pk__in=[reservation.pk for reservation in reservations],
+			status="ACTIVE",
+		).update(status="RELEASED")
+		if released != len(reservations):
+			# Something claimed part of this batch under us; let the caller retry
+			raise OrderError("Reservations changed while being released.", status_code=409)
+		lines = _reservation_lines(reservations)
+		increment_stock(lines)
+		products = {
+			(reservation.product_type, reservation.store_product_id or reservation.equipment_id): reservation.store_product or reservation.equipment
+			for reservation in reservations
+		}
+		InventoryMovement.objects.bulk_create(build_movements(lines, products, "RELEASE", sign=1))
+	return released
+
+
+def release_reservations(customer, reservation_ids):
+	"""Give the customer's active holds back to stock before they expire"""
+	return _release(StockReservation.objects.filter(pk__in=reservation_ids, customer=customer, status="ACTIVE"))
+
+
+def release_expired_reservations(batch_size=500, now=None):
+	"""Return stock held by expired reservations in batches; returns the number released"""
+	now = now or timezone.now()
+	total = 0
+	while True:
+		batch_ids = list(
+			StockReservation.objects.filter(status="ACTIVE", expires_at__lte=now)
+			.order_by("expires_at")
+			.values_list("pk", flat=True)[:batch_size]
+		)
+		if not batch_ids:
+			return total
+		try:
+			total += _release(StockReservation.objects.filter(pk__in=batch_ids, status="ACTIVE"))
+		except OrderError:
+			continue
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken
+
+
+logger = logging.getLogger(__name__)
+
+# Share of live tokens that needlessly cost an exact lookup while the filter is within capacity
+FALSE_POSITIVE_RATE = 0.001
+
+# Smallest filter built, leaving room for revocations made between rebuilds
+MIN_CAPACITY = 1024
+
+
+class BloomFilter:
+	"""
+	Fixed-size set of strings that may answer "maybe" for an item never added but
+	never "no" for one that was. Holds ``capacity`` items at ``error_rate`` false
+	positives in about 1.8 bytes per item at the default rate.
+	"""
+
+	def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+		self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+		self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+		self._bits = bytearray((self.size + 7) // 8)
+
+	def _positions(self, item):
+		# Double hashing: k positions from two 64-bit halves of one digest
+		digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+		first = int.from_bytes(digest[:8], "little")
+		second = int.from_bytes(digest[8:], "little") | 1
+		return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+	def add(self, item):
+		for position in self._positions(item):
+			self._bits[position >> 3] |= 1 << (position & 7)
+
+	def __contains__(self, item):
+		bits = self._bits
+		return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+	"""
+	Revoked token ids (JTIs) checked without a query on the common path.
+
+	A Bloom filter of the unexpired RevokedToken rows is rebuilt every
+	``rebuild_seconds``, which bounds how long another worker keeps accepting a token
+	revoked elsewhere. A token the filter does not hold is not revoked; a hit is
+	confirmed with one indexed lookup.
+	"""
+
+	def __init__(self, rebuild_seconds):
+		self.rebuild_seconds = rebuild_seconds
+		self._lock = threading.Lock()
+		self._filter = None
+		self._built_at = None
+		self._added_since_build = []
+
+	def is_revoked(self, jti):
+		if not jti:
+			return False
+		built_at = self._built_at
+		if built_at is None or time.monotonic() - built_at >= self.rebuild_seconds:
+			self.rebuild()
+		bloom = self._filter
+		if bloom is not None and jti not in bloom:
+			return False
+		# A filter hit, or no filter because the last rebuild failed
+		return RevokedToken.objects.filter(jti=jti).exists()
+
+	def rebuild(self):
+		with self._lock:
+			# Other threads keep using the current filter while one rebuilds it
+			self._built_at = time.monotonic()
+			self._added_since_build = []
+		try:
+			jtis = list(RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list("jti", flat=True))
+		except DatabaseError:
+			logger.exception("Could not rebuild the token revocation filter")
+			return
+		bloom = BloomFilter(max(MIN_CAPACITY, 2 * len(jtis)))
+		for jti in jtis:
+			bloom.add(jti)
+		with self._lock:
+			# Revocations committed here while the query ran
+			for jti in self._added_since_build:
+				bloom.add(jti)
+			self._filter = bloom
+
+	def add(self, jti):
+		with self._lock:
+			self._added_since_build.append(jti)
+			if self._filter is not None:
+				self._filter.add(jti)
+
+	def clear(self):
+		with self._lock:
+			self._filter = None
+			self._built_at = None
+			self._added_since_build = []
+
+
+revocation_list = RevocationList(settings.TOKEN_REVOCATION_REBUILD_SECONDS)
+
+
+def revoke_tokens(tokens, reason=""):
+	"""Refuse each validated SimpleJWT token in ``tokens`` from now until it expires"""
+	revoked = [
+		RevokedToken(
+			jti=token[api_settings.JTI_CLAIM],
+			user_id=token.get(api_settings.USER_ID_CLAIM),
+			token_type=token.get(api_settings.TOKEN_TYPE_CLAIM, ""),
+			reason=reason,
+			expires_at=datetime_from_epoch(token["exp"]),
+		)
+		for token in tokens
+	]
+	RevokedToken.objects.bulk_create(revoked, ignore_conflicts=True)
+	for row in revoked:
+		transaction.on_commit(lambda jti=row.jti: revocation_list.add(jti))
+
+
+def purge_expired_tokens(batch_size=1000):
+	"""Delete revocations of tokens that have expired anyway; returns how many were removed"""
+	purged = 0
+	while True:
+		ids = list(
+			RevokedToken.objects.filter(expires_at__lte=timezone.now()).values_list("pk", flat=True)[:batch_size]
+		)
+		if not ids:
+			return purged
+		purged += RevokedToken.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,203 @@
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .cities import resolve_city
+from .fulltext import fulltext_search
+from .models import (
+	Doctor,
+	Hospital,
+	MarketplaceItem,
+	MedicalEquipment,
+	MedicalEssential,
+	MedicalStoreProduct,
+	SearchDocument,
+)
+
+
+def _join(*parts, separator=" · "):
+	return separator.join(part for part in parts if part)
+
+
+def _hospital_document(hospital):
+	return {
+		"title": hospital.name,
+		"subtitle": _join(hospital.get_hospital_type_display(), hospital.city),
+		"body": _join(hospital.address, hospital.zip_code, separator=" "),
+		"city": hospital.city,
+		"city_ref_id": hospital.city_ref_id,
+	}
+
+
+def _doctor_document(doctor):
+	hospital = doctor.hospital
+	return {
+		"title": doctor.name,
+		"subtitle": _join(doctor.specialization, hospital.name if hospital else ""),
+		"body": doctor.qualifications,
+		"city": hospital.city if hospital else "",
+		"city_ref_id": hospital.city_ref_id if hospital else None,
+	}
+
+
+def _store_product_document(product):
+	if not product.is_active:
+		return None
+	return {
+		"title": product.name,
+		"subtitle": _join(product.brand, product.get_category_display()),
+		"body": _join(product.sku, product.description, separator=" "),
+		"city": product.supplier.city,
+		"city_ref_id": product.supplier.city_ref_id,
+	}
+
+
+def _equipment_document(equipment):
+	if not equipment.is_active:
+		return None
+	return {
+		"title": equipment.name,
+		"subtitle": _join(equipment.brand, equipment.model_number, equipment.get_equipment_type_display()),
+		"body": _join(equipment.sku, equipment.specifications, equipment.description, separator=" "),
+		"city": equipment.supplier.city,
+		"city_ref_id": equipment.supplier.city_ref_id,
+	}
+
+
+def _marketplace_document(item):
+	if not item.is_active:
+		return None
+	return {
+		"title": item.title,
+		"subtitle": _join(item.get_category_display(), item.city),
+		"body": item.description,
+		"city": item.city,
+		"city_ref_id": item.city_ref_id,
+	}
+
+
+# entity_type -> (model, select_related, document builder). A builder returns None
+# for records that must not be searchable, e.g. inactive products.
+SEARCH_SOURCES = {
+	"HOSPITAL": (Hospital, [], _hospital_document),
+	"DOCTOR": (Doctor, ["hospital"], _doctor_document),
+	"STORE": (MedicalStoreProduct, ["supplier"], _store_product_document),
+	"EQUIPMENT": (MedicalEquipment, ["supplier"], _equipment_document),
+	"MARKETPLACE": (MarketplaceItem, [], _marketplace_document),
+}
+ENTITY_TYPES = {model: entity_type for entity_type, (model, _, _) in SEARCH_SOURCES.items()}
+
+DOCUMENT_FIELDS = ["title", "subtitle", "body", "city", "city_ref"]
+
+
+def _document(entity_type, instance):
+	values = SEARCH_SOURCES[entity_type][2](instance)
+	if values is None:
+		return None
+	values["title"] = values["title"][:200]
+	values["subtitle"] = values["subtitle"][:255]
+	return SearchDocument(entity_type=entity_type, object_id=instance.pk, **values)
+
+
+def index_queryset(entity_type, queryset, chunk_size=1000):
+	"""
+	Upsert the documents for every record in ``queryset`` and drop those whose record
+	is no longer searchable. Reads in keyset chunks; each chunk costs one SELECT, one
+	INSERT ... ON CONFLICT DO UPDATE and at most one DELETE. Returns the number indexed.
+	"""
+	_, related, _ = SEARCH_SOURCES[entity_type]
+	queryset = queryset.select_related(*related).order_by("pk")
+	indexed = 0
+	last_pk = 0
+	while True:
+		chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+		if not chunk:
+			return indexed
+		documents = []
+		hidden = []
+		for instance in chunk:
+			document = _document(entity_type, instance)
+			if document is None:
+				hidden.append(instance.pk)
+			else:
+				documents.append(document)
+		if documents:
+			SearchDocument.objects.bulk_create(
+				documents,
+				update_conflicts=True,
+				unique_fields=["entity_type", "object_id"],
+				update_fields=DOCUMENT_FIELDS + ["updated_at"],
+			)
+		if hidden:
+			SearchDocument.objects.filter(entity_type=entity_type, object_id__in=hidden).delete()
+		indexed += len(documents)
+		last_pk = chunk[-1].pk
+
+
+def rebuild_search_documents(entity_types=None, chunk_size=1000):
+	"""Re-index every record of ``entity_types`` (default all) and delete orphaned documents; returns {type: count}"""
+	counts = {}
+	for entity_type in entity_types or SEARCH_SOURCES:
+		started = timezone.now()
+		model = SEARCH_SOURCES[entity_type][0]
+		counts[entity_type] = index_queryset(entity_type, model.objects.all(), chunk_size=chunk_size)
+		# Anything not rewritten above belongs to a deleted record
+		SearchDocument.objects.filter(entity_type=entity_type, updated_at__lt=started).delete()
+	return counts
+
+
+def search_documents(query, entity_types=None, city=None, limit=20, offset=0, highlight=False):
+	"""
+	Ranked hits across all entity types plus per-type facet counts.
+
+	Returns (hits, facets). Facets count every match regardless of ``entity_types``,
+	so a client can show how many hits each other type has. Two queries in total.
+	"""
+	matches = fulltext_search(SearchDocument.objects.all(), "SEARCH", query, highlight=highlight)
+	if city:
+		city_id = resolve_city(city)
+		matches = matches.filter(city_ref_id=city_id) if city_id else matches.filter(city__icontains=city)
+	facets = {
+		row["entity_type"]: row["total"]
+		for row in matches.order_by().values("entity_type").annotate(total=Count("id"))
+	}
+	if entity_types:
+		matches = matches.filter(entity_type__in=entity_types)
+	return list(matches[offset:offset + limit]), facets
+
+
+def _index_instance(sender, instance, **kwargs):
+	entity_type = ENTITY_TYPES[sender]
+	document = _document(entity_type, instance)
+	if document is None:
+		SearchDocument.objects.filter(entity_type=entity_type, object_id=instance.pk).delete()
+		return
+	SearchDocument.objects.update_or_create(
+		entity_type=entity_type,
+		object_id=instance.pk,
+		defaults={field: getattr(document, field) for field in DOCUMENT_FIELDS},
+	)
+	if sender is Hospital:
+		# Doctors carry their hospital's name and city
+		index_queryset("DOCTOR", instance.doctors.all())
+
+
+def _unindex_instance(sender, instance, **kwargs):
+	SearchDocument.objects.filter(entity_type=ENTITY_TYPES[sender], object_id=instance.pk).delete()
+
+
+def _supplier_saved(sender, instance, **kwargs):
+	# Products are searchable by their supplier's city
+	for entity_type, products in (("STORE", instance.store_products), ("EQUIPMENT", instance.equipment_products)):
+		SearchDocument.objects.filter(
+			entity_type=entity_type, object_id__in=products.values("pk"),
+		).exclude(city=instance.city, city_ref_id=instance.city_ref_id).update(
+			city=instance.city, city_ref_id=instance.city_ref_id,
+		)
+
+
+def connect_signals():
+	for model in ENTITY_TYPES:
+		post_save.connect(_index_instance, sender=model, dispatch_uid=f"search_index_{model.__name__}")
+		post_delete.connect(_unindex_instance, sender=model, dispatch_uid=f"search_unindex_{model.__name__}")
+	post_save.connect(_supplier_saved, sender=MedicalEssential, dispatch_uid="search_supplier_saved")
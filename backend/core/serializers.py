@@ -1,7 +1,12 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from django.contrib.auth import authenticate
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.contrib.auth.models import update_last_login
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.utils import timezone
+from .authentication import AUTH_TIME_CLAIM, TOKEN_CLAIMS, check_token_not_revoked
+from .passwords import authenticate_password
 from .models import (
 	DonorProfile,
 	EmergencyNeed,
@@ -21,6 +26,10 @@ from .models import (
 	MedicalEquipment,
 	MedicalOrder,
 	MedicalOrderItem,
+	StockReservation,
+	InventoryMovement,
+	StockAlert,
+	CatalogImportJob,
 )
 
 
@@ -32,27 +41,50 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
     donor_module = serializers.CharField(write_only=True)
 
+    @classmethod
+    def get_token(cls, user):
+        # Embedded so StatelessJWTAuthentication need not load the user per request
+        token = super().get_token(user)
+        for claim in TOKEN_CLAIMS:
+            token[claim] = getattr(user, claim)
+        token[AUTH_TIME_CLAIM] = timezone.now().timestamp()
+        return token
+
     def validate(self, attrs):
         email = attrs.get("email")
         password = attrs.get("password")
         donor_module = attrs.get("donor_module")
 
         if email and password:
-            user = authenticate(self.context['request'], email=email, password=password)
-            if not user:
-                raise serializers.ValidationError("Invalid email or password")
-
-
-            if donor_module and str(user.donor_module) != donor_module:
-                raise serializers.ValidationError("Donor module does not match")
-
-            data = super().validate({'email': email, 'password': password})
-            data['donor_module'] = donor_module or user.donor_module
-            return data
+            return self.issue_tokens(authenticate_password(email, password), donor_module)
         else:
             raise serializers.ValidationError("Must include 'email' and 'password'.")
+
+    def issue_tokens(self, user, donor_module):
+        """Token pair for the user authenticate_password() returned; the async login view calls this too"""
+        if not user:
+            raise serializers.ValidationError("Invalid email or password")
+
+        if donor_module and str(user.donor_module) != donor_module:
+            raise serializers.ValidationError("Donor module does not match")
+
+        # Issue the pair here; super().validate() would hash the password a second time
+        self.user = user
+        refresh = self.get_token(user)
+        data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        data['donor_module'] = donor_module or user.donor_module
+        return data
 	
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+	def validate(self, attrs):
+		# A revoked refresh token must not mint new access tokens
+		check_token_not_revoked(RefreshToken(attrs["refresh"]))
+		return super().validate(attrs)
+
+
 class UserPublicSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = User
@@ -461,7 +493,8 @@ class BloodDonationEventSerializer(serializers.ModelSerializer):
 class MedicalEssentialSerializer(serializers.ModelSerializer):
 	user = UserPublicSerializer(read_only=True)
 	user_id = serializers.PrimaryKeyRelatedField(source="user", write_only=True, queryset=User.objects.all(), required=True)
-	api_key = serializers.CharField(read_only=True)
+	# Only the prefix is stored; the full key is shown once, right after it is generated
+	api_key = serializers.SerializerMethodField()
 
 	class Meta:
 		model = MedicalEssential
@@ -480,13 +513,17 @@ class MedicalEssentialSerializer(serializers.ModelSerializer):
 			"license_number",
 			"tax_id",
 			"api_key",
+			"api_key_prefix",
 			"api_key_created_at",
 			"is_active",
 			"is_verified",
 			"created_at",
 			"updated_at",
 		]
-		read_only_fields = ["api_key", "api_key_created_at", "created_at", "updated_at"]
+		read_only_fields = ["api_key_prefix", "api_key_created_at", "created_at", "updated_at"]
+
+	def get_api_key(self, obj):
+		return getattr(obj, "raw_api_key", None)
 
 
 class MedicalStoreProductSerializer(serializers.ModelSerializer):
@@ -510,6 +547,7 @@ class MedicalStoreProductSerializer(serializers.ModelSerializer):
 			"minimum_order_quantity",
 			"unit",
 			"expiry_date",
+			"reorder_level",
 			"image",
 			"is_active",
 			"is_prescription_required",
@@ -601,3 +639,131 @@ class MedicalOrderSerializer(serializers.ModelSerializer):
 			"updated_at",
 		]
 		read_only_fields = ["order_number", "created_at", "updated_at"]
+
+
+class CheckoutSerializer(serializers.ModelSerializer):
+	"""Shipping details shared by every order created from one cart"""
+
+	class Meta:
+		model = MedicalOrder
+		fields = [
+			"currency",
+			"shipping_address",
+			"shipping_city",
+			"shipping_zip_code",
+			"contact_phone",
+			"notes",
+			"estimated_delivery",
+		]
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = StockReservation
+		fields = [
+			"id",
+			"product_type",
+			"store_product",
+			"equipment",
+			"quantity",
+			"status",
+			"expires_at",
+			"order",
+			"created_at",
+			"updated_at",
+		]
+		read_only_fields = fields
+
+
+class InventoryMovementSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = InventoryMovement
+		fields = [
+			"id",
+			"product_type",
+			"store_product",
+			"equipment",
+			"quantity_delta",
+			"reason",
+			"order",
+			"note",
+			"applied_at",
+			"created_at",
+		]
+		read_only_fields = fields
+
+
+class StockAlertSerializer(serializers.ModelSerializer):
+	store_product_name = serializers.CharField(source="store_product.name", read_only=True)
+
+	class Meta:
+		model = StockAlert
+		fields = [
+			"id",
+			"store_product",
+			"store_product_name",
+			"alert_type",
+			"expiry_date",
+			"quantity_available",
+			"message",
+			"is_resolved",
+			"resolved_at",
+			"created_at",
+		]
+		read_only_fields = fields
+
+
+class CatalogImportJobSerializer(serializers.ModelSerializer):
+	file = serializers.FileField(write_only=True)
+	file_format = serializers.ChoiceField(choices=CatalogImportJob.FORMAT_CHOICES, required=False)
+	progress = serializers.SerializerMethodField()
+
+	class Meta:
+		model = CatalogImportJob
+		fields = [
+			"id",
+			"product_type",
+			"file",
+			"file_format",
+			"file_size",
+			"status",
+			"progress",
+			"bytes_processed",
+			"processed_rows",
+			"created_count",
+			"updated_count",
+			"unchanged_count",
+			"duplicate_count",
+			"error_count",
+			"errors",
+			"detail",
+			"started_at",
+			"finished_at",
+			"created_at",
+			"updated_at",
+		]
+		read_only_fields = [
+			"file_size", "status", "bytes_processed", "processed_rows", "created_count", "updated_count",
+			"unchanged_count", "duplicate_count", "error_count", "errors", "detail", "started_at",
+			"finished_at", "created_at", "updated_at",
+		]
+
+	def get_progress(self, obj):
+		"""Percentage of the file read so far"""
+		if obj.status == "COMPLETED":
+			return 100
+		if not obj.file_size:
+			return 0
+		return min(99, int(obj.bytes_processed * 100 / obj.file_size))
+
+	def validate(self, attrs):
+		if not attrs.get("file_format"):
+			name = attrs["file"].name.lower()
+			if name.endswith(".csv"):
+				attrs["file_format"] = "CSV"
+			elif name.endswith((".ndjson", ".jsonl")):
+				attrs["file_format"] = "NDJSON"
+			else:
+				raise serializers.ValidationError({"file_format": "Upload a .csv or .ndjson file, or set file_format."})
+		attrs["file_size"] = attrs["file"].size
+		return attrs
@@ -0,0 +1,27 @@
+from .jobs import task
+from .models import AccidentAlert, EmergencyNeed
+from .notifications import deliver, notify_accident, notify_need
+
+# Jobs may run more than once (after a partial failure, or when a worker is presumed
+# dead), so every task here must be safe to repeat.
+
+
+@task("notify_emergency_need")
+def notify_emergency_need(need_id):
+	"""Tell hospitals, blood banks and compatible donors around a newly posted emergency need"""
+	need = EmergencyNeed.objects.filter(pk=need_id, status="OPEN").first()
+	if need is not None:
+		notify_need(need)
+
+
+@task("notify_accident_alert")
+def notify_accident_alert(alert_id):
+	"""Tell the referred hospital and the hospitals around a sped-up accident alert"""
+	alert = AccidentAlert.objects.filter(pk=alert_id).first()
+	if alert is not None:
+		notify_accident(alert)
+
+
+@task("deliver_notifications", max_attempts=8)
+def deliver_notifications(channel, ids):
+	deliver(channel, ids)
@@ -0,0 +1,1003 @@
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import (
+	AsyncRequestFactory,
+	RequestFactory,
+	TestCase,
+	TransactionTestCase,
+	override_settings,
+	skipUnlessDBFeature,
+)
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views, fulltext, jobs, throttling
+from .alerts import scan_stock_alerts
+from .async_views import AsyncDonorDashboardView, AsyncEmergencyNeedListView, AsyncTokenObtainPairView, run_query
+from .autocomplete import PrefixIndex, autocomplete_indexes
+from .authentication import (
+	ApiKeyAuthentication,
+	StatelessJWTAuthentication,
+	TokenDenyList,
+	check_token_not_revoked,
+	principal_cache,
+	revoke_user_tokens,
+	token_deny_list,
+	usage_counter,
+	user_from_claims,
+)
+from .cities import CityResolver, city_resolver
+from .context import RequestProfiles
+from .inventory import fold_pending_movements
+from .models import (
+	AccidentAlert,
+	City,
+	CityAlias,
+	DonorProfile,
+	EmergencyNeed,
+	Hospital,
+	InventoryMovement,
+	Job,
+	MedicalEquipment,
+	MedicalEssential,
+	MedicalOrder,
+	MedicalOrderItem,
+	MedicalStoreProduct,
+	Notification,
+	StockAlert,
+	SupplierDailySales,
+)
+from .notifications import get_channel, notify_need
+from .order_numbers import OrderNumberAllocator, allocator as order_number_allocator
+from .orders import OrderError, place_orders
+from .reservations import reserve_stock
+from .revocation import revocation_list, revoke_tokens
+from .serializers import CustomTokenObtainPairSerializer
+from .trigram import RefreshedIndexes, field_indexes, fuzzy_city_filter, fuzzy_search
+
+backfill_cities = import_module("core.migrations.0017_backfill_cities").backfill_cities
+
+
+class EmergencyThrottleTests(TestCase):
+	def setUp(self):
+		throttling.bucket_store._buckets.clear()
+
+	def post_need(self, address, **headers):
+		return APIClient().post("/api/needs/critical_emergency/", {}, format="json", REMOTE_ADDR=address, **headers)
+
+	@override_settings(THROTTLE_BUCKETS={"emergency": {"client": (10, 5), "route": (600, 20)}})
+	def test_refused_client_does_not_drain_route(self):
+		statuses = [self.post_need("10.0.0.1").status_code for _ in range(150)]
+		self.assertEqual(statuses.count(429), 145)
+		self.assertNotEqual(self.post_need("10.0.0.2").status_code, 429)
+
+	@override_settings(THROTTLE_BUCKETS={"emergency": {"client": (600, 100), "route": (60, 3)}})
+	def test_emergency_actions_have_separate_route_buckets(self):
+		statuses = [self.post_need(f"10.0.1.{i}").status_code for i in range(4)]
+		self.assertEqual(statuses[-1], 429)
+		response = APIClient().post("/api/accident-alerts/999999/speed_up/", REMOTE_ADDR="10.0.1.9")
+		self.assertEqual(response.status_code, 404)
+
+	@override_settings(THROTTLE_BUCKETS={"emergency": {"client": (10, 5)}})
+	def test_forwarded_for_does_not_dodge_client_bucket(self):
+		statuses = [
+			self.post_need("10.0.2.1", HTTP_X_FORWARDED_FOR=f"192.0.2.{i}").status_code
+			for i in range(6)
+		]
+		self.assertEqual(statuses[-1], 429)
+
+
+@override_settings(THROTTLE_BUCKETS={})
+class LoadSheddingTests(TestCase):
+	def status_under(self, in_flight, method, url):
+		with mock.patch.object(throttling.load_shedder, "_in_flight", in_flight):
+			response = getattr(APIClient(), method)(url, {}, format="json")
+		if response.status_code == 503:
+			self.assertEqual(response["Retry-After"], "1")
+		return response.status_code
+
+	def test_lowest_priority_is_shed_first(self):
+		half = throttling.load_shedder.max_in_flight // 2
+		self.assertEqual(self.status_under(half, "get", "/api/metrics/overview/"), 503)
+		self.assertEqual(self.status_under(half, "get", "/api/hospitals/"), 200)
+		self.assertEqual(self.status_under(throttling.load_shedder.max_in_flight, "get", "/api/hospitals/"), 503)
+
+	def test_emergency_posting_is_never_shed(self):
+		status = self.status_under(throttling.load_shedder.max_in_flight * 10, "post", "/api/needs/critical_emergency/")
+		self.assertNotEqual(status, 503)
+
+
+@override_settings(THROTTLE_BUCKETS={})
+class AnonymousIdempotencyTests(TestCase):
+	def speed_up(self, alert, address):
+		return APIClient().post(
+			f"/api/accident-alerts/{alert.pk}/speed_up/", {}, format="json",
+			REMOTE_ADDR=address, HTTP_IDEMPOTENCY_KEY="retry-1",
+		)
+
+	def test_anonymous_clients_do_not_share_keys(self):
+		alert = AccidentAlert.objects.create(title="Collision", location="Ring road", city="Pune")
+		first = self.speed_up(alert, "10.0.3.1")
+		self.assertEqual(first.status_code, 200)
+		self.assertNotIn("Idempotent-Replayed", self.speed_up(alert, "10.0.3.2"))
+		self.assertEqual(self.speed_up(alert, "10.0.3.1")["Idempotent-Replayed"], "true")
+
+
+SHIPPING = {"shipping_address": "Main road", "shipping_city": "Pune", "contact_phone": "1"}
+
+
+def make_product(quantity):
+	user = DonorProfile.objects.create_user(email="supplier@example.com", password="not-used-1", donor_module="medical_essential")
+	supplier = MedicalEssential.objects.create(
+		user=user, company_name="Supplies", contact_person="Owner", phone="1", email=user.email, address="Main road", city="Pune",
+	)
+	return MedicalStoreProduct.objects.create(supplier=supplier, name="Gloves", sku="gloves", price=Decimal("2.50"), quantity_available=quantity)
+
+
+class CheckoutTests(TestCase):
+	def setUp(self):
+		self.gloves = make_product(5)
+		user = DonorProfile.objects.create_user(email="equipment@example.com", password="not-used-1", donor_module="medical_essential")
+		supplier = MedicalEssential.objects.create(
+			user=user, company_name="Equipment", contact_person="Owner", phone="2", email=user.email, address="Ring road", city="Pune",
+		)
+		self.concentrator = MedicalEquipment.objects.create(supplier=supplier, name="Concentrator", sku="concentrator", price=Decimal("100"), quantity_available=2)
+		self.client = APIClient()
+		self.client.force_authenticate(DonorProfile.objects.create_user(email="buyer@example.com", password="not-used-1"))
+
+	def order(self, url, concentrators):
+		items = [
+			{"product_type": "STORE", "store_product_id": self.gloves.pk, "quantity": 2},
+			{"product_type": "EQUIPMENT", "equipment_id": self.concentrator.pk, "quantity": concentrators},
+		]
+		return self.client.post(f"/api/medical-orders/{url}/", {"items": items, **SHIPPING}, format="json")
+
+	def assert_stock(self, gloves, concentrators):
+		self.gloves.refresh_from_db()
+		self.concentrator.refresh_from_db()
+		self.assertEqual((self.gloves.quantity_available, self.concentrator.quantity_available), (gloves, concentrators))
+
+	def test_mixed_cart_becomes_one_order_per_supplier(self):
+		response = self.order("checkout", 1)
+		self.assertEqual(response.status_code, 201, response.data)
+		self.assertEqual([order["total_amount"] for order in response.data["orders"]], ["5.00", "100.00"])
+		self.assertEqual(response.data["total_amount"], "105.00")
+		self.assert_stock(3, 1)
+
+	def test_single_supplier_endpoint_refuses_a_mixed_cart(self):
+		self.assertEqual(self.order("create-order", 1).status_code, 400)
+		self.assertFalse(MedicalOrder.objects.exists())
+		self.assert_stock(5, 2)
+
+	def test_one_short_line_fails_the_whole_cart(self):
+		response = self.order("checkout", 3)
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(response.data["detail"], "Insufficient stock for Concentrator")
+		self.assertFalse(MedicalOrder.objects.exists())
+		self.assert_stock(5, 2)
+
+
+class OrderNumberTests(TransactionTestCase):
+	def test_values_come_from_blocks_claimed_once(self):
+		allocator = OrderNumberAllocator(block_size=5)
+		allocator.ensure(1)
+		with self.assertNumQueries(0):
+			values = [allocator.next_value() for _ in range(5)]
+		self.assertEqual(values, [1, 2, 3, 4, 5])
+		self.assertEqual(allocator.next_value(), 6)
+
+	def test_workers_never_share_a_value(self):
+		workers = [OrderNumberAllocator(block_size=3) for _ in range(3)]
+		values = [worker.next_value() for _ in range(7) for worker in workers]
+		self.assertEqual(len(set(values)), len(values))
+
+	def test_values_taken_inside_a_transaction_are_not_kept_as_a_block(self):
+		allocator = OrderNumberAllocator(block_size=100)
+		with transaction.atomic():
+			self.assertEqual(allocator.next_value(), 1)
+			allocator.ensure(10)
+		self.assertEqual(OrderNumberAllocator(block_size=1).next_value(), 2)
+
+
+class ConcurrentOrderTests(TransactionTestCase):
+	def setUp(self):
+		# The table flush after each test deletes cities without sending signals
+		city_resolver.clear()
+
+	def test_concurrent_orders_do_not_oversell(self):
+		product = make_product(5)
+		user = product.supplier.user
+		placed, refused = [], []
+
+		def buy():
+			try:
+				order_number_allocator.ensure(1)
+				placed.extend(place_orders(user, SHIPPING, {("STORE", product.pk): 2}))
+			except (OrderError, DatabaseError):
+				refused.append(1)
+			finally:
+				connection.close()
+
+		threads = [threading.Thread(target=buy) for _ in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		product.refresh_from_db()
+		self.assertGreaterEqual(product.quantity_available, 0)
+		self.assertEqual(len(placed) + len(refused), 8)
+		self.assertTrue(placed)
+		self.assertEqual(MedicalOrder.objects.count(), len(placed))
+		sold = sum(MedicalOrderItem.objects.values_list("quantity", flat=True))
+		self.assertEqual(sold, 2 * len(placed))
+		self.assertEqual(product.quantity_available, 5 - sold)
+		for order in MedicalOrder.objects.all():
+			self.assertEqual(order.total_amount, Decimal("5.00"))
+
+
+class WorkerTests(TestCase):
+	@mock.patch.object(jobs, "close_old_connections", lambda: None)
+	def test_database_error_recording_outcome_does_not_stop_worker(self):
+		jobs.enqueue("notify_accident_alert", alert_id=0)
+		jobs.enqueue("notify_accident_alert", alert_id=0)
+		with mock.patch.object(jobs, "run_job", side_effect=DatabaseError("database is locked")) as run_job:
+			with self.assertLogs("core.jobs", "WARNING") as logs:
+				self.assertEqual(jobs.run_worker(burst=True), 2)
+		self.assertEqual(len(logs.records), 2)
+		self.assertEqual(run_job.call_count, 2)
+		self.assertEqual(Job.objects.filter(status="RUNNING").count(), 2)
+
+
+@override_settings(NOTIFICATION_CHANNELS=dict.fromkeys(("sms", "email", "push"), "core.notifications.ConsoleChannel"))
+class NotificationFanOutTests(TestCase):
+	def setUp(self):
+		get_channel.cache_clear()
+		self.addCleanup(get_channel.cache_clear)
+		hospital_user = DonorProfile.objects.create_user(email="ward@example.com", password="not-used-1", donor_module="hospital")
+		Hospital.objects.create(name="City Hospital", city="Pune", phone="555", user=hospital_user)
+		self.donor = self.make_donor("compatible@example.com", "O-", "Pune")
+		self.make_donor("incompatible@example.com", "B+", "Pune")
+		self.make_donor("elsewhere@example.com", "O-", "Mumbai")
+		self.need = EmergencyNeed.objects.create(
+			created_by=self.donor, title="Blood for surgery", required_blood_group="A+", city="Pune",
+		)
+
+	def make_donor(self, email, blood_group, city):
+		return DonorProfile.objects.create_user(
+			email=email, password="not-used-1", donor_module="donor", blood_group=blood_group, city=city, is_available=True,
+		)
+
+	def test_fans_out_once_per_recipient_and_channel(self):
+		other = self.make_donor("other@example.com", "A-", "Pune")
+		self.assertEqual(notify_need(self.need), 3)
+		self.assertEqual(
+			set(Notification.objects.values_list("channel", "address")),
+			{("sms", "555"), ("email", "ward@example.com"), ("push", str(other.pk))},
+		)
+		self.assertEqual(notify_need(self.need), 0)
+
+	def assert_jobs_carry_the_new_ids(self):
+		self.assertEqual(notify_need(self.need), 2)
+		queued = {
+			(job.payload["channel"], tuple(sorted(job.payload["ids"])))
+			for job in Job.objects.filter(task="deliver_notifications")
+		}
+		expected = {
+			(channel, tuple(sorted(Notification.objects.filter(channel=channel).values_list("pk", flat=True))))
+			for channel in ("sms", "email")
+		}
+		self.assertEqual(queued, expected)
+
+	@skipUnlessDBFeature("can_return_rows_from_bulk_insert")
+	def test_delivery_jobs_get_the_ids_returned_by_the_insert(self):
+		self.assert_jobs_carry_the_new_ids()
+
+	def test_delivery_jobs_get_the_ids_without_returning(self):
+		with mock.patch.object(type(connection.features), "can_return_rows_from_bulk_insert", False):
+			self.assert_jobs_carry_the_new_ids()
+
+	@mock.patch.object(jobs, "close_old_connections", lambda: None)
+	def test_worker_delivers_the_queued_batches(self):
+		notify_need(self.need)
+		with self.assertLogs("core.notifications", "INFO"):
+			jobs.run_worker(burst=True)
+		self.assertEqual(set(Notification.objects.values_list("status", flat=True)), {"SENT"})
+
+
+class SalesAggregateTests(TestCase):
+	def test_aggregates_are_updated_after_the_order_commits(self):
+		product = make_product(5)
+		order_number_allocator.ensure(1)
+		with self.captureOnCommitCallbacks(execute=True):
+			place_orders(product.supplier.user, SHIPPING, {("STORE", product.pk): 2})
+			self.assertFalse(SupplierDailySales.objects.exists())
+		sales = SupplierDailySales.objects.get(supplier=product.supplier)
+		self.assertEqual((sales.order_count, sales.units_sold, sales.revenue), (1, 2, Decimal("5.00")))
+
+
+class StockEditTests(TestCase):
+	def setUp(self):
+		self.product = make_product(10)
+		self.client = APIClient()
+		self.client.force_authenticate(self.product.supplier.user)
+		url = f"/api/medical-store-products/{self.product.pk}/restock/"
+		self.assertEqual(self.client.post(url, {"quantity": 5, "note": {"po": 1}}, format="json").status_code, 201)
+
+	def assert_stock(self, quantity):
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.quantity_available, quantity)
+		self.assertFalse(InventoryMovement.objects.filter(applied_at__isnull=True).exists())
+		self.assertEqual(sum(InventoryMovement.objects.values_list("quantity_delta", flat=True)), quantity - 10)
+
+	def test_edit_supersedes_pending_restock(self):
+		response = self.client.patch(f"/api/medical-store-products/{self.product.pk}/", {"quantity_available": 7}, format="json")
+		self.assertEqual(response.status_code, 200, response.data)
+		self.assert_stock(7)
+
+	def test_sync_supersedes_pending_restock(self):
+		response = self.client.post("/api/medical-store-products/sync/", [{"sku": "gloves", "quantity_available": 7}], format="json")
+		self.assertEqual(response.status_code, 200, response.data)
+		self.assert_stock(7)
+
+	def test_fold_applies_only_the_rows_it_claimed(self):
+		stamped_at = timezone.now()
+		# Claimed by another folder at the same instant, which applies it itself
+		InventoryMovement.objects.create(
+			supplier=self.product.supplier, product_type="STORE", store_product=self.product,
+			quantity_delta=100, reason="RESTOCK", applied_at=stamped_at,
+		)
+		with mock.patch("django.utils.timezone.now", return_value=stamped_at):
+			self.assertEqual(fold_pending_movements(), 1)
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.quantity_available, 15)
+
+
+class FuzzySearchTests(TestCase):
+	def setUp(self):
+		field_indexes.clear()
+		self.addCleanup(field_indexes.clear)
+		self.apollo = Hospital.objects.create(name="Apollo Hospital", city="Hyderabad")
+		Hospital.objects.create(name="Sunrise Clinic", city="Pune")
+
+	def test_misspelt_hospital_name_is_found(self):
+		response = APIClient().get("/api/fuzzy-search/", {"q": "Apolo", "type": "hospital"})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual([result["id"] for result in response.data["results"]], [self.apollo.pk])
+
+	def test_index_follows_saves_and_deletes(self):
+		self.assertEqual(fuzzy_search("hospital", "Sunset"), [])
+		with self.captureOnCommitCallbacks(execute=True):
+			sunset = Hospital.objects.create(name="Sunset Medical Centre", city="Pune")
+		self.assertEqual([pk for pk, _, _ in fuzzy_search("hospital", "Sunset")], [sunset.pk])
+		with self.captureOnCommitCallbacks(execute=True):
+			sunset.delete()
+		self.assertEqual(fuzzy_search("hospital", "Sunset"), [])
+
+	def test_rolled_back_save_leaves_no_match(self):
+		self.assertEqual(fuzzy_search("hospital", "Sunset"), [])
+		with self.captureOnCommitCallbacks(execute=True):
+			with transaction.atomic():
+				Hospital.objects.create(name="Sunset Medical Centre", city="Pune")
+				transaction.set_rollback(True)
+		self.assertEqual(fuzzy_search("hospital", "Sunset"), [])
+
+	def test_misspelt_city_falls_back_to_the_closest_city(self):
+		self.assertEqual(list(fuzzy_city_filter(Hospital.objects.all(), "city", "Hyderbad")), [self.apollo])
+
+
+class AutocompleteTests(TestCase):
+	def setUp(self):
+		autocomplete_indexes.clear()
+		self.addCleanup(autocomplete_indexes.clear)
+		Hospital.objects.create(name="Sunrise Metro Hospital", city="Pune")
+		Hospital.objects.create(name="Metro Heart Institute", city="Pune")
+		Hospital.objects.create(name="City Care", city="Hyderabad")
+
+	def suggest(self, query, kinds):
+		response = APIClient().get("/api/autocomplete/", {"q": query, "type": kinds})
+		self.assertEqual(response.status_code, 200)
+		return {kind: [item["label"] for item in response.data[kind]] for kind in kinds.split(",")}
+
+	def test_prefix_of_any_word_matches_without_queries(self):
+		self.suggest("m", "hospital,city,product")
+		with self.assertNumQueries(0):
+			suggestions = self.suggest("metro h", "hospital,city")
+		self.assertEqual(suggestions, {"hospital": ["Metro Heart Institute", "Sunrise Metro Hospital"], "city": []})
+		self.assertEqual(self.suggest("pu", "city"), {"city": ["Pune"]})
+
+	def test_products_follow_saves(self):
+		self.suggest("glo", "product")
+		with self.captureOnCommitCallbacks(execute=True):
+			product = make_product(1)
+		self.assertEqual(self.suggest("glo", "product"), {"product": ["Gloves"]})
+		product.is_active = False
+		with self.captureOnCommitCallbacks(execute=True):
+			product.save()
+		self.assertEqual(self.suggest("glo", "product"), {"product": []})
+
+	def test_rolled_back_save_leaves_no_suggestion(self):
+		self.suggest("sun", "hospital,city")
+		with self.captureOnCommitCallbacks(execute=True):
+			with transaction.atomic():
+				Hospital.objects.create(name="Sunset Clinic", city="Surat")
+				transaction.set_rollback(True)
+		self.assertEqual(self.suggest("su", "hospital,city"), {"hospital": ["Sunrise Metro Hospital"], "city": []})
+
+	def test_popularity_orders_cached_prefixes(self):
+		index = PrefixIndex()
+		index.load((pk, f"Ward {pk}", 0) for pk in range(100))
+		self.assertEqual(index.search("ward", limit=2), [(0, "Ward 0"), (1, "Ward 1")])
+		index.bump(42, 5)
+		self.assertEqual(index.search("ward", limit=2), [(42, "Ward 42"), (0, "Ward 0")])
+
+
+class CountingIndexes(RefreshedIndexes):
+	def __init__(self):
+		super().__init__()
+		self.builds = 0
+		self.release = threading.Event()
+
+	def ttl_seconds(self):
+		return 0
+
+	def build(self, key):
+		self.builds += 1
+		if self.builds > 1:
+			self.release.wait(5)
+		return self.builds
+
+
+class RefreshedIndexesTests(TestCase):
+	def test_expired_index_is_served_while_one_thread_rebuilds_it(self):
+		indexes = CountingIndexes()
+		self.assertEqual(indexes._get("kind"), 1)
+		self.assertEqual([indexes._get("kind") for _ in range(5)], [1] * 5)
+		refresher = next(thread for thread in threading.enumerate() if thread.name == "index-refresh")
+		indexes.release.set()
+		refresher.join(5)
+		self.assertEqual(indexes.builds, 2)
+		self.assertEqual(indexes._get("kind"), 2)
+
+
+class ExpiredStockTests(TestCase):
+	def setUp(self):
+		self.product = make_product(10)
+		self.product.expiry_date = timezone.localdate() - timedelta(days=1)
+		self.product.save()
+
+	def listed(self, user, query):
+		client = APIClient()
+		if user is not None:
+			client.force_authenticate(user)
+		return [product["sku"] for product in client.get(f"/api/medical-store-products/?{query}").data]
+
+	def test_include_expired_is_only_honoured_for_staff(self):
+		self.assertEqual(self.listed(None, "include_expired=true"), [])
+		other = DonorProfile.objects.create_user(email="other@example.com", password="not-used-1")
+		self.assertEqual(self.listed(other, "include_expired=true"), [])
+		staff = DonorProfile.objects.create_user(email="staff@example.com", password="not-used-1", is_staff=True)
+		self.assertEqual(self.listed(staff, "include_expired=true"), ["gloves"])
+
+	def test_supplier_sees_own_expired_stock(self):
+		supplier = self.product.supplier
+		self.assertEqual(self.listed(supplier.user, f"supplier={supplier.pk}"), ["gloves"])
+		self.assertEqual(self.listed(None, f"supplier={supplier.pk}"), [])
+
+
+class FacetTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.product = make_product(10)
+		self.product.brand = "Acme"
+		self.product.save()
+
+	def facets(self, user=None, query=""):
+		client = APIClient()
+		if user is not None:
+			client.force_authenticate(user)
+		response = client.get(f"/api/medical-store-products/facets/?{query}")
+		self.assertEqual(response.status_code, 200, response.data)
+		return {name: {value["value"]: value["count"] for value in values} for name, values in response.data["facets"].items()}
+
+	def test_counts_every_facet_in_one_query(self):
+		MedicalStoreProduct.objects.create(supplier=self.product.supplier, name="Mask", sku="mask", price=Decimal("150"), category="PPE")
+		with self.assertNumQueries(1):
+			facets = self.facets()
+		self.assertEqual(facets["brand"], {"Acme": 1})
+		self.assertEqual(facets["category"], {"OTHER": 1, "PPE": 1})
+		self.assertEqual(facets["price_band"], {"0-100": 1, "100-500": 1})
+
+	def test_staff_counts_with_expired_stock_are_not_served_to_others(self):
+		self.product.expiry_date = timezone.localdate() - timedelta(days=1)
+		self.product.save()
+		staff = DonorProfile.objects.create_user(email="staff@example.com", password="not-used-1", is_staff=True)
+		self.assertEqual(self.facets(staff, "include_expired=true")["brand"], {"Acme": 1})
+		self.assertEqual(self.facets(None, "include_expired=true")["brand"], {})
+
+	def test_sync_invalidates_cached_counts(self):
+		self.assertEqual(self.facets()["brand"], {"Acme": 1})
+		client = APIClient()
+		client.force_authenticate(self.product.supplier.user)
+		with self.captureOnCommitCallbacks(execute=True):
+			response = client.post("/api/medical-store-products/sync/", [{"sku": "gloves", "brand": "Bolt"}], format="json")
+		self.assertEqual(response.status_code, 200, response.data)
+		self.assertEqual(self.facets()["brand"], {"Bolt": 1})
+
+
+@mock.patch.object(usage_counter, "record", lambda profile_id: None)
+class ApiKeyAuthenticationTests(TestCase):
+	def setUp(self):
+		principal_cache.clear()
+		self.supplier = make_product(1).supplier
+		self.request = RequestFactory().get("/", HTTP_X_API_KEY=self.supplier.raw_api_key)
+
+	def test_cached_key_gives_each_request_its_own_instances(self):
+		user, profile = ApiKeyAuthentication().authenticate(self.request)
+		profile.company_name = "Unsaved edit"
+		with self.assertNumQueries(0):
+			cached_user, cached_profile = ApiKeyAuthentication().authenticate(self.request)
+		self.assertIsNot(cached_profile, profile)
+		self.assertIsNot(cached_user, user)
+		self.assertIs(cached_profile.user, cached_user)
+		self.assertEqual(cached_profile.company_name, "Supplies")
+		self.assertEqual(cached_user.pk, self.supplier.user_id)
+
+
+class RequestProfilesTests(TestCase):
+	def setUp(self):
+		self.supplier = make_product(1).supplier
+		self.request = RequestFactory().get("/")
+
+	def test_profiles_are_loaded_together_once(self):
+		self.request.user = DonorProfile.objects.get(pk=self.supplier.user_id)
+		profiles = RequestProfiles(self.request)
+		with self.assertNumQueries(1):
+			self.assertEqual(profiles.supplier.pk, self.supplier.pk)
+			self.assertIsNone(profiles.hospital)
+			self.assertIsNone(profiles.organ_donor)
+			self.assertIs(profiles.supplier, profiles.supplier)
+		self.assertIs(profiles.supplier.user, self.request.user)
+
+	def test_api_key_supplier_costs_no_query(self):
+		self.request.user = self.supplier.user
+		self.request.auth = self.supplier
+		with self.assertNumQueries(0):
+			self.assertIs(RequestProfiles(self.request).supplier, self.supplier)
+
+	def test_user_from_token_claims_is_completed_by_the_same_query(self):
+		self.request.user = user_from_claims(CustomTokenObtainPairSerializer.get_token(self.supplier.user).access_token)
+		profiles = RequestProfiles(self.request)
+		with self.assertNumQueries(1):
+			profiles.hospital
+			self.assertEqual(self.request.user.email, "supplier@example.com")
+
+
+class AsyncViewTests(TransactionTestCase):
+	def setUp(self):
+		throttling.bucket_store._buckets.clear()
+		cache.clear()
+		# The table flush after each test deletes cities without sending signals
+		city_resolver.clear()
+		self.donor = DonorProfile.objects.create_user(email="donor@example.com", password="not-used-1", blood_group="O-")
+		self.need = EmergencyNeed.objects.create(created_by=self.donor, title="Blood for surgery", required_blood_group="AB+", city="Pune")
+
+	async def test_list_view_filters_through_the_viewset(self):
+		response = await AsyncEmergencyNeedListView.as_view()(AsyncRequestFactory().get("/api/needs/", {"status": "OPEN"}))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual([need["title"] for need in json.loads(response.content)], ["Blood for surgery"])
+
+	async def test_dashboard_matches_needs_to_the_donor(self):
+		token = CustomTokenObtainPairSerializer.get_token(self.donor).access_token
+		request = AsyncRequestFactory().get("/api/donors/dashboard/", headers={"Authorization": f"Bearer {token}"})
+		response = await AsyncDonorDashboardView.as_view()(request)
+		self.assertEqual(response.status_code, 200, response.content)
+		data = json.loads(response.content)
+		self.assertEqual(data["compatibility"]["blood_group"], "O-")
+		self.assertEqual([need["id"] for need in data["recommended_needs"]], [self.need.pk])
+
+	def test_query_threads_keep_their_connection(self):
+		def connection_id():
+			connection.ensure_connection()
+			return id(connection.connection)
+
+		executor = ThreadPoolExecutor(max_workers=1)
+		with mock.patch.object(async_views, "query_executor", executor), mock.patch.dict(connection.settings_dict, {"CONN_MAX_AGE": None}):
+			first = async_to_sync(run_query)(connection_id)
+			second = async_to_sync(run_query)(connection_id)
+			async_to_sync(run_query)(lambda: connection.close())
+		executor.shutdown()
+		self.assertEqual(first, second)
+
+
+class AsyncLoginTests(TestCase):
+	def setUp(self):
+		self.user = DonorProfile.objects.create_user(email="donor@example.com", password="right-horse-7", donor_module="donor")
+
+	async def login(self, password):
+		request = AsyncRequestFactory().post(
+			"/api/auth/token/", {"email": "donor@example.com", "password": password, "donor_module": "donor"},
+			content_type="application/json",
+		)
+		response = await AsyncTokenObtainPairView.as_view()(request)
+		return response.status_code, json.loads(response.content)
+
+	async def test_issues_tokens_for_the_right_password(self):
+		status, data = await self.login("right-horse-7")
+		self.assertEqual(status, 200, data)
+		self.assertEqual(data["donor_module"], "donor")
+		self.assertEqual(str(AccessToken(data["access"])["user_id"]), str(self.user.pk))
+		self.assertEqual(await self.login("wrong-horse-7"), (400, {"non_field_errors": ["Invalid email or password"]}))
+
+	async def test_outdated_hash_is_upgraded_without_revoking_tokens(self):
+		await DonorProfile.objects.filter(pk=self.user.pk).aupdate(
+			password=make_password("right-horse-7", hasher="pbkdf2_sha1"),
+		)
+		status, _ = await self.login("right-horse-7")
+		self.assertEqual(status, 200)
+		user = await DonorProfile.objects.aget(pk=self.user.pk)
+		self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+		self.assertEqual(user.tokens_valid_after, self.user.tokens_valid_after)
+
+
+class CatalogSyncTests(TestCase):
+	def setUp(self):
+		self.product = make_product(10)
+		self.client = APIClient()
+		self.client.force_authenticate(self.product.supplier.user)
+
+	def sync(self, rows):
+		return self.client.post("/api/medical-store-products/sync/", rows, format="json")
+
+	def test_rows_are_upserted_by_sku(self):
+		response = self.sync([
+			{"sku": "gloves", "price": "3.00"},
+			{"sku": "mask", "name": "Mask", "price": "1.00", "quantity_available": 50},
+			{"sku": "gown", "name": "Gown", "price": "1e30"},
+		])
+		self.assertEqual(response.status_code, 200, response.data)
+		self.assertEqual(
+			(response.data["processed"], response.data["created"], response.data["updated"], response.data["error_count"]),
+			(3, 1, 1, 1),
+		)
+		self.assertEqual(response.data["errors"][0]["sku"], "gown")
+		self.product.refresh_from_db()
+		self.assertEqual((self.product.price, self.product.quantity_available), (Decimal("3.00"), 10))
+		self.assertEqual(MedicalStoreProduct.objects.get(sku="mask").supplier, self.product.supplier)
+		self.assertFalse(MedicalStoreProduct.objects.filter(sku="gown").exists())
+
+		self.assertEqual(self.sync([{"sku": "gloves", "price": "3.00"}]).data["unchanged"], 1)
+
+	def test_starting_stock_of_created_products_is_logged(self):
+		self.sync([{"sku": "mask", "name": "Mask", "price": "1.00", "quantity_available": 50}, {"sku": "gown", "name": "Gown", "price": "1"}])
+		movements = InventoryMovement.objects.values_list("store_product__sku", "quantity_delta", "reason")
+		self.assertEqual(list(movements), [("mask", 50, "ADJUSTMENT")])
+
+	def test_sku_inserted_by_another_supplier_meanwhile_is_not_overwritten(self):
+		user = DonorProfile.objects.create_user(email="rival@example.com", password="not-used-1", donor_module="medical_essential")
+		rival = MedicalEssential.objects.create(
+			user=user, company_name="Rival", contact_person="Owner", phone="3", email=user.email, address="Ring road", city="Pune",
+		)
+		MedicalStoreProduct.objects.create(supplier=rival, name="Rival mask", sku="mask", price=Decimal("5"))
+		# As if the rival's insert landed between this sync's read and its write
+		with mock.patch("django.db.models.query.QuerySet.in_bulk", return_value={}):
+			response = self.sync([{"sku": "mask", "name": "Mask", "price": "1.00", "quantity_available": 50}])
+		self.assertEqual((response.data["created"], response.data["error_count"]), (0, 1))
+		self.assertEqual(response.data["errors"][0]["errors"], {"sku": "This SKU belongs to another supplier."})
+		mask = MedicalStoreProduct.objects.get(sku="mask")
+		self.assertEqual((mask.supplier, mask.name, mask.price), (rival, "Rival mask", Decimal("5.00")))
+		self.assertFalse(InventoryMovement.objects.exists())
+
+	def test_users_without_a_supplier_profile_are_refused(self):
+		self.client.force_authenticate(DonorProfile.objects.create_user(email="buyer@example.com", password="not-used-1"))
+		self.assertEqual(self.sync([{"sku": "gloves", "price": "3.00"}]).status_code, 404)
+		self.assertEqual(MedicalStoreProduct.objects.get(sku="gloves").price, Decimal("2.50"))
+
+
+class CatalogImportTests(TestCase):
+	def setUp(self):
+		media_root = tempfile.TemporaryDirectory()
+		self.addCleanup(media_root.cleanup)
+		media_settings = override_settings(MEDIA_ROOT=media_root.name)
+		media_settings.enable()
+		self.addCleanup(media_settings.disable)
+		self.product = make_product(10)
+		self.client = APIClient()
+		self.client.force_authenticate(self.product.supplier.user)
+
+	def upload(self, name, content):
+		response = self.client.post(
+			"/api/catalog-imports/", {"product_type": "STORE", "file": SimpleUploadedFile(name, content)}, format="multipart",
+		)
+		self.assertEqual(response.status_code, 202, response.data)
+		call_command("run_catalog_imports", "--chunk-size", "2", stdout=StringIO())
+		return self.client.get(f"/api/catalog-imports/{response.data['id']}/").data
+
+	def test_csv_import_is_written_in_chunks(self):
+		job = self.upload("catalog.csv", (
+			"sku,name,price,quantity_available\n"
+			"gloves,,2.50,12\n"
+			"mask,Mask,1.00,100\n"
+			"gown,Gown,lots,1\n"
+			"mask,Mask,1.20,100\n"
+		).encode())
+		self.assertEqual(job["status"], "COMPLETED", job)
+		self.assertEqual(
+			(job["processed_rows"], job["created_count"], job["updated_count"], job["duplicate_count"], job["error_count"]),
+			(4, 1, 2, 0, 1),
+		)
+		self.assertEqual(job["errors"], [{"row": 3, "sku": "gown", "errors": {"price": "A valid number is required."}}])
+		self.assertEqual(MedicalStoreProduct.objects.get(sku="mask").price, Decimal("1.20"))
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.quantity_available, 12)
+
+	def test_unexpected_error_fails_the_job(self):
+		with mock.patch("core.catalog.upsert_rows", side_effect=RuntimeError("bug")), self.assertLogs("core.catalog", "ERROR"):
+			job = self.upload("catalog.ndjson", b'{"sku": "mask", "name": "Mask", "price": "1"}\n')
+		self.assertEqual(job["status"], "FAILED")
+		self.assertIn("RuntimeError", job["detail"])
+
+
+class FullTextIndexTests(TestCase):
+	def setUp(self):
+		table, columns, _ = fulltext.FULLTEXT_INDEXES["STORE"]
+		with connection.cursor() as cursor:
+			fulltext.drop_sqlite_index(cursor, table)
+			fulltext.create_sqlite_index(cursor, table, columns)
+		self.gloves = make_product(1)
+		self.mask = MedicalStoreProduct.objects.create(
+			supplier=self.gloves.supplier, name="Mask", sku="mask", price=Decimal("1"), description="Wear with gloves",
+		)
+
+	def tearDown(self):
+		fulltext._ready_fts_tables.clear()
+
+	def search(self, query):
+		return [product.sku for product in fulltext.fulltext_search(MedicalStoreProduct.objects.all(), "STORE", query)]
+
+	def test_name_matches_rank_first_and_prefixes_match(self):
+		self.assertEqual(self.search("glov"), ["gloves", "mask"])
+		self.assertEqual(self.search("with glo"), ["mask"])
+		self.assertEqual(self.search("*) OR ("), [])
+
+	def test_dropped_trigger_is_reported_and_rebuilt(self):
+		with connection.cursor() as cursor:
+			cursor.execute("DROP TRIGGER core_medicalstoreproduct_fts_au")
+		self.assertEqual([error.id for error in fulltext.check_fulltext_triggers(databases=["default"])], ["core.E001"])
+		with self.assertRaises(CommandError):
+			call_command("rebuild_fulltext_index", "--check", stdout=StringIO())
+
+		call_command("rebuild_fulltext_index", stdout=StringIO())
+		self.assertEqual(fulltext.check_fulltext_triggers(databases=["default"]), [])
+		MedicalStoreProduct.objects.filter(pk=self.mask.pk).update(name="Bandage")
+		self.assertEqual(self.search("bandage"), ["mask"])
+
+
+@override_settings(THROTTLE_BUCKETS={})
+class SearchTests(TestCase):
+	def setUp(self):
+		table, columns, _ = fulltext.FULLTEXT_INDEXES["SEARCH"]
+		with connection.cursor() as cursor:
+			fulltext.drop_sqlite_index(cursor, table)
+			fulltext.create_sqlite_index(cursor, table, columns)
+		city_resolver.clear()
+		self.hospital = Hospital.objects.create(name="Sunrise Heart Hospital", city="Pune")
+		Hospital.objects.create(name="Lakeside Hospital", city="Mumbai", address="Near Sunrise towers")
+		self.gloves = make_product(1)
+
+	def tearDown(self):
+		fulltext._ready_fts_tables.clear()
+
+	def search(self, **params):
+		return APIClient().get("/api/search/", params)
+
+	def test_hits_are_ranked_across_types_with_facets(self):
+		MedicalStoreProduct.objects.create(supplier=self.gloves.supplier, name="Sunrise gloves", sku="sunrise", price=Decimal("1"))
+		response = self.search(q="sunrise")
+		self.assertEqual(response.status_code, 200, response.data)
+		self.assertEqual(response.data["facets"], {"HOSPITAL": 2, "STORE": 1})
+		self.assertEqual(response.data["count"], 3)
+		self.assertEqual(response.data["results"][-1]["title"], "Lakeside Hospital")
+
+		response = self.search(q="sunrise", type="hospital", city="Pune")
+		self.assertEqual(response.data["facets"], {"HOSPITAL": 1, "STORE": 1})
+		self.assertEqual([(hit["type"], hit["id"]) for hit in response.data["results"]], [("HOSPITAL", self.hospital.pk)])
+
+	def test_documents_follow_their_records(self):
+		self.assertEqual(self.search(q="gloves").data["facets"], {"STORE": 1})
+		self.gloves.is_active = False
+		self.gloves.save()
+		self.assertEqual(self.search(q="gloves").data["count"], 0)
+
+		self.hospital.delete()
+		self.assertEqual(self.search(q="heart").data["results"], [])
+
+	def test_bad_parameters_are_rejected(self):
+		self.assertEqual(self.search(q="s").status_code, 400)
+		self.assertEqual(self.search(q="sunrise", type="PATIENT").status_code, 400)
+		self.assertEqual(self.search(q="sunrise", limit="ten").status_code, 400)
+
+
+class StockAlertTests(TestCase):
+	def open_alerts(self):
+		return set(StockAlert.objects.filter(is_resolved=False).values_list("store_product__sku", "alert_type"))
+
+	def test_scan_raises_alerts_once_and_resolves_them(self):
+		today = timezone.localdate()
+		gloves = make_product(3)
+		MedicalStoreProduct.objects.create(
+			supplier=gloves.supplier, name="Saline", sku="saline", price=Decimal("1"), quantity_available=50,
+			expiry_date=today + timedelta(days=5),
+		)
+		self.assertEqual(scan_stock_alerts(30, chunk_size=1), (2, 0))
+		self.assertEqual(scan_stock_alerts(30, chunk_size=1), (2, 0))
+		self.assertEqual(self.open_alerts(), {("gloves", "LOW_STOCK"), ("saline", "EXPIRING")})
+
+		MedicalStoreProduct.objects.filter(pk=gloves.pk).update(quantity_available=40)
+		self.assertEqual(scan_stock_alerts(30, today=today + timedelta(days=6)), (1, 2))
+		self.assertEqual(self.open_alerts(), {("saline", "EXPIRED")})
+
+
+class TokenDenyListTests(TestCase):
+	def test_cutoff_is_not_truncated_to_the_second(self):
+		deny_list = TokenDenyList(refresh_seconds=3600)
+		deny_list._loaded_at = float("inf")
+		valid_after = timezone.now().replace(microsecond=500000)
+		deny_list.deny(1, valid_after)
+		second = int(valid_after.timestamp())
+		self.assertTrue(deny_list.is_denied(1, second - 1))
+		self.assertTrue(deny_list.is_denied(1, second))
+		self.assertFalse(deny_list.is_denied(1, second + 1))
+		self.assertFalse(deny_list.is_denied(2, second))
+
+	def test_login_right_after_revocation_is_accepted(self):
+		token_deny_list.clear()
+		user = DonorProfile.objects.create_user(email="donor@example.com", password="not-used-1", donor_module="donor")
+		old = CustomTokenObtainPairSerializer.get_token(user)
+		with self.captureOnCommitCallbacks(execute=True):
+			revoke_user_tokens(user)
+		new = CustomTokenObtainPairSerializer.get_token(user)
+		with self.assertRaises(AuthenticationFailed):
+			check_token_not_revoked(old.access_token)
+		check_token_not_revoked(new)
+		check_token_not_revoked(new.access_token)
+
+
+class StatelessJWTTests(TestCase):
+	def setUp(self):
+		token_deny_list.clear()
+		self.user = DonorProfile.objects.create_user(email="donor@example.com", password="not-used-1", donor_module="donor")
+
+	def authenticate(self, token):
+		request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+		return StatelessJWTAuthentication().authenticate(request)[0]
+
+	def test_user_comes_from_the_claims(self):
+		token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+		self.authenticate(token)
+		with self.assertNumQueries(0):
+			user = self.authenticate(token)
+			self.assertEqual((user.pk, user.donor_module, user.is_staff), (self.user.pk, "donor", False))
+		with self.assertNumQueries(1):
+			self.assertEqual(user.email, "donor@example.com")
+
+	def test_token_without_claims_loads_the_user(self):
+		token = AccessToken.for_user(self.user)
+		self.authenticate(token)
+		with self.assertNumQueries(1):
+			self.assertEqual(self.authenticate(token).email, "donor@example.com")
+
+	def test_changing_a_claimed_field_revokes_tokens(self):
+		token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+		self.user.is_staff = True
+		with self.captureOnCommitCallbacks(execute=True):
+			self.user.save()
+		with self.assertRaises(AuthenticationFailed):
+			self.authenticate(token)
+
+
+class LogoutTests(TestCase):
+	def setUp(self):
+		revocation_list.clear()
+		self.user = DonorProfile.objects.create_user(email="donor@example.com", password="not-used-1", donor_module="donor")
+
+	def test_logout_revokes_only_its_own_tokens(self):
+		refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+		other = CustomTokenObtainPairSerializer.get_token(self.user)
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+		self.assertEqual(client.get("/api/donors/dashboard/").status_code, 200)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.assertEqual(client.post("/api/auth/logout/", {"refresh": str(refresh)}, format="json").status_code, 200)
+
+		self.assertEqual(client.get("/api/donors/dashboard/").status_code, 401)
+		response = APIClient().post("/api/auth/token/refresh/", {"refresh": str(refresh)}, format="json")
+		self.assertEqual(response.status_code, 401)
+		client.credentials(HTTP_AUTHORIZATION=f"Bearer {other.access_token}")
+		self.assertEqual(client.get("/api/donors/dashboard/").status_code, 200)
+
+	def test_revocations_survive_a_rebuild(self):
+		token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+		with self.captureOnCommitCallbacks(execute=True):
+			revoke_tokens([token], reason="logout")
+		revocation_list.clear()
+		with self.assertRaises(AuthenticationFailed):
+			check_token_not_revoked(token)
+
+
+class CityResolutionTests(TestCase):
+	def setUp(self):
+		city_resolver.clear()
+
+	def test_unknown_city_stays_unresolved_until_added(self):
+		alert = AccidentAlert.objects.create(title="Collision", location="Ring road", city="Bengalruu")
+		self.assertIsNone(alert.city_ref_id)
+		self.assertFalse(City.objects.filter(key="bengalruu").exists())
+
+		city, _ = City.objects.get_or_create(key="bengaluru", defaults={"name": "Bengaluru"})
+		CityAlias.objects.create(city=city, name="Bengalruu", key="bengalruu")
+		call_command("link_city_refs", stdout=StringIO())
+		alert.refresh_from_db()
+		self.assertEqual(alert.city_ref_id, city.pk)
+
+	def test_change_in_another_process_empties_the_map(self):
+		city = City.objects.create(key="pune", name="Pune")
+		other_process = CityResolver(ttl=3600)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.assertEqual(other_process.resolve("Pune"), city.pk)
+		with self.assertNumQueries(0):
+			self.assertEqual(other_process.resolve("pune city"), city.pk)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			city.delete()
+		self.assertIsNone(other_process.resolve("Pune"))
+		alert = AccidentAlert.objects.create(title="Collision", location="Ring road", city="Pune")
+		self.assertIsNone(alert.city_ref_id)
+
+	def test_backfill_links_seeded_names_only(self):
+		typo = AccidentAlert.objects.create(title="Collision", location="Ring road", city="Bengalruu")
+		former = AccidentAlert.objects.create(title="Fall", location="Station", city="Bombay")
+		backfill_cities(django_apps, None)
+
+		typo.refresh_from_db()
+		former.refresh_from_db()
+		self.assertIsNone(typo.city_ref_id)
+		self.assertFalse(City.objects.filter(key="bengalruu").exists())
+		self.assertEqual(former.city_ref.name, "Mumbai")
+
+
+class ReservationCheckoutTests(TestCase):
+	def setUp(self):
+		self.product = make_product(5)
+		self.client = APIClient()
+		self.client.force_authenticate(self.product.supplier.user)
+
+	def checkout(self, reservation_ids):
+		return self.client.post("/api/medical-orders/checkout/", {"reservation_ids": reservation_ids, **SHIPPING}, format="json")
+
+	def test_malformed_reservation_ids_are_rejected(self):
+		for reservation_ids in (["abc"], [None], [{"id": 1}]):
+			response = self.checkout(reservation_ids)
+			self.assertEqual(response.status_code, 400, response.data)
+
+	def test_reservation_id_may_be_given_as_text(self):
+		reservation, = reserve_stock(self.product.supplier.user, {("STORE", self.product.pk): 2})
+		response = self.checkout([str(reservation.pk), reservation.pk])
+		self.assertEqual(response.status_code, 201, response.data)
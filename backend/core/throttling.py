@@ -0,0 +1,159 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+# Load-shedding priorities; lower numbers are shed last
+CRITICAL = 0
+NORMAL = 1
+LOW = 2
+
+
+def shed_priority(priority):
+	"""Mark a view method (or set ``shed_priority`` on an APIView) for LoadShedder"""
+	def decorator(view):
+		view.shed_priority = priority
+		return view
+	return decorator
+
+
+def _take(state, now, rate, burst):
+	# Returns (new state, seconds until a token is free or 0 when one was taken)
+	tokens, updated = state if state is not None else (burst, now)
+	tokens = min(burst, tokens + (now - updated) * rate)
+	if tokens >= 1:
+		return (tokens - 1, now), 0
+	return (tokens, now), (1 - tokens) / rate
+
+
+class LocalBucketStore:
+	"""Token buckets in this process, the least recently used dropped beyond ``max_keys``"""
+
+	def __init__(self, max_keys):
+		self.max_keys = max_keys
+		self._lock = threading.Lock()
+		self._buckets = OrderedDict()
+
+	def take(self, key, rate, burst):
+		now = time.monotonic()
+		with self._lock:
+			state, wait = _take(self._buckets.get(key), now, rate, burst)
+			self._buckets[key] = state
+			self._buckets.move_to_end(key)
+			while len(self._buckets) > self.max_keys:
+				self._buckets.popitem(last=False)
+		return wait
+
+
+class CacheBucketStore:
+	"""
+	Token buckets in the Django cache, shared by every worker using it.
+
+	Read-modify-write without a lock, so concurrent requests from one client may
+	overshoot the burst slightly; in exchange a check costs one get and one set.
+	"""
+
+	def take(self, key, rate, burst):
+		now = time.time()
+		cache_key = f"throttle:{key}"
+		state, wait = _take(cache.get(cache_key), now, rate, burst)
+		cache.set(cache_key, state, math.ceil(burst / rate) + 1)
+		return wait
+
+
+def _bucket_store():
+	if settings.THROTTLE_STORE == "cache":
+		return CacheBucketStore()
+	return LocalBucketStore(settings.THROTTLE_LOCAL_MAX_KEYS)
+
+
+bucket_store = _bucket_store()
+
+
+class BucketThrottle(BaseThrottle):
+	"""
+	Token buckets for the view's ``throttle_scope``, configured in THROTTLE_BUCKETS as
+	{scope: {"client": (requests per minute, burst), "route": (...)}}. Views without
+	a scope are not throttled.
+
+	The client bucket is per client IP, honouring NUM_PROXIES like DRF's own
+	throttles. The route bucket is shared by all clients of one view action and
+	bounds the load it can put on the database. A route token is only taken once the
+	client bucket has admitted the request, so one client being refused cannot drain
+	the route for everyone else.
+	"""
+
+	def allow_request(self, request, view):
+		scope = getattr(view, "throttle_scope", None)
+		limits = settings.THROTTLE_BUCKETS.get(scope, {})
+		self.retry_after = 0
+		for kind, key in (("client", self.get_ident(request)), ("route", self.route_key(view))):
+			if kind not in limits:
+				continue
+			per_minute, burst = limits[kind]
+			self.retry_after = bucket_store.take(f"{scope}:{kind}:{key}", per_minute / 60, burst)
+			if self.retry_after:
+				return False
+		return True
+
+	def route_key(self, view):
+		# Actions sharing a scope still get a route bucket each
+		return f"{type(view).__name__}.{getattr(view, 'action', None) or ''}"
+
+	def wait(self):
+		return self.retry_after
+
+
+BUCKET_THROTTLES = [BucketThrottle]
+
+
+class LoadShedder:
+	"""
+	Priority-aware admission control for this process.
+
+	Pressure is the number of requests in flight over ``max_in_flight``. LOW requests
+	are refused from half pressure, NORMAL ones from full pressure, and CRITICAL ones
+	are always admitted. Concurrency rather than latency is the signal, so a slow but
+	legitimate request such as a bulk catalog sync does not shed anyone after it ends.
+	"""
+	thresholds = {LOW: 0.5, NORMAL: 1.0}
+
+	def __init__(self, max_in_flight):
+		self.max_in_flight = max_in_flight
+		self._lock = threading.Lock()
+		self._in_flight = 0
+
+	def pressure(self):
+		return self._in_flight / self.max_in_flight
+
+	def admit(self, priority):
+		threshold = self.thresholds.get(priority)
+		return threshold is None or self.pressure() < threshold
+
+	def started(self):
+		with self._lock:
+			self._in_flight += 1
+
+	def finished(self):
+		with self._lock:
+			self._in_flight -= 1
+
+
+load_shedder = LoadShedder(settings.LOAD_SHED_MAX_IN_FLIGHT)
+
+
+def view_priority(view_func, method):
+	"""The shed_priority of the view method or APIView class ``method`` runs, NORMAL by default"""
+	# DRF views expose their class as ``cls``, Django class-based views as ``view_class``
+	cls = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+	if cls is None:
+		return getattr(view_func, "shed_priority", NORMAL)
+	# ViewSets map HTTP methods to actions, APIViews to methods of the same name
+	actions = getattr(view_func, "actions", None) or {}
+	handler = getattr(cls, actions.get(method.lower(), method.lower()), None)
+	return getattr(handler, "shed_priority", getattr(cls, "shed_priority", NORMAL))
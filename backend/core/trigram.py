@@ -0,0 +1,316 @@
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+
+from .models import Doctor, Hospital
+
+
+logger = logging.getLogger(__name__)
+
+# kind -> (model, fields matched). Cities are the distinct Hospital.city values.
+FUZZY_KINDS = {
+	"hospital": (Hospital, ["name"]),
+	"doctor": (Doctor, ["name", "specialization"]),
+	"city": (Hospital, ["city"]),
+}
+
+# Fields with an in-process index, patched on save and delete
+INDEXED_FIELDS = {
+	Hospital: ["name", "city"],
+	Doctor: ["name", "specialization"],
+}
+
+# Same default cut-off as pg_trgm's word_similarity_threshold
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+# Candidates scored exactly per search. A query made only of very common words
+# ("hospital") matches nearly every row; those are trimmed to the ones sharing
+# most of the rare trigrams.
+MAX_CANDIDATES = 2000
+
+
+def normalize(text):
+	text = unicodedata.normalize("NFKD", text or "")
+	return "".join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def trigrams(text):
+	"""Trigrams the way pg_trgm builds them: per word, padded with two spaces in front and one behind"""
+	grams = set()
+	for word in re.findall(r"\w+", normalize(text)):
+		padded = f"  {word} "
+		grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+	return frozenset(grams)
+
+
+class TrigramIndex:
+	"""
+	In-process inverted index from trigram to document keys, used where pg_trgm is
+	not available.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._postings = defaultdict(set)
+		self._documents = {}
+
+	def __len__(self):
+		return len(self._documents)
+
+	def add(self, key, text):
+		with self._lock:
+			self._discard(key)
+			grams = trigrams(text)
+			if not grams:
+				return
+			self._documents[key] = (text, grams)
+			for gram in grams:
+				self._postings[gram].add(key)
+
+	def remove(self, key):
+		with self._lock:
+			self._discard(key)
+
+	def _discard(self, key):
+		document = self._documents.pop(key, None)
+		if document is None:
+			return
+		for gram in document[1]:
+			keys = self._postings.get(gram)
+			if keys is not None:
+				keys.discard(key)
+				if not keys:
+					del self._postings[gram]
+
+	def search(self, query, limit=10, threshold=WORD_SIMILARITY_THRESHOLD):
+		"""
+		Return [(key, text, score)] best first. The score is the share of the query's
+		trigrams found in the text (close to pg_trgm's word_similarity), with the
+		whole-text similarity breaking ties in favour of shorter texts.
+		"""
+		query_grams = trigrams(query)
+		if not query_grams:
+			return []
+		# A match must share at least ``needed`` trigrams, so it has to appear in one
+		# of the rarest (len - needed + 1) posting lists; the long lists for common
+		# trigrams such as "hos" are only probed for those candidates
+		needed = max(1, math.ceil(threshold * len(query_grams)))
+		with self._lock:
+			lists = sorted((self._postings.get(gram, ()) for gram in query_grams), key=len)
+			prefix = len(lists) - needed + 1
+			counts = Counter()
+			for keys in lists[:prefix]:
+				counts.update(keys)
+			rest = lists[prefix:]
+			candidates = counts.most_common(MAX_CANDIDATES) if len(counts) > MAX_CANDIDATES else counts.items()
+			scored = []
+			for key, shared in candidates:
+				for keys in rest:
+					if key in keys:
+						shared += 1
+				if shared < needed:
+					continue
+				text, grams = self._documents[key]
+				similarity = shared / (len(query_grams) + len(grams) - shared)
+				scored.append((shared / len(query_grams), similarity, key, text))
+		best = heapq.nlargest(limit, scored, key=lambda row: (row[0], row[1]))
+		return [(key, text, score) for score, _, key, text in best]
+
+
+class RefreshedIndexes:
+	"""
+	In-process indexes by key, built on first use and rebuilt once ``ttl_seconds()`` old.
+
+	Reads take no lock: an expired index keeps being served while a background thread,
+	one per key at most, builds its replacement. Only a key's first build is waited
+	for, as there is nothing to serve before it.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._indexes = {}
+		self._refreshing = set()
+
+	def ttl_seconds(self):
+		raise NotImplementedError
+
+	def build(self, key):
+		raise NotImplementedError
+
+	def _get(self, key):
+		entry = self._indexes.get(key)
+		if entry is None:
+			with self._lock:
+				entry = self._indexes.get(key)
+				if entry is None:
+					entry = self._store(key, self.build(key))
+		elif entry[1] <= time.monotonic() and key not in self._refreshing:
+			self._refresh_later(key)
+		return entry[0]
+
+	def _store(self, key, index):
+		entry = (index, time.monotonic() + self.ttl_seconds())
+		self._indexes[key] = entry
+		return entry
+
+	def _refresh_later(self, key):
+		with self._lock:
+			if key in self._refreshing:
+				return
+			self._refreshing.add(key)
+		threading.Thread(target=self._refresh, args=(key,), name="index-refresh", daemon=True).start()
+
+	def _refresh(self, key):
+		try:
+			self._store(key, self.build(key))
+		except Exception:
+			logger.exception("Rebuilding the %s index failed; the old one is served until the next try", key)
+		finally:
+			with self._lock:
+				self._refreshing.discard(key)
+			connection.close()
+
+	def _built(self, key):
+		entry = self._indexes.get(key)
+		return entry[0] if entry else None
+
+	def clear(self):
+		with self._lock:
+			self._indexes.clear()
+
+
+class FieldIndexes(RefreshedIndexes):
+	"""Per-field indexes, rebuilt after TRIGRAM_INDEX_TTL_SECONDS and patched on local writes"""
+
+	def ttl_seconds(self):
+		return settings.TRIGRAM_INDEX_TTL_SECONDS
+
+	def get(self, model, field):
+		return self._get((model, field))
+
+	def build(self, key):
+		model, field = key
+		index = TrigramIndex()
+		if model is Hospital and field == "city":
+			# Cities are keyed by their text so each one is listed once
+			for city in model.objects.values_list("city", flat=True).distinct().iterator():
+				index.add(city.strip().lower(), city.strip())
+		else:
+			for pk, value in model.objects.values_list("pk", field).iterator():
+				index.add(pk, value)
+		return index
+
+	def built(self, model, field):
+		return self._built((model, field))
+
+
+field_indexes = FieldIndexes()
+
+
+def _index_instance(sender, instance, **kwargs):
+	pk = instance.pk
+	values = {field: getattr(instance, field) for field in INDEXED_FIELDS[sender]}
+	# Once committed, so a rolled-back save leaves no match behind
+	transaction.on_commit(lambda: _index_values(sender, pk, values))
+
+
+def _index_values(sender, pk, values):
+	for field, value in values.items():
+		index = field_indexes.built(sender, field)
+		if index is None:
+			continue
+		if sender is Hospital and field == "city":
+			# A city that no longer has hospitals drops out at the next rebuild
+			if value:
+				index.add(value.strip().lower(), value.strip())
+		else:
+			index.add(pk, value)
+
+
+def _unindex_instance(sender, instance, **kwargs):
+	pk = instance.pk
+	transaction.on_commit(lambda: _unindex_pk(sender, pk))
+
+
+def _unindex_pk(sender, pk):
+	for field in INDEXED_FIELDS[sender]:
+		index = field_indexes.built(sender, field)
+		if index is not None and not (sender is Hospital and field == "city"):
+			index.remove(pk)
+
+
+def connect_signals():
+	for model in INDEXED_FIELDS:
+		post_save.connect(_index_instance, sender=model, dispatch_uid=f"trigram_index_{model.__name__}")
+		post_delete.connect(_unindex_instance, sender=model, dispatch_uid=f"trigram_unindex_{model.__name__}")
+
+
+def _postgres_search(kind, query, limit):
+	model, fields = FUZZY_KINDS[kind]
+	table = model._meta.db_table
+	if kind == "city":
+		with connection.cursor() as cursor:
+			cursor.execute(
+				f"SELECT city, max(word_similarity(%s, city)) AS score FROM {table} "
+				f"WHERE %s <%% city GROUP BY city ORDER BY score DESC, length(city) LIMIT %s",
+				[query, query, limit],
+			)
+			return [(city.strip().lower(), city, score) for city, score in cursor.fetchall()]
+	word_similarity = ", ".join(f"word_similarity(%s, {table}.{field})" for field in fields)
+	similarity = ", ".join(f"similarity(%s, {table}.{field})" for field in fields)
+	matches = model.objects.extra(
+		select={"fuzzy_score": f"GREATEST({word_similarity})", "fuzzy_similarity": f"GREATEST({similarity})"},
+		select_params=[query] * len(fields) * 2,
+		where=[" OR ".join(f"%s <%% {table}.{field}" for field in fields)],
+		params=[query] * len(fields),
+	).order_by("-fuzzy_score", "-fuzzy_similarity")[:limit]
+	return [(match.pk, match, match.fuzzy_score) for match in matches]
+
+
+def fuzzy_search(kind, query, limit=10):
+	"""
+	Typo-tolerant matches for ``kind`` ("hospital", "doctor" or "city"), best first.
+
+	Returns [(key, object_or_city_name, score)]. Uses pg_trgm on Postgres and the
+	in-process trigram indexes elsewhere.
+	"""
+	if connection.vendor == "postgresql":
+		return _postgres_search(kind, query, limit)
+
+	model, fields = FUZZY_KINDS[kind]
+	if kind == "city":
+		return field_indexes.get(model, "city").search(query, limit=limit)
+	scores = {}
+	for field in fields:
+		for pk, _, score in field_indexes.get(model, field).search(query, limit=limit * 2):
+			scores[pk] = max(score, scores.get(pk, 0))
+	best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+	objects = model.objects.in_bulk([pk for pk, _ in best])
+	return [(pk, objects[pk], score) for pk, score in best if pk in objects]
+
+
+def fuzzy_city_filter(queryset, field, city, limit=3):
+	"""
+	Filter ``queryset`` on ``field`` containing ``city``; when nothing matches, fall
+	back to the closest known city names so a misspelt city still finds results.
+	"""
+	matches = queryset.filter(**{f"{field}__icontains": city})
+	if matches.exists():
+		return matches
+	names = [name for _, name, _ in fuzzy_search("city", city, limit=limit)]
+	if not names:
+		return matches
+	condition = Q()
+	for name in names:
+		condition |= Q(**{f"{field}__iexact": name})
+	return queryset.filter(condition)
@@ -1,14 +1,23 @@
-from django.db.models import Q
-from rest_framework import viewsets, permissions, status
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 # from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
-from .models import DonorProfile, EmergencyNeed, OrganDonor, MarketplaceItem, Hospital, Doctor, Review, DonationRequest, HospitalNeed, Appointment, DeceasedDonorRequest, AccidentAlert, BloodDonationEvent, MedicalEssential, MedicalStoreProduct, MedicalEquipment, MedicalOrder, MedicalOrderItem
+from .models import DonorProfile, EmergencyNeed, OrganDonor, MarketplaceItem, Hospital, Doctor, Review, DonationRequest, HospitalNeed, Appointment, DeceasedDonorRequest, AccidentAlert, BloodDonationEvent, MedicalEssential, MedicalStoreProduct, MedicalEquipment, MedicalOrder, MedicalOrderItem, StockReservation, InventoryMovement, StockAlert, CatalogImportJob
 from .serializers import (
 	DonorProfileSerializer,
 	EmergencyNeedSerializer,
@@ -24,26 +33,38 @@ from .serializers import (
 	AccidentAlertSerializer,
 	BloodDonationEventSerializer,
 	CustomTokenObtainPairSerializer,
+	CustomTokenRefreshSerializer,
+	CheckoutSerializer,
 	MedicalEssentialSerializer,
 	MedicalStoreProductSerializer,
 	MedicalEquipmentSerializer,
 	MedicalOrderSerializer,
 	MedicalOrderItemSerializer,
+	StockReservationSerializer,
+	InventoryMovementSerializer,
+	StockAlertSerializer,
+	CatalogImportJobSerializer,
 )
-
-
-ALL_BLOOD_GROUPS = {"O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"}
-
-BLOOD_COMPATIBILITY = {
-	"O-": list(ALL_BLOOD_GROUPS),
-	"O+": ["O+", "A+", "B+", "AB+"],
-	"A-": ["A-", "A+", "AB-", "AB+"],
-	"A+": ["A+", "AB+"],
-	"B-": ["B-", "B+", "AB-", "AB+"],
-	"B+": ["B+", "AB+"],
-	"AB-": ["AB-", "AB+"],
-	"AB+": ["AB+"],
-}
+from .analytics import default_report_window, record_cancelled_sales, supplier_sales_report
+from .authentication import forget_api_key
+from .catalog import iter_csv_rows, iter_json_rows, iter_ndjson_rows, upsert_rows
+from .fulltext import fulltext_search
+from .idempotency import idempotent
+from .jobs import enqueue
+from .inventory import PRODUCT_FIELDS, build_movements, fold_pending_movements, record_adjustment, record_order_cancellation
+from .orders import OrderError, parse_order_lines, place_orders
+from .metrics import METRICS_CACHE_KEY, metrics_overview
+from .order_numbers import allocator as order_number_allocator
+from .passwords import hash_password
+from .reservations import reserve_stock, claim_reservations, attach_orders, release_reservations
+from .revocation import revoke_tokens
+from .autocomplete import AUTOCOMPLETE_KINDS, autocomplete
+from .blood import ALL_BLOOD_GROUPS, BLOOD_COMPATIBILITY
+from .cities import city_filter
+from .search import SEARCH_SOURCES, search_documents
+from .throttling import BUCKET_THROTTLES, CRITICAL, LOW, shed_priority
+from .facets import FACETS, cached_facets, filter_price_band
+from .trigram import FUZZY_KINDS, fuzzy_search
 
 
 class MetricsOverviewView(APIView):
@@ -53,37 +74,12 @@ class MetricsOverviewView(APIView):
     instead of hard-coded placeholders.
     """
     permission_classes = [AllowAny]
+    throttle_classes = BUCKET_THROTTLES
+    throttle_scope = "metrics"
+    shed_priority = LOW
 
     def get(self, request):
-        donors_count = DonorProfile.objects.count()
-
-        needs_served = EmergencyNeed.objects.filter(status="FULFILLED").count() + \
-            HospitalNeed.objects.filter(status__in=["FULFILLED", "COMPLETED"]).count()
-
-        hospitals_count = Hospital.objects.count()
-
-        items_listed = (
-            MarketplaceItem.objects.count()
-            + MedicalStoreProduct.objects.count()
-            + MedicalEquipment.objects.count()
-        )
-
-        module_breakdown = {
-            "donor": donors_count + DonationRequest.objects.count(),
-            "hospital": hospitals_count + HospitalNeed.objects.count() + Appointment.objects.count(),
-            "organ": OrganDonor.objects.count() + DeceasedDonorRequest.objects.count() + AccidentAlert.objects.count(),
-            "marketplace": items_listed + MedicalOrder.objects.count(),
-        }
-
-        return Response(
-            {
-                "donors": donors_count,
-                "needs_served": needs_served,
-                "hospitals": hospitals_count,
-                "items_listed": items_listed,
-                "module_breakdown": module_breakdown,
-            }
-        )
+        return Response(cache.get_or_set(METRICS_CACHE_KEY, metrics_overview, settings.METRICS_CACHE_SECONDS))
 
 
 class RegisterUserView(APIView):
@@ -119,23 +115,19 @@ class RegisterUserView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # ---- Create User ----
-        user = DonorProfile.objects.create_user(
-            email=data["email"],
-            password=data["password"],
-            is_active=True
+        # ---- Create User (password hashed on the hashing pool, one INSERT) ----
+        user = DonorProfile.objects.create(
+            email=DonorProfile.objects.normalize_email(data["email"]),
+            password=hash_password(data["password"]),
+            is_active=True,
+            first_name=data["first_name"],
+            last_name=data["last_name"],
+            blood_group=data["blood_group"],
+            gender=data["gender"],
+            phone=data["phone"],
+            donor_module=data["donor_module"],
         )
 
-        # ---- Update profile fields ----
-        user.first_name = data["first_name"]
-        user.last_name = data["last_name"]
-        user.blood_group = data["blood_group"]
-        user.gender = data["gender"]
-        user.phone = data["phone"]
-        user.donor_module = data["donor_module"]
-
-        user.save()
-
         return Response(
             {
                 "message": "Donor registered successfully.",
@@ -153,6 +145,26 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+class CustomTokenRefreshView(TokenRefreshView):
+	serializer_class = CustomTokenRefreshSerializer
+
+
+class LogoutView(APIView):
+	"""Revoke the posted refresh token and the access token the request was made with"""
+	permission_classes = [AllowAny]
+
+	def post(self, request):
+		try:
+			refresh = RefreshToken(request.data.get("refresh", ""))
+		except TokenError as exc:
+			return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+		tokens = [refresh]
+		if isinstance(request.auth, Token):
+			tokens.append(request.auth)
+		revoke_tokens(tokens, reason="logout")
+		return Response({"message": "Logged out."})
+
+
 class DonorProfileViewSet(viewsets.ModelViewSet):
 	queryset = DonorProfile.objects.all()
 	serializer_class = DonorProfileSerializer
@@ -164,11 +176,8 @@ class DonorProfileViewSet(viewsets.ModelViewSet):
 		return groups, is_universal
 
 	def _get_or_none(self, user):
-		print('user',user)
-		try:
-			return DonorProfile.objects.get(email=user)
-		except DonorProfile.DoesNotExist:
-			return None
+		# The user model is the donor profile, already loaded by authentication
+		return user if user.is_authenticated else None
 
 	@action(detail=False, methods=["get", "put", "patch"], permission_classes=[permissions.IsAuthenticated])
 	def me(self, request):
@@ -256,8 +265,11 @@ class EmergencyNeedViewSet(viewsets.ModelViewSet):
 	queryset = EmergencyNeed.objects.select_related("created_by").all().order_by("-created_at")
 	serializer_class = EmergencyNeedSerializer
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+	throttle_scope = None
 
-	@action(detail=False, methods=["post"], permission_classes=[permissions.AllowAny])
+	@action(detail=False, methods=["post"], permission_classes=[permissions.AllowAny], throttle_classes=BUCKET_THROTTLES, throttle_scope="emergency")
+	@shed_priority(CRITICAL)
+	@idempotent("critical_emergency")
 	def critical_emergency(self, request):
 		"""Create a critical emergency need (blood, platelets, hospitalization) - allows anonymous"""
 		from django.contrib.auth import get_user_model
@@ -265,8 +277,8 @@ class EmergencyNeedViewSet(viewsets.ModelViewSet):
 		
 		# Get or create an anonymous user for emergency needs
 		anonymous_user, _ = User.objects.get_or_create(
-			username="emergency_anonymous",
-			defaults={"email": "emergency@lifesaver.local", "is_active": False}
+			email="emergency@lifesaver.local",
+			defaults={"is_active": False}
 		)
 		
 		data = request.data.copy()
@@ -280,7 +292,10 @@ class EmergencyNeedViewSet(viewsets.ModelViewSet):
 		
 		serializer = self.get_serializer(data=data)
 		serializer.is_valid(raise_exception=True)
-		emergency_need = serializer.save()
+		with transaction.atomic():
+			emergency_need = serializer.save()
+			# Notifying is left to a worker; the job commits with the need
+			enqueue("notify_emergency_need", need_id=emergency_need.pk)
 		
 		# Find nearby hospitals/blood banks
 		nearby_hospitals = []
@@ -319,7 +334,7 @@ class EmergencyNeedViewSet(viewsets.ModelViewSet):
 		
 		# If no location-based hospitals, try by city
 		if not nearby_hospitals and city:
-			hospitals = Hospital.objects.filter(city__icontains=city)[:5]
+			hospitals = city_filter(Hospital.objects.all(), city)[:5]
 			nearby_hospitals = [
 				{
 					"id": h.id,
@@ -348,12 +363,9 @@ class OrganDonorViewSet(viewsets.ModelViewSet):
 	@action(detail=False, methods=["get", "put", "patch"], permission_classes=[permissions.IsAuthenticated])
 	def me(self, request):
 		"""Get or update organ donor profile for logged-in user"""
-		try:
-			organ_donor = OrganDonor.objects.select_related("user").prefetch_related("selected_hospitals").get(user=request.user)
-		except OrganDonor.DoesNotExist:
-			if request.method.lower() == "get":
-				return Response({"detail": "Organ donor profile not found."}, status=status.HTTP_404_NOT_FOUND)
-			organ_donor = None
+		organ_donor = request.profiles.organ_donor
+		if organ_donor is None and request.method.lower() == "get":
+			return Response({"detail": "Organ donor profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
 		if request.method.lower() == "get":
 			serializer = self.get_serializer(organ_donor)
@@ -369,14 +381,164 @@ class OrganDonorViewSet(viewsets.ModelViewSet):
 
 		serializer.is_valid(raise_exception=True)
 		instance = serializer.save()
+		if not organ_donor:
+			request.profiles.forget()
 		response_status = status.HTTP_200_OK if organ_donor else status.HTTP_201_CREATED
 		return Response(self.get_serializer(instance).data, status=response_status)
 
 
-class MarketplaceItemViewSet(viewsets.ModelViewSet):
+class FuzzySearchView(APIView):
+	"""Typo-tolerant lookup of hospitals, doctors or cities: ?q=&type=hospital|doctor|city&limit="""
+	permission_classes = [AllowAny]
+
+	def get(self, request):
+		query = request.query_params.get("q", "").strip()
+		kind = request.query_params.get("type", "hospital")
+		if kind not in FUZZY_KINDS:
+			return Response({"detail": "type must be one of: hospital, doctor, city."}, status=status.HTTP_400_BAD_REQUEST)
+		try:
+			limit = min(max(int(request.query_params.get("limit", 10)), 1), 50)
+		except ValueError:
+			return Response({"detail": "limit must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+		if len(query) < 2:
+			return Response({"query": query, "type": kind, "results": []})
+
+		results = []
+		for _, match, score in fuzzy_search(kind, query, limit=limit):
+			if kind == "city":
+				results.append({"name": match, "score": round(score, 3)})
+			elif kind == "hospital":
+				results.append({"id": match.pk, "name": match.name, "city": match.city, "hospital_type": match.hospital_type, "score": round(score, 3)})
+			else:
+				results.append({"id": match.pk, "name": match.name, "specialization": match.specialization, "hospital_id": match.hospital_id, "score": round(score, 3)})
+		return Response({"query": query, "type": kind, "results": results})
+
+
+class AutocompleteView(APIView):
+	"""
+	Prefix suggestions for pickers: ?q=&type=hospital,city,product&limit=
+
+	Served from in-memory prefix indexes, so it needs no query per keystroke and no
+	authentication; suggestions are public names only.
+	"""
+	permission_classes = [AllowAny]
+	authentication_classes = []
+
+	def get(self, request):
+		query = request.query_params.get("q", "").strip()
+		kinds = [kind for kind in request.query_params.get("type", ",".join(AUTOCOMPLETE_KINDS)).split(",") if kind]
+		if not kinds or any(kind not in AUTOCOMPLETE_KINDS for kind in kinds):
+			return Response({"detail": "type must be a comma-separated list of: hospital, city, product."}, status=status.HTTP_400_BAD_REQUEST)
+		try:
+			limit = min(max(int(request.query_params.get("limit", 8)), 1), 20)
+		except ValueError:
+			return Response({"detail": "limit must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+		data = {"q": query}
+		for kind in kinds:
+			matches = autocomplete(kind, query, limit=limit) if query else []
+			if kind == "hospital":
+				data[kind] = [{"id": key, "label": label} for key, label in matches]
+			elif kind == "city":
+				data[kind] = [{"label": label} for _, label in matches]
+			else:
+				data[kind] = [{"id": key[1], "type": key[0], "label": label} for key, label in matches]
+		response = Response(data)
+		response["Cache-Control"] = "public, max-age=60"
+		return response
+
+
+class SearchView(APIView):
+	"""
+	One search box across hospitals, doctors, store products, equipment and the
+	marketplace: ?q=&type=HOSPITAL,DOCTOR&city=&limit=&offset=&highlight=true
+
+	Hits come ranked from a single full-text index over the search documents, with
+	per-type facet counts.
+	"""
+	permission_classes = [AllowAny]
+
+	def get(self, request):
+		query = request.query_params.get("q", "").strip()
+		types = [value.strip().upper() for value in request.query_params.get("type", "").split(",") if value.strip()]
+		if any(value not in SEARCH_SOURCES for value in types):
+			return Response({"detail": f"type must be a comma-separated list of: {', '.join(SEARCH_SOURCES)}."}, status=status.HTTP_400_BAD_REQUEST)
+		try:
+			limit = min(max(int(request.query_params.get("limit", 20)), 1), 50)
+			offset = max(int(request.query_params.get("offset", 0)), 0)
+		except ValueError:
+			return Response({"detail": "limit and offset must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+		if len(query) < 2:
+			return Response({"detail": "q must be at least 2 characters."}, status=status.HTTP_400_BAD_REQUEST)
+		highlight = request.query_params.get("highlight") == "true"
+
+		hits, facets = search_documents(
+			query, entity_types=types, city=request.query_params.get("city"),
+			limit=limit, offset=offset, highlight=highlight,
+		)
+		results = []
+		for hit in hits:
+			result = {"type": hit.entity_type, "id": hit.object_id, "title": hit.title, "subtitle": hit.subtitle, "city": hit.city}
+			if highlight:
+				result["highlight"] = hit.search_highlight
+				result["snippet"] = hit.search_snippet
+			results.append(result)
+		count = sum(total for entity_type, total in facets.items() if not types or entity_type in types)
+		return Response({"query": query, "count": count, "facets": facets, "results": results})
+
+
+class FacetMixin:
+	"""Facet counts for a catalogue viewset's current filters"""
+	facet_kind = None
+
+	@action(detail=False, methods=["get"], permission_classes=[permissions.AllowAny])
+	def facets(self, request):
+		"""Counts per value for ?facets=a,b (default all offered) under the same filters as the list"""
+		offered = FACETS[self.facet_kind][1]
+		names = [name for name in request.query_params.get("facets", "").split(",") if name] or offered
+		unknown = [name for name in names if name not in offered]
+		if unknown:
+			return Response({"detail": f"facets must be a comma-separated list of: {', '.join(offered)}."}, status=status.HTTP_400_BAD_REQUEST)
+		# The list can depend on who is asking: a supplier sees their own expired stock,
+		# and only staff may ask for everyone's with include_expired
+		owner = str(request.user.pk) if request.user.is_authenticated and "supplier" in request.query_params else ""
+		scope = f"{owner}:{'staff' if request.user.is_staff else ''}"
+		facets = cached_facets(self.facet_kind, self.get_queryset(), names, request.query_params, scope=scope)
+		return Response({"facets": facets})
+
+	def filter_facets(self, queryset):
+		"""Apply the filters a client picks from facet values"""
+		params = self.request.query_params
+		brand = params.get("brand")
+		if brand and "brand" in FACETS[self.facet_kind][1]:
+			queryset = queryset.filter(brand=brand)
+		is_new = params.get("is_new")
+		if is_new and "is_new" in FACETS[self.facet_kind][1]:
+			queryset = queryset.filter(is_new=is_new.lower() == "true")
+		price_band = params.get("price_band")
+		if price_band:
+			queryset = filter_price_band(queryset, self.facet_kind, price_band)
+		return queryset
+
+
+class MarketplaceItemViewSet(FacetMixin, viewsets.ModelViewSet):
 	queryset = MarketplaceItem.objects.select_related("seller").all().order_by("-created_at")
 	serializer_class = MarketplaceItemSerializer
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+	facet_kind = "MARKETPLACE"
+
+	def get_queryset(self):
+		queryset = super().get_queryset()
+		category = self.request.query_params.get("category")
+		if category:
+			queryset = queryset.filter(category=category)
+		city = self.request.query_params.get("city")
+		if city:
+			queryset = city_filter(queryset, city)
+		active = self.request.query_params.get("active")
+		if active:
+			queryset = queryset.filter(is_active=active.lower() == "true")
+		return self.filter_facets(queryset)
 
 
 class HospitalViewSet(viewsets.ModelViewSet):
@@ -418,12 +580,10 @@ class HospitalViewSet(viewsets.ModelViewSet):
 	@action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
 	def me(self, request):
 		"""Get hospital profile for logged-in hospital user"""
-		try:
-			hospital = Hospital.objects.get(user=request.user)
-			serializer = self.get_serializer(hospital)
-			return Response(serializer.data)
-		except Hospital.DoesNotExist:
+		hospital = request.profiles.hospital
+		if hospital is None:
 			return Response({"detail": "Hospital profile not found."}, status=status.HTTP_404_NOT_FOUND)
+		return Response(self.get_serializer(hospital).data)
 
 
 class DoctorViewSet(viewsets.ModelViewSet):
@@ -534,7 +694,7 @@ class DeceasedDonorRequestViewSet(viewsets.ModelViewSet):
 		# Filter by city
 		city = self.request.query_params.get("city")
 		if city:
-			queryset = queryset.filter(deceased_city__icontains=city)
+			queryset = city_filter(queryset, city)
 		return queryset
 
 
@@ -542,6 +702,7 @@ class AccidentAlertViewSet(viewsets.ModelViewSet):
 	queryset = AccidentAlert.objects.select_related("reported_by", "hospital_referred").all().order_by("-created_at")
 	serializer_class = AccidentAlertSerializer
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+	throttle_scope = None
 
 	def get_queryset(self):
 		queryset = super().get_queryset()
@@ -551,7 +712,7 @@ class AccidentAlertViewSet(viewsets.ModelViewSet):
 		# Filter by city
 		city = self.request.query_params.get("city")
 		if city:
-			queryset = queryset.filter(city__icontains=city)
+			queryset = city_filter(queryset, city)
 		# Location-based search
 		lat = self.request.query_params.get("latitude")
 		lng = self.request.query_params.get("longitude")
@@ -571,7 +732,9 @@ class AccidentAlertViewSet(viewsets.ModelViewSet):
 				pass
 		return queryset
 
-	@action(detail=True, methods=["post"], permission_classes=[permissions.AllowAny])
+	@action(detail=True, methods=["post"], permission_classes=[permissions.AllowAny], throttle_classes=BUCKET_THROTTLES, throttle_scope="emergency")
+	@shed_priority(CRITICAL)
+	@idempotent("accident_speed_up")
 	def speed_up(self, request, pk=None):
 		"""Speed up emergency response: find nearest hospital, send alerts, and trigger ambulance call"""
 		accident = self.get_object()
@@ -593,20 +756,22 @@ class AccidentAlertViewSet(viewsets.ModelViewSet):
 				
 				if hospitals:
 					nearest_hospital = hospitals[0]
-					accident.hospital_referred = nearest_hospital
-					accident.save()
 			except (ValueError, TypeError):
 				pass
 		
 		# If no hospital found by location, try by city
 		if not nearest_hospital and accident.city:
 			try:
-				nearest_hospital = Hospital.objects.filter(city__icontains=accident.city).first()
-				if nearest_hospital:
-					accident.hospital_referred = nearest_hospital
-					accident.save()
+				nearest_hospital = city_filter(Hospital.objects.all(), accident.city).first()
 			except Exception:
 				pass
+
+		with transaction.atomic():
+			if nearest_hospital:
+				accident.hospital_referred = nearest_hospital
+				accident.save()
+			# Notifying is left to a worker; the job commits with the referral
+			enqueue("notify_accident_alert", alert_id=accident.pk)
 		
 		# Prepare response with ambulance and hospital info
 		response_data = {
@@ -691,12 +856,9 @@ class MedicalEssentialViewSet(viewsets.ModelViewSet):
 	@action(detail=False, methods=["get", "put", "patch"], permission_classes=[permissions.IsAuthenticated])
 	def me(self, request):
 		"""Get or update Medical Essential profile for logged-in user"""
-		try:
-			profile = MedicalEssential.objects.select_related("user").get(user=request.user)
-		except MedicalEssential.DoesNotExist:
-			if request.method.lower() == "get":
-				return Response({"detail": "Medical Essential profile not found."}, status=status.HTTP_404_NOT_FOUND)
-			profile = None
+		profile = request.profiles.supplier
+		if profile is None and request.method.lower() == "get":
+			return Response({"detail": "Medical Essential profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
 		if request.method.lower() == "get":
 			serializer = self.get_serializer(profile)
@@ -712,28 +874,149 @@ class MedicalEssentialViewSet(viewsets.ModelViewSet):
 
 		serializer.is_valid(raise_exception=True)
 		instance = serializer.save()
+		if not profile:
+			request.profiles.forget()
 		response_status = status.HTTP_200_OK if profile else status.HTTP_201_CREATED
 		return Response(self.get_serializer(instance).data, status=response_status)
 
 	@action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated])
 	def regenerate_api_key(self, request):
 		"""Regenerate API key for the authenticated Medical Essential user"""
+		profile = request.profiles.supplier
+		if profile is None:
+			return Response({"detail": "Medical Essential profile not found."}, status=status.HTTP_404_NOT_FOUND)
+		old_key_hash = profile.api_key_hash
+		api_key = profile.generate_api_key()
+		profile.save()
+		forget_api_key(old_key_hash)
+		return Response({
+			"message": "API key regenerated successfully.",
+			"api_key": api_key,
+			"api_key_prefix": profile.api_key_prefix,
+		})
+
+	@action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+	def analytics(self, request):
+		"""Sales analytics for the authenticated Medical Essential user"""
+		profile = request.profiles.supplier
+		if profile is None:
+			return Response({"detail": "Medical Essential profile not found."}, status=status.HTTP_404_NOT_FOUND)
+
+		date_from, date_to = default_report_window()
 		try:
-			profile = MedicalEssential.objects.get(user=request.user)
-			profile.generate_api_key()
-			profile.save()
-			return Response({
-				"message": "API key regenerated successfully.",
-				"api_key": profile.api_key
-			})
-		except MedicalEssential.DoesNotExist:
+			if request.query_params.get("from"):
+				date_from = date.fromisoformat(request.query_params["from"])
+			if request.query_params.get("to"):
+				date_to = date.fromisoformat(request.query_params["to"])
+			top = int(request.query_params.get("top", 10))
+			low_stock_threshold = int(request.query_params.get("low_stock_threshold", 10))
+		except ValueError:
+			return Response({"detail": "Invalid date or number in query parameters."}, status=status.HTTP_400_BAD_REQUEST)
+		group_by = request.query_params.get("group_by", "day")
+		if group_by not in ("day", "week"):
+			return Response({"detail": "group_by must be 'day' or 'week'."}, status=status.HTTP_400_BAD_REQUEST)
+
+		return Response(supplier_sales_report(
+			profile, date_from, date_to, group_by=group_by,
+			top=min(max(top, 1), 100), low_stock_threshold=low_stock_threshold,
+		))
+
+
+class InventoryLedgerMixin:
+	"""Logs stock edits on product viewsets to the inventory ledger"""
+	product_type = None
+
+	def perform_update(self, serializer):
+		instance = serializer.instance
+		with transaction.atomic():
+			fold_pending_movements(**{PRODUCT_FIELDS[self.product_type]: instance.pk})
+			# Edit from the stock as it is now, not as it was when the product was loaded
+			old_quantity = type(instance).objects.select_for_update().values_list("quantity_available", flat=True).get(pk=instance.pk)
+			instance.quantity_available = old_quantity
+			product = serializer.save()
+			record_adjustment(self.product_type, product, old_quantity, user=self.request.user, note="Edited via API")
+
+	@action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
+	def restock(self, request, pk=None):
+		"""Add received stock; it becomes available once the ledger is next folded"""
+		product = self.get_object()
+		if product.supplier.user_id != request.user.pk:
+			return Response({"detail": "You can only restock your own products."}, status=status.HTTP_403_FORBIDDEN)
+		try:
+			quantity = int(request.data.get("quantity"))
+		except (TypeError, ValueError):
+			return Response({"detail": "Quantity must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+		if quantity < 1:
+			return Response({"detail": "Quantity must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+		lines = {(self.product_type, product.pk): quantity}
+		movement, = InventoryMovement.objects.bulk_create(build_movements(
+			lines, {(self.product_type, product.pk): product}, "RESTOCK", sign=1,
+			created_by=request.user, note=str(request.data.get("note") or "")[:255],
+		))
+		return Response(InventoryMovementSerializer(movement).data, status=status.HTTP_201_CREATED)
+
+	@action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated])
+	def sync(self, request):
+		"""
+		Bulk upsert the signed-in supplier's products by sku. Accepts a JSON array,
+		or CSV / NDJSON (text/csv, application/x-ndjson) read as a stream.
+		"""
+		supplier = request.profiles.supplier
+		if supplier is None:
 			return Response({"detail": "Medical Essential profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
+		content_type = request.content_type.split(";")[0].strip().lower()
+		try:
+			if content_type in ("text/csv", "application/csv"):
+				rows = iter_csv_rows(request.stream or [])
+			elif content_type in ("application/x-ndjson", "application/jsonl", "application/x-jsonlines"):
+				rows = iter_ndjson_rows(request.stream or [])
+			else:
+				rows = iter_json_rows(request.data)
+		except ValueError as exc:
+			return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+		result = upsert_rows(
+			supplier, self.product_type, rows,
+			max_rows=settings.CATALOG_SYNC_MAX_ROWS, user=request.user, note="Catalog sync",
+		)
+		return Response(result.as_dict())
+
+
+class ProductSearchMixin:
+	"""Ranked full-text search over a product viewset's catalogue"""
+	product_type = None
+
+	@action(detail=False, methods=["get"], permission_classes=[permissions.AllowAny])
+	def search(self, request):
+		"""Best matches for ?q= with the matching words marked; ?limit= caps the results (default 20)"""
+		query = request.query_params.get("q", "")
+		try:
+			limit = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+		except ValueError:
+			return Response({"detail": "limit must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+		products = fulltext_search(self.get_queryset(), self.product_type, query, highlight=True)[:limit]
+		return Response({
+			"query": query,
+			"results": [
+				{
+					"rank": getattr(product, "search_rank", None),
+					"highlight": getattr(product, "search_highlight", None),
+					"snippet": getattr(product, "search_snippet", None),
+					"product": self.get_serializer(product).data,
+				}
+				for product in products
+			],
+		})
+
 
-class MedicalStoreProductViewSet(viewsets.ModelViewSet):
+class MedicalStoreProductViewSet(FacetMixin, ProductSearchMixin, InventoryLedgerMixin, viewsets.ModelViewSet):
 	queryset = MedicalStoreProduct.objects.select_related("supplier").all().order_by("-created_at")
 	serializer_class = MedicalStoreProductSerializer
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+	product_type = "STORE"
+	facet_kind = "STORE"
 
 	def get_queryset(self):
 		queryset = super().get_queryset()
@@ -749,17 +1032,29 @@ class MedicalStoreProductViewSet(viewsets.ModelViewSet):
 		active_only = self.request.query_params.get("active", "true")
 		if active_only.lower() == "true":
 			queryset = queryset.filter(is_active=True)
+		# Hide expired stock unless a supplier is browsing their own catalogue, or staff ask for it
+		include_expired = (
+			self.request.user.is_staff
+			and self.request.query_params.get("include_expired", "false").lower() == "true"
+		)
+		supplier = self.request.profiles.supplier
+		own_catalogue = bool(supplier_id) and supplier is not None and str(supplier.pk) == supplier_id
+		if not (include_expired or own_catalogue):
+			queryset = queryset.filter(Q(expiry_date__isnull=True) | Q(expiry_date__gte=timezone.localdate()))
+		queryset = self.filter_facets(queryset)
 		# Search by name
 		search = self.request.query_params.get("search")
 		if search:
-			queryset = queryset.filter(Q(name__icontains=search) | Q(description__icontains=search) | Q(brand__icontains=search))
+			queryset = fulltext_search(queryset, self.product_type, search)
 		return queryset
 
 
-class MedicalEquipmentViewSet(viewsets.ModelViewSet):
+class MedicalEquipmentViewSet(FacetMixin, ProductSearchMixin, InventoryLedgerMixin, viewsets.ModelViewSet):
 	queryset = MedicalEquipment.objects.select_related("supplier").all().order_by("-created_at")
 	serializer_class = MedicalEquipmentSerializer
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+	product_type = "EQUIPMENT"
+	facet_kind = "EQUIPMENT"
 
 	def get_queryset(self):
 		queryset = super().get_queryset()
@@ -775,15 +1070,18 @@ class MedicalEquipmentViewSet(viewsets.ModelViewSet):
 		active_only = self.request.query_params.get("active", "true")
 		if active_only.lower() == "true":
 			queryset = queryset.filter(is_active=True)
+		queryset = self.filter_facets(queryset)
 		# Search by name
 		search = self.request.query_params.get("search")
 		if search:
-			queryset = queryset.filter(Q(name__icontains=search) | Q(description__icontains=search) | Q(brand__icontains=search))
+			queryset = fulltext_search(queryset, self.product_type, search)
 		return queryset
 
 
 class MedicalOrderViewSet(viewsets.ModelViewSet):
-	queryset = MedicalOrder.objects.select_related("customer", "supplier").prefetch_related("items").all().order_by("-created_at")
+	queryset = MedicalOrder.objects.select_related("customer", "supplier__user").prefetch_related(
+		Prefetch("items", queryset=MedicalOrderItem.objects.select_related("store_product__supplier__user", "equipment__supplier__user"))
+	).all().order_by("-created_at")
 	serializer_class = MedicalOrderSerializer
 	permission_classes = [permissions.IsAuthenticated]
 
@@ -794,11 +1092,8 @@ class MedicalOrderViewSet(viewsets.ModelViewSet):
 			queryset = queryset.filter(customer=self.request.user)
 		# Filter by supplier (for suppliers)
 		if self.request.query_params.get("supplier_orders") == "true":
-			try:
-				supplier = MedicalEssential.objects.get(user=self.request.user)
-				queryset = queryset.filter(supplier=supplier)
-			except MedicalEssential.DoesNotExist:
-				queryset = queryset.none()
+			supplier = self.request.profiles.supplier
+			queryset = queryset.filter(supplier=supplier) if supplier else queryset.none()
 		# Filter by status
 		status_filter = self.request.query_params.get("status")
 		if status_filter:
@@ -809,101 +1104,51 @@ class MedicalOrderViewSet(viewsets.ModelViewSet):
 			queryset = queryset.filter(order_type=order_type)
 		return queryset
 
-	@action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated], url_path="create-order")
-	def create_order(self, request):
-		"""Create an order with items"""
-		data = request.data.copy()
-		data["customer_id"] = request.user.pk
-
-		# Validate items
-		items_data = data.get("items", [])
-		if not items_data:
-			return Response({"detail": "Order must contain at least one item."}, status=status.HTTP_400_BAD_REQUEST)
-
-		# Calculate total
-		total_amount = 0
-		order_items = []
-
-		for item_data in items_data:
-			product_type = item_data.get("product_type")
-			quantity = int(item_data.get("quantity", 1))
-
-			if product_type == "STORE":
-				try:
-					product = MedicalStoreProduct.objects.get(id=item_data.get("store_product_id"))
-					if product.quantity_available < quantity:
-						return Response({"detail": f"Insufficient stock for {product.name}"}, status=status.HTTP_400_BAD_REQUEST)
-					unit_price = float(product.price)
-					subtotal = quantity * unit_price
-					total_amount += subtotal
-					order_items.append({
-						"product_type": "STORE",
-						"store_product": product,
-						"quantity": quantity,
-						"unit_price": unit_price,
-						"subtotal": subtotal
-					})
-				except MedicalStoreProduct.DoesNotExist:
-					return Response({"detail": "Store product not found."}, status=status.HTTP_404_NOT_FOUND)
-
-			elif product_type == "EQUIPMENT":
-				try:
-					equipment = MedicalEquipment.objects.get(id=item_data.get("equipment_id"))
-					if equipment.quantity_available < quantity:
-						return Response({"detail": f"Insufficient stock for {equipment.name}"}, status=status.HTTP_400_BAD_REQUEST)
-					unit_price = float(equipment.price)
-					subtotal = quantity * unit_price
-					total_amount += subtotal
-					order_items.append({
-						"product_type": "EQUIPMENT",
-						"equipment": equipment,
-						"quantity": quantity,
-						"unit_price": unit_price,
-						"subtotal": subtotal
-					})
-				except MedicalEquipment.DoesNotExist:
-					return Response({"detail": "Equipment not found."}, status=status.HTTP_404_NOT_FOUND)
-
-		# Get supplier from first item
-		if order_items:
-			first_item = order_items[0]
-			if first_item["product_type"] == "STORE":
-				supplier = first_item["store_product"].supplier
-			else:
-				supplier = first_item["equipment"].supplier
-			data["supplier_id"] = supplier.id
-
-		data["total_amount"] = total_amount
-		data["order_type"] = order_items[0]["product_type"] if order_items else "STORE"
-
-		# Create order
-		serializer = self.get_serializer(data=data)
+	def _place_orders(self, request, single_supplier):
+		serializer = CheckoutSerializer(data=request.data)
 		serializer.is_valid(raise_exception=True)
-		order = serializer.save()
-
-		# Create order items
-		for item_data in order_items:
-			MedicalOrderItem.objects.create(
-				order=order,
-				product_type=item_data["product_type"],
-				store_product=item_data.get("store_product"),
-				equipment=item_data.get("equipment"),
-				quantity=item_data["quantity"],
-				unit_price=item_data["unit_price"],
-				subtotal=item_data["subtotal"]
+		reservation_ids = request.data.get("reservation_ids") or []
+		if not isinstance(reservation_ids, list):
+			raise OrderError("reservation_ids must be a list.")
+		lines = parse_order_lines(request.data.get("items"), allow_empty=bool(reservation_ids))
+		# At most one order per line; claim the numbers before the transaction opens
+		order_number_allocator.ensure(len(lines) + len(reservation_ids))
+		with transaction.atomic():
+			# Held stock was already taken when the reservation was made
+			reserved_lines, reservations = claim_reservations(request.user, reservation_ids)
+			orders = place_orders(
+				request.user, serializer.validated_data, lines,
+				single_supplier=single_supplier, reserved_lines=reserved_lines,
 			)
+			if reservations:
+				attach_orders(reservations, orders)
+		# Re-read with nested items prefetched so serialization stays at a fixed query count
+		order_ids = [order.pk for order in orders]
+		placed = self.queryset.in_bulk(order_ids)
+		return [placed[pk] for pk in order_ids]
 
-			# Update stock
-			if item_data["product_type"] == "STORE":
-				product = item_data["store_product"]
-				product.quantity_available -= item_data["quantity"]
-				product.save()
-			else:
-				equipment = item_data["equipment"]
-				equipment.quantity_available -= item_data["quantity"]
-				equipment.save()
+	@action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated], url_path="create-order")
+	@idempotent("create_order")
+	def create_order(self, request):
+		"""Create an order with items from a single supplier"""
+		try:
+			orders = self._place_orders(request, single_supplier=True)
+		except OrderError as exc:
+			return Response({"detail": exc.detail}, status=exc.status_code)
+		return Response(self.get_serializer(orders[0]).data, status=status.HTTP_201_CREATED)
 
-		return Response(self.get_serializer(order).data, status=status.HTTP_201_CREATED)
+	@action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated])
+	@idempotent("checkout")
+	def checkout(self, request):
+		"""Check out a mixed cart, creating one order per supplier"""
+		try:
+			orders = self._place_orders(request, single_supplier=False)
+		except OrderError as exc:
+			return Response({"detail": exc.detail}, status=exc.status_code)
+		return Response({
+			"orders": self.get_serializer(orders, many=True).data,
+			"total_amount": str(sum((order.total_amount for order in orders), Decimal("0.00"))),
+		}, status=status.HTTP_201_CREATED)
 
 	@action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
 	def update_status(self, request, pk=None):
@@ -915,16 +1160,128 @@ class MedicalOrderViewSet(viewsets.ModelViewSet):
 			return Response({"detail": "Invalid status."}, status=status.HTTP_400_BAD_REQUEST)
 
 		# Verify user is the supplier
-		try:
-			supplier = MedicalEssential.objects.get(user=request.user)
-			if order.supplier != supplier:
-				return Response({"detail": "You can only update orders for your own products."}, status=status.HTTP_403_FORBIDDEN)
-		except MedicalEssential.DoesNotExist:
+		supplier = request.profiles.supplier
+		if supplier is None:
 			return Response({"detail": "Medical Essential profile not found."}, status=status.HTTP_404_NOT_FOUND)
+		if order.supplier_id != supplier.pk:
+			return Response({"detail": "You can only update orders for your own products."}, status=status.HTTP_403_FORBIDDEN)
+
+		if order.status == "CANCELLED" and new_status != "CANCELLED":
+			return Response({"detail": "Cancelled orders cannot be reopened."}, status=status.HTTP_400_BAD_REQUEST)
 
-		order.status = new_status
-		order.save()
+		with transaction.atomic():
+			# Only the request that actually flips the order to cancelled restocks it
+			changed = MedicalOrder.objects.filter(pk=order.pk).exclude(status="CANCELLED").update(
+				status=new_status, updated_at=timezone.now()
+			)
+			if changed and new_status == "CANCELLED":
+				record_order_cancellation(order, user=request.user)
+				record_cancelled_sales(order)
 
+		order.refresh_from_db(fields=["status", "updated_at"])
 		return Response(self.get_serializer(order).data)
 
 
+class StockReservationViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+	"""Cart holds: stock is set aside for a short time so checkout cannot be outbid"""
+	queryset = StockReservation.objects.all().order_by("-created_at")
+	serializer_class = StockReservationSerializer
+	permission_classes = [permissions.IsAuthenticated]
+
+	def get_queryset(self):
+		queryset = super().get_queryset().filter(customer=self.request.user)
+		# Only live holds unless asked otherwise
+		if self.request.query_params.get("active", "true").lower() == "true":
+			queryset = queryset.filter(status="ACTIVE", expires_at__gt=timezone.now())
+		return queryset
+
+	def create(self, request):
+		"""Hold stock for the posted items; pass the returned ids to checkout"""
+		try:
+			lines = parse_order_lines(request.data.get("items"))
+			reservations = reserve_stock(request.user, lines)
+		except OrderError as exc:
+			return Response({"detail": exc.detail}, status=exc.status_code)
+		return Response(self.get_serializer(reservations, many=True).data, status=status.HTTP_201_CREATED)
+
+	def destroy(self, request, pk=None):
+		"""Release a hold early"""
+		reservation = self.get_object()
+		try:
+			release_reservations(request.user, [reservation.pk])
+		except OrderError as exc:
+			return Response({"detail": exc.detail}, status=exc.status_code)
+		return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class InventoryMovementViewSet(viewsets.ReadOnlyModelViewSet):
+	"""Stock ledger for the signed-in supplier's products"""
+	queryset = InventoryMovement.objects.select_related("store_product", "equipment", "order").all().order_by("-created_at")
+	serializer_class = InventoryMovementSerializer
+	permission_classes = [permissions.IsAuthenticated]
+
+	def get_queryset(self):
+		queryset = super().get_queryset().filter(supplier__user=self.request.user)
+		# Filter by product
+		store_product_id = self.request.query_params.get("store_product")
+		if store_product_id:
+			queryset = queryset.filter(store_product_id=store_product_id)
+		equipment_id = self.request.query_params.get("equipment")
+		if equipment_id:
+			queryset = queryset.filter(equipment_id=equipment_id)
+		# Filter by reason
+		reason = self.request.query_params.get("reason")
+		if reason:
+			queryset = queryset.filter(reason=reason)
+		# Only movements not yet folded into quantity_available
+		if self.request.query_params.get("pending") == "true":
+			queryset = queryset.filter(applied_at__isnull=True)
+		return queryset
+
+
+class StockAlertViewSet(viewsets.ReadOnlyModelViewSet):
+	"""Expiry and low-stock alerts for the signed-in supplier's store products"""
+	queryset = StockAlert.objects.select_related("store_product").all().order_by("-created_at")
+	serializer_class = StockAlertSerializer
+	permission_classes = [permissions.IsAuthenticated]
+
+	def get_queryset(self):
+		queryset = super().get_queryset().filter(supplier__user=self.request.user)
+		# Open alerts only unless asked otherwise
+		resolved = self.request.query_params.get("resolved", "false")
+		if resolved.lower() != "all":
+			queryset = queryset.filter(is_resolved=resolved.lower() == "true")
+		# Filter by alert type
+		alert_type = self.request.query_params.get("alert_type")
+		if alert_type:
+			queryset = queryset.filter(alert_type=alert_type)
+		return queryset
+
+	@action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
+	def resolve(self, request, pk=None):
+		alert = self.get_object()
+		if not alert.is_resolved:
+			alert.is_resolved = True
+			alert.resolved_at = timezone.now()
+			alert.save(update_fields=["is_resolved", "resolved_at", "updated_at"])
+		return Response(self.get_serializer(alert).data)
+
+
+class CatalogImportJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+	"""Catalogue file uploads for the signed-in supplier; poll a job to follow its progress"""
+	queryset = CatalogImportJob.objects.all().order_by("-created_at")
+	serializer_class = CatalogImportJobSerializer
+	permission_classes = [permissions.IsAuthenticated]
+
+	def get_queryset(self):
+		return super().get_queryset().filter(supplier__user=self.request.user)
+
+	def create(self, request):
+		"""Queue a CSV or NDJSON file; run_catalog_imports picks it up"""
+		supplier = request.profiles.supplier
+		if supplier is None:
+			return Response({"detail": "Medical Essential profile not found."}, status=status.HTTP_404_NOT_FOUND)
+		serializer = self.get_serializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		job = serializer.save(supplier=supplier, created_by=request.user)
+		return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
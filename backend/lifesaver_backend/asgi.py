@@ -2,6 +2,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lifesaver_backend.settings")
+# Native async read views; see core.async_views
+os.environ.setdefault("ASYNC_VIEWS", "true")
 application = get_asgi_application()
-
-
@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "dev-insecure-secret-key")
@@ -24,11 +26,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
 	"corsheaders.middleware.CorsMiddleware",
+	"core.middleware.LoadSheddingMiddleware",
 	"django.middleware.security.SecurityMiddleware",
 	"django.contrib.sessions.middleware.SessionMiddleware",
 	"django.middleware.common.CommonMiddleware",
 	"django.middleware.csrf.CsrfViewMiddleware",
 	"django.contrib.auth.middleware.AuthenticationMiddleware",
+	"core.middleware.RequestProfilesMiddleware",
 	"django.contrib.messages.middleware.MessageMiddleware",
 	"django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -57,9 +61,22 @@ DATABASES = {
 	"default": {
 		"ENGINE": "django.db.backends.sqlite3",
 		"NAME": BASE_DIR / "db.sqlite3",
+		# Seconds a connection is reused across requests and async query threads; 0 closes it after each
+		"CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "0")),
 	}
 }
 
+# Preferred password hasher: "pbkdf2", or "argon2" (needs argon2-cffi). Hashes made with the other are upgraded at the next login
+PASSWORD_HASHERS = [
+	"django.contrib.auth.hashers.PBKDF2PasswordHasher",
+	"django.contrib.auth.hashers.Argon2PasswordHasher",
+	"django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+	"django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+	"django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+if os.getenv("PASSWORD_HASHER", "pbkdf2") == "argon2":
+	PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(1))
+
 AUTH_PASSWORD_VALIDATORS = [
 	{"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
 	{"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -82,12 +99,109 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
 	"DEFAULT_AUTHENTICATION_CLASSES": (
-		"rest_framework_simplejwt.authentication.JWTAuthentication",
+		"core.authentication.StatelessJWTAuthentication",
+		"core.authentication.ApiKeyAuthentication",
 	),
 	"DEFAULT_PERMISSION_CLASSES": (
 		"rest_framework.permissions.IsAuthenticatedOrReadOnly",
 	),
+	# Reverse proxies in front of the app; throttles key clients by the address this many hops back in
+	# X-Forwarded-For, or by REMOTE_ADDR when 0. Unset, DRF trusts the whole client-supplied header
+	"NUM_PROXIES": int(os.getenv("NUM_PROXIES", "0")),
 }
 
 # Dev CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key", "x-api-key")
+CORS_EXPOSE_HEADERS = ["Idempotent-Replayed"]
+
+# How long a cart hold keeps stock out of quantity_available
+STOCK_RESERVATION_TTL_SECONDS = int(os.getenv("STOCK_RESERVATION_TTL_SECONDS", "900"))
+
+# Order numbers each worker claims per database round-trip
+ORDER_NUMBER_BLOCK_SIZE = int(os.getenv("ORDER_NUMBER_BLOCK_SIZE", "100"))
+
+# Products expiring within this many days get an EXPIRING stock alert
+STOCK_ALERT_EXPIRY_DAYS = int(os.getenv("STOCK_ALERT_EXPIRY_DAYS", "30"))
+
+# How long a stored Idempotency-Key response is replayed to retries
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400"))
+
+# After this long an in-progress Idempotency-Key lock is treated as abandoned
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+
+# Resolved API-key principals kept per worker, and how long before they are re-read
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", "1024"))
+API_KEY_CACHE_TTL_SECONDS = int(os.getenv("API_KEY_CACHE_TTL_SECONDS", "300"))
+
+# API-key usage counters are written after this many requests or seconds
+API_KEY_USAGE_FLUSH_EVERY = int(os.getenv("API_KEY_USAGE_FLUSH_EVERY", "100"))
+API_KEY_USAGE_FLUSH_SECONDS = int(os.getenv("API_KEY_USAGE_FLUSH_SECONDS", "60"))
+
+# Largest number of rows a single catalog sync request may carry
+CATALOG_SYNC_MAX_ROWS = int(os.getenv("CATALOG_SYNC_MAX_ROWS", "50000"))
+
+# How long a worker keeps resolved city ids; City and CityAlias changes reach other workers sooner through a shared cache
+CITY_CACHE_TTL_SECONDS = int(os.getenv("CITY_CACHE_TTL_SECONDS", "300"))
+
+# How long an in-process trigram index is used before it is rebuilt from the database
+TRIGRAM_INDEX_TTL_SECONDS = int(os.getenv("TRIGRAM_INDEX_TTL_SECONDS", "300"))
+
+# How often the in-process autocomplete indexes are rebuilt to pick up writes made by other workers
+AUTOCOMPLETE_REBUILD_SECONDS = int(os.getenv("AUTOCOMPLETE_REBUILD_SECONDS", "600"))
+
+# How long catalogue facet counts are cached per filter combination; local edits invalidate them sooner
+FACET_CACHE_SECONDS = int(os.getenv("FACET_CACHE_SECONDS", "120"))
+
+# How often each worker reloads the token deny-list, i.e. how long another worker may still accept a revoked token
+JWT_DENYLIST_REFRESH_SECONDS = int(os.getenv("JWT_DENYLIST_REFRESH_SECONDS", "30"))
+
+# How often each worker rebuilds its filter of revoked tokens, i.e. how long another worker may still accept a logged-out token
+TOKEN_REVOCATION_REBUILD_SECONDS = int(os.getenv("TOKEN_REVOCATION_REBUILD_SECONDS", "30"))
+
+# Threads that hash passwords for login and registration, and how many hashes may run or wait before new ones get a 503
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", "4"))
+PASSWORD_HASHING_MAX_PENDING = int(os.getenv("PASSWORD_HASHING_MAX_PENDING", "64"))
+
+# Token buckets for views with a throttle_scope: {scope: {"client" or "route": (requests per minute, burst)}}; route buckets are per view action
+THROTTLE_BUCKETS = {
+	"emergency": {"client": (10, 5), "route": (600, 100)},
+	"metrics": {"client": (30, 10), "route": (300, 30)},
+}
+
+# Where throttle buckets live: "local" to each process, or "cache" to share them through the Django cache
+THROTTLE_STORE = os.getenv("THROTTLE_STORE", "local")
+THROTTLE_LOCAL_MAX_KEYS = int(os.getenv("THROTTLE_LOCAL_MAX_KEYS", "10000"))
+
+# Requests in flight per process at which load shedding refuses normal-priority requests; low-priority ones go at half
+LOAD_SHED_MAX_IN_FLIGHT = int(os.getenv("LOAD_SHED_MAX_IN_FLIGHT", "64"))
+
+# How long the metrics overview is cached; the counts it shows are not expected to be live
+METRICS_CACHE_SECONDS = int(os.getenv("METRICS_CACHE_SECONDS", "30"))
+
+# Serve the hot read endpoints from core.async_views; asgi.py turns this on, WSGI keeps the sync views
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "false").lower() == "true"
+
+# Threads, each with its own database connection, that run the async views' concurrent queries
+ASYNC_QUERY_WORKERS = int(os.getenv("ASYNC_QUERY_WORKERS", "8"))
+
+# Worker processes started by run_workers, and how long a worker may hold a job before it is presumed dead and the job requeued
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "2"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+# How long a recipient is not told again about the same need or alert, e.g. when speed-up is pressed repeatedly
+NOTIFICATION_DEDUP_SECONDS = int(os.getenv("NOTIFICATION_DEDUP_SECONDS", "3600"))
+
+# Delivery adapter per notification channel, see core.notifications; the defaults only write locally
+NOTIFICATION_CHANNELS = {
+	"sms": os.getenv("NOTIFICATION_SMS_CHANNEL", "core.notifications.FileChannel"),
+	"email": os.getenv("NOTIFICATION_EMAIL_CHANNEL", "core.notifications.EmailChannel"),
+	"push": os.getenv("NOTIFICATION_PUSH_CHANNEL", "core.notifications.FileChannel"),
+}
+NOTIFICATION_FILE_DIR = os.getenv("NOTIFICATION_FILE_DIR", str(BASE_DIR / "notifications"))
+
+# Outgoing mail, used by the email notification channel; the default prints messages to the console
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+
+# A RUNNING catalog import that saves no progress for this long is presumed dead and requeued by run_catalog_imports
+CATALOG_IMPORT_LEASE_SECONDS = int(os.getenv("CATALOG_IMPORT_LEASE_SECONDS", "600"))
@@ -3,7 +3,6 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenRefreshView
 from core.views import (
 	DonorProfileViewSet,
 	EmergencyNeedViewSet,
@@ -22,9 +21,18 @@ from core.views import (
 	MedicalStoreProductViewSet,
 	MedicalEquipmentViewSet,
 	MedicalOrderViewSet,
+	StockReservationViewSet,
+	InventoryMovementViewSet,
+	StockAlertViewSet,
+	CatalogImportJobViewSet,
 	RegisterUserView,
 	CustomTokenObtainPairView,  # <-- Use custom login view
+	CustomTokenRefreshView,
+	LogoutView,
 	MetricsOverviewView,
+	FuzzySearchView,
+	AutocompleteView,
+	SearchView,
 )
 
 router = DefaultRouter()
@@ -45,16 +53,44 @@ router.register(r"medical-essential", MedicalEssentialViewSet)
 router.register(r"medical-store-products", MedicalStoreProductViewSet)
 router.register(r"medical-equipment", MedicalEquipmentViewSet)
 router.register(r"medical-orders", MedicalOrderViewSet)
+router.register(r"stock-reservations", StockReservationViewSet)
+router.register(r"inventory-movements", InventoryMovementViewSet)
+router.register(r"stock-alerts", StockAlertViewSet)
+router.register(r"catalog-imports", CatalogImportJobViewSet)
 
 urlpatterns = [
 	path("admin/", admin.site.urls),
 	path("api/", include(router.urls)),
 	path("api/metrics/overview/", MetricsOverviewView.as_view(), name="metrics_overview"),
+	path("api/fuzzy-search/", FuzzySearchView.as_view(), name="fuzzy_search"),
+	path("api/autocomplete/", AutocompleteView.as_view(), name="autocomplete"),
+	path("api/search/", SearchView.as_view(), name="search"),
 	path("api/auth/register/", RegisterUserView.as_view(), name="register"),
 	path("api/auth/token/", CustomTokenObtainPairView.as_view(), name="token_obtain_pair"),  # <-- Use custom login view
-	path("api/auth/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+	path("api/auth/token/refresh/", CustomTokenRefreshView.as_view(), name="token_refresh"),
+	path("api/auth/logout/", LogoutView.as_view(), name="logout"),
 ]
 
+# Under ASGI the hot read endpoints and login are served by native async views, matched before the DRF routes
+if settings.ASYNC_VIEWS:
+	from core.async_views import (
+		AsyncAccidentAlertListView,
+		AsyncDonorDashboardView,
+		AsyncEmergencyNeedListView,
+		AsyncHospitalListView,
+		AsyncMetricsOverviewView,
+		AsyncTokenObtainPairView,
+	)
+
+	urlpatterns = [
+		path("api/hospitals/", AsyncHospitalListView.as_view()),
+		path("api/needs/", AsyncEmergencyNeedListView.as_view()),
+		path("api/accident-alerts/", AsyncAccidentAlertListView.as_view()),
+		path("api/donors/dashboard/", AsyncDonorDashboardView.as_view()),
+		path("api/metrics/overview/", AsyncMetricsOverviewView.as_view()),
+		path("api/auth/token/", AsyncTokenObtainPairView.as_view()),
+	] + urlpatterns
+
 # Serve media files in development
 if settings.DEBUG:
 	urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -106,7 +106,7 @@ export default function Equipment({ profile }) {
 				quantity: item.quantity,
 			}))
 
-			await apiFetch("/medical-orders/create-order/", {
+			await apiFetch("/medical-orders/checkout/", {
 				method: "POST",
 				body: JSON.stringify({
 					items,
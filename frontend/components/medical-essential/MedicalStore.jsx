@@ -104,7 +104,7 @@ export default function MedicalStore({ profile }) {
 				quantity: item.quantity,
 			}))
 
-			await apiFetch("/medical-orders/create-order/", {
+			await apiFetch("/medical-orders/checkout/", {
 				method: "POST",
 				body: JSON.stringify({
 					items,
@@ -36,7 +36,7 @@ export default function Profile({ profile, onUpdate }) {
 			const data = await apiFetch("/medical-essential/regenerate_api_key/", {
 				method: "POST",
 			})
-			setFormData({ ...formData, api_key: data.api_key })
+			setFormData({ ...formData, api_key: data.api_key, api_key_prefix: data.api_key_prefix })
 			setSuccess("API key regenerated successfully!")
 		} catch (err) {
 			setError(err.message || "Failed to regenerate API key")
@@ -182,7 +182,7 @@ export default function Profile({ profile, onUpdate }) {
 						<input
 							type="text"
 							readOnly
-							value={formData.api_key || ""}
+							value={formData.api_key || (formData.api_key_prefix ? `${formData.api_key_prefix}...` : "")}
 							className="flex-1 px-4 py-2 rounded-lg border border-[#F6D6E3] bg-[#1A1A2E] text-white font-mono text-sm"
 						/>
 						<button
@@ -194,7 +194,7 @@ export default function Profile({ profile, onUpdate }) {
 						</button>
 					</div>
 					<p className="text-xs text-pink-100/70 mt-2">
-						Use this API key for programmatic access to your Medical Essential account.
+						Send this key in the X-API-Key header for programmatic access to your Medical Essential account. It is only shown once, right after it is generated.
 					</p>
 				</div>
 
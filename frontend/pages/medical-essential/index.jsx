@@ -88,9 +88,9 @@ export default function MedicalEssentialDashboard() {
 							)}
 						</div>
 						<div className="flex items-center gap-4">
-							{profile?.api_key && (
+							{profile?.api_key_prefix && (
 								<div className="text-xs bg-[#1A1A2E] px-3 py-1 rounded border border-[#F6D6E3]/20">
-									API: {profile.api_key.substring(0, 12)}...
+									API: {profile.api_key_prefix}...
 								</div>
 							)}
 							<button